@@ -0,0 +1,289 @@
+"""
+This script is an Apache Arrow backend for the records parsed by parse_sbl.py.
+It requires pyarrow, which parse_sbl.py itself does not: without it the rest of the
+parser and its pandas DataFrames work as before.
+
+The parser appends records to a 'parse_sbl.RecordColumns', and each batch of records
+is turned into an Arrow record batch without building a DataFrame:
+the number columns share their buffers with the parser's arrays,
+and the book name, textual variant, and witness abbreviation columns are dictionary-encoded
+with the parser's string tables as their dictionaries.
+The batches can be written as an Arrow IPC file (.arrow) or a Feather file (.feather),
+uncompressed, so that other processes can memory-map them and read them without copying.
+
+    table = arrow_sbl.parse_to_table("merged_sbl.txt")
+    arrow_sbl.write_table(table, "merged_sbl.feather")
+    table = arrow_sbl.read_table("merged_sbl.feather")
+"""
+
+# -- coding: utf-8 --
+
+# =============================================================================
+# STEP 1:
+#    Initialize script
+# =============================================================================
+
+
+# Step 1a: Import necessary libraries
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+import parse_sbl
+
+# Step 1b: Define global variables
+default_batch_size = 65536
+dictionary_columns = ["book_name", "textual_variant", "witness_abbreviation"]
+nullable_columns = parse_sbl.RecordColumns.nullable_columns
+dictionary_type = pa.dictionary(pa.int32(), pa.string())
+schema = pa.schema([
+    (column, dictionary_type if column in dictionary_columns else pa.int32())
+    for column in parse_sbl.output_columns])
+
+# =============================================================================
+# STEP 2:
+#    Build record batches
+# =============================================================================
+
+# Step 2a: Define 'get_int32_array()' function
+
+
+def get_int32_array(values):
+    """
+    Wraps an 'array('i')' in an Arrow int32 array that shares its buffer.
+    The array must not be appended to while the Arrow array is in use.
+
+    Args:
+        values (array.array): The values, of type code 'i'.
+
+    Returns:
+        pa.Int32Array: The Arrow array.
+    """
+    return pa.Array.from_buffers(pa.int32(), len(values), [None, pa.py_buffer(values)])
+
+# Step 2b: Define 'set_nulls()' function
+
+
+def set_nulls(array, missing_value):
+    """
+    Replaces a placeholder value of an array with nulls.
+
+    Args:
+        array (pa.Int32Array): The array.
+        missing_value (int): The value that stands for a missing value.
+
+    Returns:
+        pa.Int32Array: The array with nulls, or the same array if it has no missing values.
+    """
+    is_missing = pc.equal(array, missing_value)
+    if not pc.any(is_missing).as_py():
+        return array
+    return pc.if_else(is_missing, pa.scalar(None, pa.int32()), array)
+
+# Step 2c: Define 'record_columns_to_batch()' function
+
+
+def record_columns_to_batch(record_columns):
+    """
+    Builds an Arrow record batch from the records collected by a 'parse_sbl.RecordColumns'.
+    The number columns and string codes are wrapped without copying,
+    and the string tables become the dictionaries of the dictionary-encoded columns.
+    No more records should be appended once the batch has been built.
+
+    Args:
+        record_columns (parse_sbl.RecordColumns): The collected records.
+
+    Returns:
+        pa.RecordBatch: A record batch with the 'schema' of this module.
+    """
+    arrays = {}
+
+    # Step 2c1: Wrap the number columns. Chapter and verse numbers of -1 become nulls.
+    for column, values in record_columns.integer_arrays.items():
+        arrays[column] = get_int32_array(values)
+        if column in nullable_columns:
+            arrays[column] = set_nulls(arrays[column], -1)
+
+    # Step 2c2: Dictionary-encode the string columns with their string tables.
+    # A missing book name (before the first header) becomes a null index.
+    for column, string_table in record_columns.string_tables.items():
+        indices = get_int32_array(record_columns.string_codes[column])
+        strings = list(string_table)
+        if None in string_table:
+            strings[string_table[None]] = ""
+            indices = set_nulls(indices, string_table[None])
+        arrays[column] = pa.DictionaryArray.from_arrays(
+            indices, pa.array(strings, pa.string()))
+
+    return pa.RecordBatch.from_arrays(
+        [arrays[column] for column in parse_sbl.output_columns], schema=schema)
+
+# Step 2d: Define 'iter_record_batches()' function
+
+
+def iter_record_batches(lines, batch_size=default_batch_size, witnesses=None):
+    """
+    Parses the input and yields its records as Arrow record batches.
+    Each batch has its own dictionaries.
+
+    Args:
+        lines (iterable[str] or str): A file object or any other iterable of input lines,
+        or the input text as a single string.
+        batch_size (int): The number of records in each batch.
+        witnesses (list[str]): The witness abbreviations to match.
+
+    Yields:
+        pa.RecordBatch: The next batch of records.
+    """
+    record_columns = parse_sbl.RecordColumns()
+    for record in parse_sbl.iter_records(lines, witnesses=witnesses):
+        record_columns.append(record)
+        if len(record_columns) >= batch_size:
+            yield record_columns_to_batch(record_columns)
+            record_columns = parse_sbl.RecordColumns()
+    if len(record_columns):
+        yield record_columns_to_batch(record_columns)
+
+# Step 2e: Define 'rows_to_batch()' function
+
+
+def rows_to_batch(rows, columns):
+    """
+    Builds an Arrow record batch from rows of plain Python values, such as those
+    written by write_sbl.py. The 'dictionary_columns' are dictionary-encoded.
+
+    Args:
+        rows (list[tuple]): The rows.
+        columns (list[str]): The column names, in the order of the values in each row.
+
+    Returns:
+        pa.RecordBatch: The record batch.
+    """
+    arrays = []
+    for column, values in zip(columns, zip(*rows) if rows else [()] * len(columns)):
+        if column in dictionary_columns:
+            arrays.append(pa.array(values, pa.string()).dictionary_encode())
+        elif schema.get_field_index(column) != -1:
+            arrays.append(pa.array(values, pa.int32()))
+        else:
+            arrays.append(pa.array(values))
+    return pa.RecordBatch.from_arrays(arrays, names=columns)
+
+# =============================================================================
+# STEP 3:
+#    Build, write, and read tables
+# =============================================================================
+
+# Step 3a: Define 'batches_to_table()' function
+
+
+def batches_to_table(batches, table_schema=schema):
+    """
+    Combines record batches into a table whose chunks share one dictionary per column,
+    as the Arrow IPC file format requires.
+
+    Args:
+        batches (iterable[pa.RecordBatch]): The record batches.
+        table_schema (pa.Schema): The schema of the batches, used if there are none.
+
+    Returns:
+        pa.Table: The table.
+    """
+    batches = list(batches)
+    if batches:
+        table_schema = batches[0].schema
+    return pa.Table.from_batches(batches, schema=table_schema).unify_dictionaries()
+
+# Step 3b: Define 'parse_to_table()' function
+
+
+def parse_to_table(input_file, witnesses=None, batch_size=default_batch_size):
+    """
+    Parses an input file into an Arrow table, without building a DataFrame.
+
+    Args:
+        input_file (str): The path to the input file or per-book directory.
+        witnesses (list[str]): The witness abbreviations to match.
+        batch_size (int): The number of records in each chunk of the table.
+
+    Returns:
+        pa.Table: A table with one row per record and the 'parse_sbl.output_columns'.
+    """
+    return batches_to_table(
+        iter_record_batches(parse_sbl.iter_input_lines(input_file), batch_size, witnesses))
+
+# Step 3c: Define 'write_table()' function
+
+
+def write_table(table, output_file_path, file_format=None):
+    """
+    Writes a table as an uncompressed Feather file or Arrow IPC file,
+    which can be memory-mapped without copying.
+    Both are the Arrow IPC file format. Feather files are written with pyarrow.feather.
+
+    Args:
+        table (pa.Table): The table, for example from 'parse_to_table()'.
+        output_file_path (str): The path where the file should be written.
+        file_format (str): 'arrow' or 'feather'.
+        Defaults to 'feather' for a .feather file and 'arrow' otherwise.
+    """
+    if file_format is None:
+        file_format = "feather" if output_file_path.lower().endswith(".feather") else "arrow"
+    if file_format == "feather":
+        feather.write_feather(table, output_file_path, compression="uncompressed")
+    else:
+        with pa.OSFile(output_file_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+# Step 3d: Define 'read_table()' function
+
+
+def read_table(input_file_path, memory_map=True):
+    """
+    Reads a Feather or Arrow IPC file.
+
+    Args:
+        input_file_path (str): The path of the file.
+        memory_map (bool): Whether to memory-map the file,
+        so that the columns of the table are views of the file rather than copies.
+
+    Returns:
+        pa.Table: The table.
+    """
+    if memory_map:
+        with pa.memory_map(input_file_path, "r") as source:
+            return pa.ipc.open_file(source).read_all()
+    with pa.OSFile(input_file_path, "rb") as source:
+        return pa.ipc.open_file(source).read_all()
+
+# Step 3e: Define 'table_to_dataframe()' function
+
+
+def table_to_dataframe(table):
+    """
+    Converts a table of parsed records into the DataFrame that 'parse_sbl.extract_data()'
+    returns: 'book_name' and 'witness_abbreviation' as categorical columns
+    with sorted categories, and 'textual_variant' as strings.
+
+    Args:
+        table (pa.Table): A table of parsed records.
+
+    Returns:
+        pd.DataFrame: The DataFrame.
+    """
+    import pandas as pd
+
+    data_frame = table.to_pandas()
+    for column in dictionary_columns:
+        if column in parse_sbl.categorical_columns:
+            data_frame[column] = data_frame[column].cat.remove_unused_categories()
+            data_frame[column] = data_frame[column].cat.reorder_categories(
+                sorted(data_frame[column].cat.categories))
+        else:
+            data_frame[column] = data_frame[column].to_numpy(dtype=object)
+    for column in nullable_columns:
+        if table[column].null_count:
+            data_frame[column] = pd.array(table[column].to_pylist(), dtype="Int32")
+    return data_frame
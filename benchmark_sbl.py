@@ -0,0 +1,291 @@
+"""
+This script benchmarks the stages of parse_sbl.py
+on the textual apparatus in merged_sbl.txt.
+For each stage it reports the number of rows processed,
+the elapsed time, and the time per row at increasing input sizes,
+so that a stage whose cost does not grow linearly stands out.
+It then times the stages of the pipeline separately
+(read_input_file, the tokenizer, extract_data, identify_and_assign, write_output_file)
+on synthetic apparatus files generated by generate_sbl.py at 1x, 10x, and 100x
+the size of merged_sbl.txt, and reports the throughput (bytes, tokens, or rows per second)
+and peak memory of each stage.
+It also measures the time taken to import parse_sbl with 'python -X importtime'
+and exits with a non-zero status if the import exceeds its startup budget
+or loads pandas or numpy.
+
+Run it from the project directory, optionally with the scales of the stage benchmark:
+    python benchmark_sbl.py
+    python benchmark_sbl.py 1 10
+"""
+
+# -- coding: utf-8 --
+
+# =============================================================================
+# STEP 1:
+#    Initialize script
+# =============================================================================
+
+
+# Step 1a: Import necessary libraries
+
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+
+import pandas as pd
+
+import generate_sbl
+import parse_sbl
+
+# Step 1b: Define global variables
+input_file = "merged_sbl.txt"
+scale_factors = [1, 2, 4, 8, 16]
+import_time_budget_us = 50000
+stage_scale_factors = [1, 10, 100]
+StageResult = namedtuple(
+    'StageResult', ['stage', 'scale', 'input_size', 'unit', 'elapsed', 'peak_bytes'])
+
+# =============================================================================
+# STEP 2:
+#    Time a single call
+# =============================================================================
+
+# Step 2a: Define 'time_call()' function
+
+
+def time_call(function, *args):
+    """
+    Calls a function with the given arguments and measures how long it takes.
+
+    Args:
+        function (callable): The function to call.
+        *args: The positional arguments to pass to the function.
+
+    Returns:
+        tuple: A tuple containing the function's return value and the elapsed time in seconds.
+    """
+    start_time = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start_time
+
+# =============================================================================
+# STEP 3:
+#    Benchmark a stage at increasing input sizes
+# =============================================================================
+
+# Step 3a: Define 'benchmark_scaling()' function
+
+
+def benchmark_scaling(function, data_frame):
+    """
+    Times a DataFrame stage on the parsed apparatus repeated at each scale factor
+    and prints one line per scale.
+
+    Args:
+        function (callable): The stage to time, called with the scaled DataFrame.
+        data_frame (pd.DataFrame): The DataFrame returned by 'process_input_file()'.
+
+    Returns:
+        list: A list of (row_count, elapsed_seconds) tuples, one per scale factor.
+    """
+    results = []
+    print(f"{function.__name__}()")
+    for scale_factor in scale_factors:
+        scaled_data_frame = pd.concat([data_frame] * scale_factor, ignore_index=True)
+        _, elapsed = time_call(function, scaled_data_frame)
+        row_count = len(scaled_data_frame)
+        results.append((row_count, elapsed))
+        print(f"  {scale_factor:>3}x {row_count:>9} rows {elapsed:9.4f} s "
+              f"{elapsed / row_count * 1e6:8.3f} us/row")
+    return results
+
+# =============================================================================
+# STEP 4:
+#    Benchmark each stage of the pipeline on generated input
+# =============================================================================
+
+# Step 4a: Define 'measure_stage()' function
+
+
+def measure_stage(function, *args):
+    """
+    Calls a stage twice: once to time it, and once under tracemalloc
+    to measure the peak memory it allocates.
+    The two are kept apart because tracing slows the call down.
+    Anything the stage prints is discarded.
+
+    Args:
+        function (callable): The stage to measure.
+        *args: The positional arguments to pass to the stage.
+
+    Returns:
+        tuple: A tuple containing the stage's return value, the elapsed time in seconds,
+        and the peak number of bytes allocated during the call.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        result, elapsed = time_call(function, *args)
+        tracemalloc.start()
+        try:
+            function(*args)
+            _, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return result, elapsed, peak_bytes
+
+# Step 4b: Define 'count_tokens()' function
+
+
+def count_tokens(input_text):
+    """
+    Runs the tokenizer of parse_sbl over the input text and counts the tokens.
+
+    Args:
+        input_text (str): The input text.
+
+    Returns:
+        int: The number of tokens.
+    """
+    return sum(1 for _ in parse_sbl.iter_tokens(input_text))
+
+# Step 4c: Define 'benchmark_stages()' function
+
+
+def benchmark_stages(scale, seed=0):
+    """
+    Generates a synthetic apparatus at the given scale, runs each stage of the pipeline on it,
+    and prints the elapsed time, throughput, and peak memory of each stage.
+    The output is written as CSV, since the larger scales exceed Excel's row limit.
+
+    Args:
+        scale (float): The size of the apparatus relative to merged_sbl.txt.
+        seed (int): The seed of the generator.
+
+    Returns:
+        list[StageResult]: One result per stage.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        input_path = os.path.join(temporary_directory, "generated_sbl.txt")
+        output_path = os.path.join(temporary_directory, "output.csv")
+        byte_count = generate_sbl.write_apparatus(input_path, scale, seed)
+
+        # Step 4c1: Run the stages in order, each on the output of the previous one.
+        input_text, elapsed, peak_bytes = measure_stage(parse_sbl.read_input_file, input_path)
+        results.append(StageResult(
+            "read_input_file", scale, byte_count, "bytes", elapsed, peak_bytes))
+        token_count, elapsed, peak_bytes = measure_stage(count_tokens, input_text)
+        results.append(StageResult(
+            "iter_tokens", scale, token_count, "tokens", elapsed, peak_bytes))
+        data_frame, elapsed, peak_bytes = measure_stage(parse_sbl.extract_data, input_text)
+        results.append(StageResult(
+            "extract_data", scale, byte_count, "bytes", elapsed, peak_bytes))
+        data_frame, elapsed, peak_bytes = measure_stage(
+            parse_sbl.identify_and_assign, data_frame)
+        results.append(StageResult(
+            "identify_and_assign", scale, len(data_frame), "rows", elapsed, peak_bytes))
+        _, elapsed, peak_bytes = measure_stage(
+            parse_sbl.write_output_file, data_frame, output_path)
+        results.append(StageResult("write_output_file", scale, len(data_frame), "rows",
+                                   elapsed, peak_bytes))
+
+    # Step 4c2: Print one line per stage.
+    print(f"stages at {scale:g}x ({byte_count} bytes, {len(data_frame)} rows)")
+    for result in results:
+        if result.unit == "bytes":
+            throughput = f"{result.input_size / result.elapsed / 2**20:9.2f} MiB/s"
+        elif result.unit == "tokens":
+            throughput = f"{result.input_size / result.elapsed / 1e3:9.1f} ktok/s"
+        else:
+            throughput = f"{result.input_size / result.elapsed / 1e3:9.1f} krows/s"
+        print(f"  {result.stage:<20} {result.elapsed:9.4f} s {throughput} "
+              f"peak {result.peak_bytes / 2**20:8.1f} MiB")
+    return results
+
+# =============================================================================
+# STEP 5:
+#    Benchmark the import of parse_sbl
+# =============================================================================
+
+# Step 5a: Define 'benchmark_import_time()' function
+
+
+def benchmark_import_time(module_name="parse_sbl"):
+    """
+    Imports a module in a fresh interpreter with '-X importtime'
+    and reports its cumulative import time and whether it loaded pandas or numpy.
+
+    Args:
+        module_name (str): The name of the module to import.
+
+    Returns:
+        tuple: A tuple containing the cumulative import time in microseconds
+        and a list of the heavy modules (pandas, numpy) that the import loaded.
+    """
+
+    # Step 5b: Run the import in a subprocess from the project directory.
+    completed_process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True)
+
+    # Step 5c: Parse the 'import time: self [us] | cumulative | imported package' lines.
+    cumulative_us = None
+    heavy_modules = []
+    for line in completed_process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, package = line[len("import time:"):].split("|")
+        package = package.strip()
+        if package == module_name:
+            cumulative_us = int(cumulative)
+        elif package in ("pandas", "numpy"):
+            heavy_modules.append(package)
+
+    print(f"import {module_name}")
+    print(f"  {cumulative_us:>9} us (budget {import_time_budget_us} us)"
+          f"{', loads ' + ', '.join(heavy_modules) if heavy_modules else ''}")
+    return cumulative_us, heavy_modules
+
+# =============================================================================
+# STEP 6:
+#    Run the benchmarks
+# =============================================================================
+
+# Step 6a: Define 'main()' function
+
+
+def main(scales=None):
+    """
+    Parses the input file once, runs each benchmark on the result,
+    benchmarks the pipeline stages on generated input,
+    and checks the import of parse_sbl against its startup budget.
+
+    Args:
+        scales (list[float]): The scales of the stage benchmark.
+        Defaults to 'stage_scale_factors'.
+
+    Returns:
+        int: 0 if the import is within its budget, otherwise 1.
+    """
+    # The benchmarks measure the parser, so the input is parsed rather than loaded from a snapshot.
+    data_frame = parse_sbl.process_input_file(input_file, use_snapshot=False)
+    benchmark_scaling(parse_sbl.identify_and_assign, data_frame)
+    benchmark_scaling(parse_sbl.assign_identifier_numbers, data_frame)
+    for scale in scales or stage_scale_factors:
+        benchmark_stages(scale)
+
+    cumulative_us, heavy_modules = benchmark_import_time()
+    if cumulative_us > import_time_budget_us or heavy_modules:
+        print("parse_sbl import exceeds its startup budget")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main([float(scale) for scale in sys.argv[1:]]))
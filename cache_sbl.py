@@ -0,0 +1,299 @@
+"""
+This script parses a textual apparatus file such as merged_sbl.txt
+with an on-disk cache of the parsed records of each verse block.
+
+Each verse block (a header and the groups that follow it) is hashed,
+and its parsed records are stored under that hash in an SQLite file
+saved next to the input file (for example merged_sbl.txt.cache).
+When the apparatus is corrected and parsed again, only the new or changed blocks
+are parsed; every other block is loaded from the cache.
+The hash also covers the witnesses parsed and the source of parse_sbl.py,
+so parsing other witnesses does not reuse the records of a block,
+and a change to the parser invalidates the whole cache.
+The input can also be a directory of per-book files, which is read without merging it.
+
+The least recently used blocks are evicted when the cache grows beyond its size limit,
+and the hits, misses, and evictions of each run are reported.
+"""
+
+# -- coding: utf-8 --
+
+# =============================================================================
+# STEP 1:
+#    Initialize script
+# =============================================================================
+
+
+# Step 1a: Import necessary libraries
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import defaultdict, namedtuple
+
+import parse_sbl
+
+# Step 1b: Define global variables
+cache_suffix = ".cache"
+default_max_cache_bytes = 64 * 1024 * 1024
+CacheStats = namedtuple(
+    'CacheStats', ['hits', 'misses', 'evictions', 'cached_blocks', 'cached_bytes'])
+
+# =============================================================================
+# STEP 2:
+#    Hash verse blocks
+# =============================================================================
+
+# Step 2a: Define 'get_parser_fingerprint()' function
+
+
+def get_parser_fingerprint():
+    """
+    Hashes the source of parse_sbl.py, so that cached records are not reused
+    after the parser has changed.
+
+    Returns:
+        bytes: The digest of the parser source.
+    """
+    with open(parse_sbl.__file__, "rb") as parser_file:
+        return hashlib.blake2b(parser_file.read(), digest_size=16).digest()
+
+# Step 2b: Define 'hash_block()' function
+
+
+def hash_block(block_text, parser_fingerprint, witnesses=None):
+    """
+    Hashes the text of a verse block together with the parser fingerprint
+    and the witnesses parsed.
+
+    Args:
+        block_text (str): The text of the verse block.
+        parser_fingerprint (bytes): The value returned by 'get_parser_fingerprint()'.
+        witnesses (list[str]): The witness abbreviations parsed.
+        Defaults to 'parse_sbl.witness_abbreviations'.
+
+    Returns:
+        str: The hexadecimal digest used as the cache key.
+    """
+    if witnesses is None:
+        witnesses = parse_sbl.witness_abbreviations
+    block_hash = hashlib.blake2b(parser_fingerprint, digest_size=16)
+    block_hash.update("\x00".join(witnesses).encode("utf-8") + b"\x01")
+    block_hash.update(block_text.encode("utf-8"))
+    return block_hash.hexdigest()
+
+# =============================================================================
+# STEP 3:
+#    Store parsed verse blocks
+# =============================================================================
+
+# Step 3a: Define the 'BlockCache' class
+
+
+class BlockCache:
+    """
+    An SQLite store of parsed verse blocks keyed by their hash,
+    with least-recently-used eviction once it holds more than 'max_cache_bytes'.
+
+    Args:
+        cache_path (str): The path of the SQLite cache file.
+        max_cache_bytes (int): The maximum total size of the stored records.
+    """
+
+    def __init__(self, cache_path, max_cache_bytes=default_max_cache_bytes):
+        self.max_cache_bytes = max_cache_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.connection = sqlite3.connect(cache_path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS blocks ("
+            "block_hash TEXT PRIMARY KEY, record_groups INTEGER, records TEXT, "
+            "size INTEGER, last_used REAL)")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS blocks_last_used ON blocks (last_used)")
+        self.used_hashes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, block_hash):
+        """
+        Looks up the parsed records of a verse block.
+
+        Args:
+            block_hash (str): The value returned by 'hash_block()'.
+
+        Returns:
+            tuple: A tuple containing the list of records and the number of headers and groups
+            in the block, or None if the block is not in the cache.
+        """
+        row = self.connection.execute(
+            "SELECT record_groups, records FROM blocks WHERE block_hash = ?",
+            (block_hash,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.used_hashes.append(block_hash)
+        return [parse_sbl.VariantRecord(*record) for record in json.loads(row[1])], row[0]
+
+    def put(self, block_hash, records, record_groups):
+        """
+        Stores the parsed records of a verse block.
+
+        Args:
+            block_hash (str): The value returned by 'hash_block()'.
+            records (list[VariantRecord]): The records of the block, numbered from 1.
+            record_groups (int): The number of headers and groups in the block.
+        """
+        serialized_records = json.dumps(records, ensure_ascii=False)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?, ?)",
+            (block_hash, record_groups, serialized_records,
+             len(serialized_records), time.time()))
+
+    def evict(self):
+        """
+        Marks the blocks used in this run as recently used, then deletes the least recently
+        used blocks until the stored records fit within 'max_cache_bytes'.
+        """
+        now = time.time()
+        self.connection.executemany(
+            "UPDATE blocks SET last_used = ? WHERE block_hash = ?",
+            ((now, block_hash) for block_hash in self.used_hashes))
+        self.used_hashes = []
+
+        cached_bytes = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM blocks").fetchone()[0]
+        if cached_bytes <= self.max_cache_bytes:
+            return
+        evicted_hashes = []
+        for block_hash, size in self.connection.execute(
+                "SELECT block_hash, size FROM blocks ORDER BY last_used"):
+            if cached_bytes <= self.max_cache_bytes:
+                break
+            evicted_hashes.append((block_hash,))
+            cached_bytes -= size
+        self.connection.executemany("DELETE FROM blocks WHERE block_hash = ?", evicted_hashes)
+        self.evictions += len(evicted_hashes)
+
+    def get_stats(self):
+        """
+        Returns the statistics of the cache for this run.
+
+        Returns:
+            CacheStats: The hits, misses, and evictions of this run,
+            and the number of blocks and bytes now stored.
+        """
+        cached_blocks, cached_bytes = self.connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blocks").fetchone()
+        return CacheStats(self.hits, self.misses, self.evictions, cached_blocks, cached_bytes)
+
+    def close(self):
+        """
+        Evicts blocks if necessary, commits the changes, and closes the cache file.
+        """
+        self.evict()
+        self.connection.commit()
+        self.connection.close()
+
+# =============================================================================
+# STEP 4:
+#    Parse the input file through the cache
+# =============================================================================
+
+# Step 4a: Define 'parse_block()' function
+
+
+def parse_block(block_text, witnesses=None):
+    """
+    Parses one verse block on its own.
+
+    Args:
+        block_text (str): The text of the verse block.
+        witnesses (list[str]): The witness abbreviations to match.
+
+    Returns:
+        tuple: A tuple containing the list of records, numbered from 1,
+        and the number of headers and groups in the block.
+    """
+    counters = defaultdict(int)
+    records = list(parse_sbl.iter_records(block_text, counters, witnesses))
+    return records, counters['headers'] + counters['groups']
+
+# Step 4b: Define 'process_input_file_cached()' function
+
+
+def process_input_file_cached(input_file, cache_path=None,
+                              max_cache_bytes=default_max_cache_bytes, witnesses=None):
+    """
+    Parses an input file, reusing the cached records of every verse block
+    that has not changed since it was last parsed with the same witnesses.
+    The result is identical to 'parse_sbl.process_input_file()'.
+
+    Args:
+        input_file (str): The path to the input file or per-book directory.
+        cache_path (str): The path of the SQLite cache file.
+        Defaults to the input path with a '.cache' suffix.
+        max_cache_bytes (int): The maximum total size of the stored records.
+        witnesses (list[str]): The witness abbreviations to match.
+        Defaults to 'parse_sbl.witness_abbreviations'.
+
+    Returns:
+        tuple: A tuple containing the pandas DataFrame of records
+        and the CacheStats of this run.
+    """
+    if cache_path is None:
+        cache_path = os.path.normpath(input_file) + cache_suffix
+    parser_fingerprint = get_parser_fingerprint()
+
+    all_records = []
+    record_number_offset = 0
+    with BlockCache(cache_path, max_cache_bytes) as block_cache:
+        lines = parse_sbl.iter_input_lines(input_file)
+        for block_text in parse_sbl.iter_verse_blocks(lines):
+
+            # Step 4b1: Load the block from the cache, or parse and store it.
+            block_hash = hash_block(block_text, parser_fingerprint, witnesses)
+            cached_block = block_cache.get(block_hash)
+            if cached_block is None:
+                cached_block = parse_block(block_text, witnesses)
+                block_cache.put(block_hash, *cached_block)
+            records, record_groups = cached_block
+
+            # Step 4b2: Offset the record numbers by the headers and groups before the block.
+            all_records.extend(
+                record._replace(record_number=record.record_number + record_number_offset)
+                for record in records)
+            record_number_offset += record_groups
+
+        block_cache.evict()
+        cache_stats = block_cache.get_stats()
+
+    return parse_sbl.records_to_dataframe(all_records), cache_stats
+
+# Step 4c: Define 'format_cache_stats()' function
+
+
+def format_cache_stats(cache_stats):
+    """
+    Formats the statistics of a cached run as a short report.
+
+    Args:
+        cache_stats (CacheStats): The statistics returned by 'process_input_file_cached()'.
+
+    Returns:
+        str: The report.
+    """
+    lookups = cache_stats.hits + cache_stats.misses
+    hit_rate = cache_stats.hits / lookups if lookups else 0.0
+    return (
+        f"Cache hits: {cache_stats.hits}, misses: {cache_stats.misses} "
+        f"(hit rate {hit_rate:.1%}), evictions: {cache_stats.evictions}, "
+        f"stored: {cache_stats.cached_blocks} blocks, {cache_stats.cached_bytes} bytes")
@@ -0,0 +1,427 @@
+"""
+This script is a non-interactive command line interface to parse_sbl.py and merge_sbl_files.py,
+for batch jobs that process many apparatus files in one warm process
+instead of starting a new interpreter (and importing pandas) for each one.
+
+    python cli_sbl.py parse merged_sbl.txt -o output/
+    python cli_sbl.py parse "revisions/*.txt" --format csv --jobs 4 -o output/
+    find revisions -name "*.txt" | python cli_sbl.py parse --files-from - -o output/
+    python cli_sbl.py parse - --format jsonl -o - < merged_sbl.txt
+    python cli_sbl.py parse merged_sbl.txt --by-book sheets -o output/
+    python cli_sbl.py parse merged_sbl.txt --profile -o output/
+    python cli_sbl.py parse merged_sbl.txt --snapshot -o output/
+    python cli_sbl.py merge SBLGNT-master/data/sblgntapp/text/ -o merged/
+
+Inputs may be paths, glob patterns, or '-' for the apparatus text on standard input.
+Each input is written to the output directory under its own name with the extension
+of the output format, or to standard output with '-o -' (CSV and JSON Lines only).
+With '--jobs', the inputs are processed in parallel worker processes.
+With '--by-book', Excel output has a sheet per book, or a workbook per book
+in a directory named after the input, and '--book-workers' writes the books
+in that many worker processes.
+With '--profile', each stage of each parse is measured and a JSON report is written
+next to its output (see profile_sbl.py), '--cprofile' also writes a cProfile dump,
+and '--trace-memory' also records the peak memory of each stage, at the cost of slower stages.
+With '--snapshot', each input file is loaded from its binary snapshot when it is fresh,
+and the snapshot is written next to it otherwise (see snapshot_sbl.py).
+"""
+
+# -- coding: utf-8 --
+
+# =============================================================================
+# STEP 1:
+#    Initialize script
+# =============================================================================
+
+
+# Step 1a: Import necessary libraries
+
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import parse_sbl
+import write_sbl
+
+# Step 1b: Define global variables
+stdin_path = "-"
+stdin_name = "stdin"
+stdout_path = write_sbl.stdout_path
+default_output_format = write_sbl.default_output_format
+output_extensions = {output_format: extension
+                     for extension, output_format in write_sbl.output_formats.items()}
+
+# =============================================================================
+# STEP 2:
+#    Resolve inputs and outputs
+# =============================================================================
+
+# Step 2a: Define 'expand_inputs()' function
+
+
+def expand_inputs(patterns, files_from=None):
+    """
+    Expands the input arguments into a list of input paths.
+    Glob patterns are expanded in sorted order, and '-' is kept for standard input.
+
+    Args:
+        patterns (list[str]): The paths, glob patterns, or '-' given on the command line.
+        files_from (str): The path of a file listing one input per line,
+        or '-' to read the list from standard input.
+
+    Returns:
+        list[str]: The input paths, without duplicates, in the order given.
+
+    Raises:
+        FileNotFoundError: If a path or pattern does not match anything.
+    """
+    patterns = list(patterns)
+    if files_from == stdin_path:
+        patterns.extend(line.strip() for line in sys.stdin if line.strip())
+    elif files_from is not None:
+        with open(files_from, "r", encoding="utf-8") as list_file:
+            patterns.extend(line.strip() for line in list_file if line.strip())
+
+    input_paths = []
+    for pattern in patterns:
+        if pattern == stdin_path or os.path.exists(pattern):
+            matches = [pattern]
+        else:
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise FileNotFoundError(f"No input matches {pattern!r}")
+        input_paths.extend(matches)
+    return list(dict.fromkeys(input_paths))
+
+# Step 2b: Define 'get_output_paths()' function
+
+
+def get_output_paths(input_paths, output, extension):
+    """
+    Chooses the output path of each input: the input's name with the given extension
+    in the output directory, or '-' for every input when writing to standard output.
+
+    Args:
+        input_paths (list[str]): The input paths.
+        output (str): The output directory, or '-' for standard output.
+        extension (str): The extension of the output files, for example ".xlsx".
+
+    Returns:
+        list[str]: The output path of each input.
+
+    Raises:
+        ValueError: If two inputs would be written to the same output file.
+    """
+    if output == stdout_path:
+        return [stdout_path] * len(input_paths)
+
+    output_paths = []
+    for input_path in input_paths:
+        if input_path == stdin_path:
+            name = stdin_name
+        else:
+            name = os.path.splitext(os.path.basename(os.path.normpath(input_path)))[0]
+        output_paths.append(os.path.join(output, name + extension))
+
+    seen_paths = {}
+    for input_path, output_path in zip(input_paths, output_paths):
+        if output_path in seen_paths:
+            raise ValueError(
+                f"{seen_paths[output_path]!r} and {input_path!r} "
+                f"would both be written to {output_path!r}")
+        seen_paths[output_path] = input_path
+    return output_paths
+
+# =============================================================================
+# STEP 3:
+#    Process one input
+# =============================================================================
+
+# Step 3a: Define 'parse_one()' function
+
+
+def parse_one(input_path, output_path, output_format, witnesses=None, input_text=None,
+              by_book=None, profile=False, use_cprofile=False, use_snapshot=False,
+              trace_memory=False, book_workers=None):
+    """
+    Parses one apparatus file, assigns the identifier numbers, and writes the output.
+    This is the same pipeline as 'parse_sbl.main()', without the prompts.
+
+    Args:
+        input_path (str): The path to the input file or per-book directory, or '-'.
+        output_path (str): The path of the output file, or '-' for standard output,
+        or the directory of the workbooks when 'by_book' is 'workbooks'.
+        output_format (str): One of the formats in 'write_sbl.output_formats'.
+        witnesses (list[str]): The witness abbreviations to match.
+        input_text (str): The apparatus text, when the input is read from standard input.
+        by_book (str): 'sheets' or 'workbooks' to split Excel output by book.
+        profile (bool): Whether to measure each stage and write a JSON report
+        next to the output (see profile_sbl.py).
+        use_cprofile (bool): Whether to also write a cProfile dump next to the output.
+        use_snapshot (bool): Whether to load and refresh the snapshot of the input file.
+        trace_memory (bool): Whether to also record the peak memory of each stage.
+        book_workers (int): The number of worker processes writing the books of 'by_book' output.
+        Defaults to None, which writes them in this process.
+
+    Returns:
+        int: The number of rows written.
+    """
+    profiler = None
+    if profile or use_cprofile or trace_memory:
+        import profile_sbl
+
+        profiler = profile_sbl.Profiler(trace_memory=trace_memory, use_cprofile=use_cprofile)
+
+    # Step 3a1: Parse the input, number the records, and write them, one stage at a time.
+    if input_text is not None:
+        with parse_sbl.profile_stage(profiler, "extract_data") as metrics:
+            extracted_data = parse_sbl.extract_data(
+                input_text, witnesses, profiler.counters if profiler is not None else None)
+            metrics["records"] = len(extracted_data)
+    else:
+        extracted_data = parse_sbl.process_input_file(
+            input_path, witnesses=witnesses, use_snapshot=use_snapshot, profiler=profiler)
+    with parse_sbl.profile_stage(profiler, "identify_and_assign") as metrics:
+        data_frame = parse_sbl.identify_and_assign(extracted_data)
+        metrics["records"] = len(data_frame)
+    with parse_sbl.profile_stage(profiler, "write_output_file") as metrics:
+        if by_book is not None:
+            row_count = write_sbl.write_excel_by_book(
+                data_frame, output_path, workers=book_workers,
+                separate_workbooks=by_book == "workbooks")
+        else:
+            row_count = write_sbl.write_data_frame(data_frame, output_path, output_format)
+        metrics["records"] = row_count
+
+    # Step 3a2: Write the report of a profiled parse next to its output.
+    if profiler is not None:
+        profile_sbl.save_profile(profiler, output_path)
+    return row_count
+
+# Step 3b: Define 'merge_one()' function
+
+
+def merge_one(input_directory, output_path):
+    """
+    Merges the per-book files of one directory into a single apparatus file.
+
+    Args:
+        input_directory (str): The path to the directory containing the per-book files.
+        output_path (str): The path of the merged file, or '-' for standard output.
+
+    Returns:
+        int: The number of characters written.
+    """
+    import merge_sbl_files
+
+    character_count = 0
+    with write_sbl.open_text_output(output_path) as output_file:
+        for book_text in merge_sbl_files.iter_book_texts(input_directory):
+            output_file.write(book_text)
+            character_count += len(book_text)
+    return character_count
+
+# =============================================================================
+# STEP 4:
+#    Process all inputs
+# =============================================================================
+
+# Step 4a: Define 'run_batch()' function
+
+
+def run_batch(function, tasks, jobs=1, unit="rows"):
+    """
+    Runs a function over a list of tasks, serially or in a process pool,
+    and reports the result of each task on standard error.
+    A failed task is reported and does not stop the others.
+
+    Args:
+        function (callable): The function to call, with the arguments of each task.
+        tasks (list[tuple]): The input path, output path, and other arguments of each task.
+        jobs (int): The number of worker processes. 1 runs the tasks in this process.
+        unit (str): The unit of the function's result, used in the report.
+
+    Returns:
+        int: The number of tasks that failed.
+    """
+    failure_count = 0
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(function, *task) for task in tasks]
+            for task, future in zip(tasks, futures):
+                failure_count += report_outcome(task, future.result, unit)
+    else:
+        for task in tasks:
+            failure_count += report_outcome(task, lambda: function(*task), unit)
+    return failure_count
+
+# Step 4b: Define 'report_outcome()' function
+
+
+def report_outcome(task, get_result, unit):
+    """
+    Reports the result or the error of one task on standard error.
+
+    Args:
+        task (tuple): The input path, output path, and other arguments of the task.
+        get_result (callable): Returns the result of the task, or raises its error.
+        unit (str): The unit of the result.
+
+    Returns:
+        int: 1 if the task failed, otherwise 0.
+    """
+    input_path, output_path = task[0], task[1]
+    try:
+        result = get_result()
+    except Exception as exc:
+        print(f"{input_path}: error: {exc}", file=sys.stderr)
+        return 1
+    print(f"{input_path} -> {output_path}: {result} {unit}", file=sys.stderr)
+    return 0
+
+# =============================================================================
+# STEP 5:
+#    Parse the command line
+# =============================================================================
+
+# Step 5a: Define 'build_parser()' function
+
+
+def build_parser():
+    """
+    Builds the command line parser with the 'parse' and 'merge' subcommands.
+
+    Returns:
+        argparse.ArgumentParser: The command line parser.
+    """
+    parser = argparse.ArgumentParser(
+        prog="cli_sbl.py",
+        description="Parse and merge SBL textual apparatus files in batch.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # Step 5a1: Define the 'parse' subcommand.
+    parse_parser = subparsers.add_parser(
+        "parse", help="parse apparatus files into tables of variants and witnesses")
+    parse_parser.add_argument(
+        "inputs", nargs="*",
+        help="input files, per-book directories, glob patterns, or '-' for standard input")
+    parse_parser.add_argument(
+        "--files-from", metavar="FILE",
+        help="read more inputs from FILE, one per line ('-' for standard input)")
+    parse_parser.add_argument(
+        "-o", "--output", default=".",
+        help="output directory, or '-' for standard output (default: current directory)")
+    parse_parser.add_argument(
+        "-f", "--format", choices=sorted(output_extensions), default=default_output_format,
+        help=f"output format (default: {default_output_format})")
+    parse_parser.add_argument(
+        "-j", "--jobs", type=int, default=1,
+        help="number of inputs to process in parallel (default: 1)")
+    parse_parser.add_argument(
+        "--witnesses", nargs="+", metavar="WITNESS",
+        help="witness abbreviations to match (default: "
+             f"{' '.join(parse_sbl.witness_abbreviations)})")
+    parse_parser.add_argument(
+        "--by-book", choices=["sheets", "workbooks"],
+        help="split Excel output into a sheet per book, or a workbook per book")
+    parse_parser.add_argument(
+        "--book-workers", type=int, metavar="N",
+        help="number of worker processes writing the books of --by-book output (default: 1)")
+    parse_parser.add_argument(
+        "--profile", action="store_true",
+        help="measure each stage and write a JSON report next to each output")
+    parse_parser.add_argument(
+        "--cprofile", action="store_true",
+        help="also write a cProfile dump next to each output")
+    parse_parser.add_argument(
+        "--trace-memory", action="store_true",
+        help="also record the peak memory of each stage (slows the stages down)")
+    parse_parser.add_argument(
+        "--snapshot", action="store_true",
+        help="load each input from its snapshot when it is fresh, and write the snapshot "
+             "next to the input otherwise")
+
+    # Step 5a2: Define the 'merge' subcommand.
+    merge_parser = subparsers.add_parser(
+        "merge", help="merge directories of per-book files into single apparatus files")
+    merge_parser.add_argument(
+        "inputs", nargs="+", help="per-book directories or glob patterns")
+    merge_parser.add_argument(
+        "-o", "--output", default=".",
+        help="output directory, or '-' for standard output (default: current directory)")
+    merge_parser.add_argument(
+        "-j", "--jobs", type=int, default=1,
+        help="number of directories to merge in parallel (default: 1)")
+    return parser
+
+# =============================================================================
+# STEP 6:
+#    Run the command
+# =============================================================================
+
+# Step 6a: Define 'main()' function
+
+
+def main(argv=None):
+    """
+    Runs the command given on the command line.
+
+    Args:
+        argv (list[str]): The command line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        int: 0 if every input was processed, 1 if any failed, 2 for invalid arguments.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    # Step 6a1: Resolve the inputs and their output paths.
+    try:
+        input_paths = expand_inputs(args.inputs, getattr(args, "files_from", None))
+        if not input_paths:
+            parser.error("no inputs given")
+        if stdin_path in input_paths and getattr(args, "files_from", None) == stdin_path:
+            parser.error("standard input cannot be both an input and the list of inputs")
+        if args.command == "parse":
+            if args.output == stdout_path and args.format not in ("csv", "jsonl"):
+                parser.error("only csv and jsonl can be written to standard output")
+            if args.by_book is not None and args.format != "xlsx":
+                parser.error("--by-book requires xlsx output")
+            if args.book_workers is not None and args.by_book is None:
+                parser.error("--book-workers requires --by-book")
+            if args.book_workers is not None and args.book_workers < 1:
+                parser.error("--book-workers must be at least 1")
+            if args.output == stdout_path and (args.profile or args.cprofile or args.trace_memory):
+                parser.error(
+                    "--profile, --cprofile, and --trace-memory require an output directory")
+            extension = "" if args.by_book == "workbooks" else output_extensions[args.format]
+        else:
+            extension = ".txt"
+        output_paths = get_output_paths(input_paths, args.output, extension)
+    except (OSError, ValueError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    if args.output != stdout_path:
+        os.makedirs(args.output, exist_ok=True)
+
+    # Step 6a2: Build one task per input.
+    # Outputs written to standard output are written one at a time, in input order.
+    jobs = 1 if args.output == stdout_path else args.jobs
+    if args.command == "parse":
+        stdin_text = sys.stdin.read() if stdin_path in input_paths else None
+        tasks = [(input_path, output_path, args.format, args.witnesses,
+                  stdin_text if input_path == stdin_path else None, args.by_book,
+                  args.profile, args.cprofile, args.snapshot, args.trace_memory,
+                  args.book_workers)
+                 for input_path, output_path in zip(input_paths, output_paths)]
+        failure_count = run_batch(parse_one, tasks, jobs)
+    else:
+        tasks = list(zip(input_paths, output_paths))
+        failure_count = run_batch(merge_one, tasks, jobs, unit="characters")
+    return 1 if failure_count else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""
+This script compares two revisions of a textual apparatus file, such as merged_sbl.txt
+before and after a correction, and reports which variation units changed.
+
+Both revisions are read one verse block at a time, in canonical book, chapter, and verse order,
+and the verses of the two revisions are matched as they are read.
+A verse whose text is unchanged is skipped without being parsed.
+The readings of a changed verse are matched by group number and text,
+and each reading that was added or removed, or whose witnesses changed, is reported.
+Only one verse of each revision is held in memory at a time,
+so whole corpora can be compared without building a DataFrame of either.
+"""
+
+# -- coding: utf-8 --
+
+# =============================================================================
+# STEP 1:
+#    Initialize script
+# =============================================================================
+
+
+# Step 1a: Import necessary libraries
+
+from collections import defaultdict, namedtuple
+
+import parse_sbl
+
+# Step 1b: Define global variables
+diff_columns = [
+    "book_name", "chapter_number", "verse_number", "group_number",
+    "change", "textual_variant", "old_witnesses", "new_witnesses"]
+DiffEntry = namedtuple('DiffEntry', diff_columns)
+book_ranks = {book_name: rank for rank, book_name in enumerate(parse_sbl.book_names)}
+
+# =============================================================================
+# STEP 2:
+#    Read the verses of a revision in order
+# =============================================================================
+
+# Step 2a: Define 'get_sort_key()' function
+
+
+def get_sort_key(verse_key):
+    """
+    Returns the position of a verse in canonical order.
+    Books missing from 'parse_sbl.book_names' sort after the canonical books, by name,
+    and the text before the first header sorts first.
+
+    Args:
+        verse_key (tuple): The book name, chapter number, and verse number,
+        or None for the text before the first header.
+
+    Returns:
+        tuple: A key that sorts verses in canonical order.
+    """
+    if verse_key is None:
+        return (-1, "", 0, 0)
+    book_name, chapter_number, verse_number = verse_key
+    return (book_ranks.get(book_name, len(book_ranks)), book_name, chapter_number, verse_number)
+
+# Step 2b: Define 'iter_verses()' function
+
+
+def iter_verses(input_file):
+    """
+    Reads the verse blocks of an input file in order.
+
+    Args:
+        input_file (str): The path to the input file or per-book directory.
+
+    Yields:
+        tuple: The sort key, the verse key (book name, chapter number, verse number),
+        and the text of the verse block.
+
+    Raises:
+        ValueError: If the verses are not in canonical order, or a verse appears twice.
+    """
+    previous_sort_key = None
+    for block_text in parse_sbl.iter_verse_blocks(parse_sbl.iter_input_lines(input_file)):
+        header_token = parse_sbl.find_header_token(block_text.split("\n", 1)[0])
+        verse_key = header_token.value if header_token is not None else None
+        sort_key = get_sort_key(verse_key)
+        if previous_sort_key is not None and sort_key <= previous_sort_key:
+            raise ValueError(
+                f"{input_file!r} is not in verse order at {header_token.text!r}")
+        previous_sort_key = sort_key
+        yield sort_key, verse_key, block_text
+
+# =============================================================================
+# STEP 3:
+#    Compare two revisions of a verse
+# =============================================================================
+
+# Step 3a: Define 'get_group_readings()' function
+
+
+def get_group_readings(block_text, witnesses=None):
+    """
+    Parses a verse block into the witnesses of each reading of each group.
+
+    Args:
+        block_text (str): The text of the verse block, or None if the verse is missing.
+        witnesses (list[str]): The witness abbreviations to match.
+
+    Returns:
+        dict: A dictionary mapping each group number to a dictionary
+        mapping the text of each reading to the set of its witnesses.
+    """
+    group_readings = defaultdict(lambda: defaultdict(set))
+    if block_text is not None:
+        for record in parse_sbl.iter_records(block_text, witnesses=witnesses):
+            group_readings[record.group_number][record.textual_variant].add(
+                record.witness_abbreviation)
+    return group_readings
+
+# Step 3b: Define 'diff_verse()' function
+
+
+def diff_verse(verse_key, old_text, new_text, witnesses=None):
+    """
+    Compares two revisions of a verse block, group by group and reading by reading.
+
+    Args:
+        verse_key (tuple): The book name, chapter number, and verse number.
+        old_text (str): The old text of the verse block, or None if it was added.
+        new_text (str): The new text of the verse block, or None if it was removed.
+        witnesses (list[str]): The witness abbreviations to match.
+
+    Yields:
+        DiffEntry: One entry per reading that was added, removed, or changed,
+        with the witnesses of its old and new revisions joined by spaces.
+    """
+    if old_text == new_text:
+        return
+    witness_order = {witness: index for index, witness in enumerate(
+        parse_sbl.witness_abbreviations if witnesses is None else witnesses)}
+    book_name, chapter_number, verse_number = verse_key or (None, None, None)
+    old_groups = get_group_readings(old_text, witnesses)
+    new_groups = get_group_readings(new_text, witnesses)
+
+    # Step 3b1: Match the groups by number, and the readings of each group by text.
+    for group_number in sorted(old_groups.keys() | new_groups.keys()):
+        old_readings = old_groups.get(group_number, {})
+        new_readings = new_groups.get(group_number, {})
+        for textual_variant in list(old_readings) + [
+                text for text in new_readings if text not in old_readings]:
+            old_witnesses = old_readings.get(textual_variant, set())
+            new_witnesses = new_readings.get(textual_variant, set())
+            if old_witnesses == new_witnesses:
+                continue
+
+            # Step 3b2: Report the reading as added, removed, or changed.
+            if not old_witnesses:
+                change = "added"
+            elif not new_witnesses:
+                change = "removed"
+            else:
+                change = "changed"
+            yield DiffEntry(
+                book_name, chapter_number, verse_number, group_number, change, textual_variant,
+                " ".join(sorted(old_witnesses, key=witness_order.get)),
+                " ".join(sorted(new_witnesses, key=witness_order.get)))
+
+# =============================================================================
+# STEP 4:
+#    Compare two revisions of the apparatus
+# =============================================================================
+
+# Step 4a: Define 'diff_apparatus()' function
+
+
+def diff_apparatus(old_file, new_file, witnesses=None):
+    """
+    Compares two revisions of an apparatus file, reading both one verse at a time
+    and matching their verses in canonical order.
+
+    Args:
+        old_file (str): The path to the old input file or per-book directory.
+        new_file (str): The path to the new input file or per-book directory.
+        witnesses (list[str]): The witness abbreviations to match.
+        Defaults to 'parse_sbl.witness_abbreviations'.
+
+    Yields:
+        DiffEntry: One entry per reading that was added, removed, or changed, in verse order.
+
+    Raises:
+        ValueError: If either revision is not in canonical verse order.
+    """
+    old_verses = iter_verses(old_file)
+    new_verses = iter_verses(new_file)
+    old_verse = next(old_verses, None)
+    new_verse = next(new_verses, None)
+
+    # Step 4a1: Advance whichever revision is behind, or both if they are at the same verse.
+    while old_verse is not None or new_verse is not None:
+        if new_verse is None or (old_verse is not None and old_verse[0] < new_verse[0]):
+            yield from diff_verse(old_verse[1], old_verse[2], None, witnesses)
+            old_verse = next(old_verses, None)
+        elif old_verse is None or new_verse[0] < old_verse[0]:
+            yield from diff_verse(new_verse[1], None, new_verse[2], witnesses)
+            new_verse = next(new_verses, None)
+        else:
+            yield from diff_verse(old_verse[1], old_verse[2], new_verse[2], witnesses)
+            old_verse = next(old_verses, None)
+            new_verse = next(new_verses, None)
+
+
+if __name__ == '__main__':
+    import write_sbl
+
+    old_file = input("Enter the path of the old apparatus file: ")
+    new_file = input("Enter the path of the new apparatus file: ")
+    output_file_path = input("Enter the output file path (e.g. diff.csv): ")
+    row_count = write_sbl.write_records(
+        diff_apparatus(old_file, new_file), output_file_path, columns=diff_columns)
+    print(f"Wrote {row_count} changed readings to {output_file_path}")
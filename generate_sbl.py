@@ -0,0 +1,226 @@
+"""
+This script generates synthetic textual apparatus text in the SBL format of merged_sbl.txt,
+for benchmarking the parser at sizes beyond the real apparatus.
+
+The generated text has the same structure as merged_sbl.txt:
+a 'Book chapter:verse' header for each verse, a first line of variants
+starting with the verse (or chapter:verse) number, further groups on lines starting with '•',
+readings separated by ']' and ';', additions ('+') and omissions ('–'),
+ellipsis ('…') variants, and a blank line after each verse.
+The books, the number of verses per book, and the rate of each feature
+follow merged_sbl.txt, and at scale 1 the text has as many verses as merged_sbl.txt.
+Chapter and verse numbers stay below 1000, as verse IDs require (see 'parse_sbl.encode_verse_id()'),
+so at large scales the chapters of each book are made longer instead of more numerous.
+The output is deterministic for a given scale and seed.
+"""
+
+# -- coding: utf-8 --
+
+# =============================================================================
+# STEP 1:
+#    Initialize script
+# =============================================================================
+
+
+# Step 1a: Import necessary libraries
+
+import random
+
+import parse_sbl
+
+# Step 1b: Define global variables
+
+# The books in canonical order, with the number of verses each has in merged_sbl.txt.
+book_verse_counts = [
+    ("Matthew", 562), ("Mark", 507), ("Luke", 721), ("John", 509), ("Acts", 677),
+    ("Romans", 163), ("1 Corinthians", 220), ("2 Corinthians", 120), ("Galatians", 65),
+    ("Ephesians", 70), ("Philippians", 36), ("Colossians", 50), ("1 Thessalonians", 38),
+    ("2 Thessalonians", 22), ("1 Timothy", 36), ("2 Timothy", 32), ("Titus", 19),
+    ("Philemon", 14), ("Hebrews", 115), ("James", 56), ("1 Peter", 60), ("2 Peter", 32),
+    ("1 John", 50), ("2 John", 9), ("3 John", 8), ("Jude", 13), ("Revelation", 264),
+]
+greek_words = [
+    "καὶ", "ὁ", "τὸν", "τοῦ", "αὐτοῦ", "αὐτῷ", "δὲ", "Ἰησοῦς", "εἶπεν", "λέγει",
+    "ἐν", "εἰς", "ἐπὶ", "πρὸς", "οὖν", "γὰρ", "ἦλθεν", "ἀπεκρίθη", "μαθηταὶ", "κύριος",
+    "θεοῦ", "λόγον", "ἡμῶν", "ὑμῖν", "πάντες", "ἐστιν", "ἀκούσας", "ὄχλος", "οὐρανῶν", "Χριστοῦ",
+]
+witness_abbreviations = ["WH", "Treg", "NA28", "RP"]
+separator = "\xa0]\xa0"
+addition_prefix = "+\xa0"
+omission = "–\xa0"
+
+# The rates of each feature, measured on merged_sbl.txt.
+extra_group_probability = 0.35
+third_reading_probability = 0.04
+addition_probability = 0.2
+omission_probability = 0.1
+ellipsis_probability = 0.02
+niv_probability = 0.03
+verse_range_probability = 0.002
+verses_per_chapter = 18
+max_reference_number = parse_sbl.verse_id_chapter_factor - 1
+max_verse_step = 3
+
+# =============================================================================
+# STEP 2:
+#    Generate readings and groups
+# =============================================================================
+
+# Step 2a: Define 'generate_words()' function
+
+
+def generate_words(rng):
+    """
+    Generates the text of a reading: one to three words,
+    or occasionally two words joined by an ellipsis.
+
+    Args:
+        rng (random.Random): The random number generator.
+
+    Returns:
+        str: The text of the reading.
+    """
+    if rng.random() < ellipsis_probability:
+        return f"{rng.choice(greek_words)} … {rng.choice(greek_words)}"
+    return " ".join(rng.choices(greek_words, k=rng.randint(1, 3)))
+
+# Step 2b: Define 'generate_group()' function
+
+
+def generate_group(rng):
+    """
+    Generates one group of readings with the witnesses that support each one.
+    Every witness supports exactly one reading of the group.
+
+    Args:
+        rng (random.Random): The random number generator.
+
+    Returns:
+        str: The group, for example 'δὲ WH Treg NA28 ] + ὁ βασιλεὺς RP'.
+    """
+
+    # Step 2b1: Split the witnesses between two or three readings.
+    reading_count = 3 if rng.random() < third_reading_probability else 2
+    witnesses = rng.sample(witness_abbreviations, len(witness_abbreviations))
+    split_points = sorted(rng.sample(range(1, len(witnesses)), reading_count - 1))
+    witness_groups = [witnesses[start:end] for start, end
+                      in zip([0] + split_points, split_points + [len(witnesses)])]
+    if rng.random() < niv_probability:
+        witness_groups[-1].insert(0, "NIV")
+
+    # Step 2b2: Generate the text of each reading. The first reading is never an omission.
+    base_text = generate_words(rng)
+    readings = [f"{base_text} {' '.join(witness_groups[0])}"]
+    for witness_group in witness_groups[1:]:
+        kind = rng.random()
+        if kind < addition_probability:
+            readings.append(f"{addition_prefix}{generate_words(rng)} {' '.join(witness_group)}")
+        elif kind < addition_probability + omission_probability:
+            readings.append(f"{omission}{' '.join(witness_group)}")
+        else:
+            readings.append(f"{generate_words(rng)} {' '.join(witness_group)}")
+    return readings[0] + separator + "; ".join(readings[1:])
+
+# =============================================================================
+# STEP 3:
+#    Generate the apparatus
+# =============================================================================
+
+# Step 3a: Define 'iter_verse_blocks()' function
+
+
+def iter_verse_blocks(scale=1, seed=0):
+    """
+    Generates the verse blocks of a synthetic apparatus, one verse at a time.
+
+    Args:
+        scale (float): The size of the apparatus relative to merged_sbl.txt.
+        seed (int): The seed of the random number generator.
+
+    Yields:
+        str: The text of one verse block, ending with a blank line.
+
+    Raises:
+        ValueError: If the scale is so large that a book's verses cannot be numbered
+        with chapter and verse numbers below 1000.
+    """
+    rng = random.Random(seed)
+    for book_name, verse_count in book_verse_counts:
+        book_verse_count = max(1, round(verse_count * scale))
+
+        # Step 3a1: Lengthen the chapters of a book that would otherwise have more than 999,
+        # and shorten the steps between verse numbers so that they stay below 1000.
+        chapter_length = max(verses_per_chapter, -(-book_verse_count // max_reference_number))
+        verse_step = min(max_verse_step, max_reference_number // chapter_length)
+        if verse_step < 1:
+            raise ValueError(f"Scale {scale:g} gives {book_name} too many verses to number")
+
+        chapter_number = 1
+        verse_number = 0
+        for verse_index in range(book_verse_count):
+
+            # Step 3a2: Advance to the next verse, and to a new chapter every few verses.
+            first_in_chapter = verse_index > 0 and verse_index % chapter_length == 0
+            if first_in_chapter:
+                chapter_number += 1
+                verse_number = 0
+            verse_number += rng.randint(1, verse_step)
+
+            # Step 3a3: Number the first group with the verse, or with the chapter and verse
+            # for the first verse of a chapter. A few verses span two verse numbers.
+            verse_label = str(verse_number)
+            if rng.random() < verse_range_probability:
+                verse_label += f"–{verse_number + 1}"
+            if first_in_chapter or verse_index == 0:
+                verse_label = f"{chapter_number}:{verse_label}"
+
+            # Step 3a4: Write the header, the first group, and the '•' groups.
+            lines = [f"{book_name} {chapter_number}:{verse_number}",
+                     f"{verse_label} {generate_group(rng)}"]
+            while rng.random() < extra_group_probability:
+                lines.append(f"•\xa0{generate_group(rng)}")
+            yield "\n".join(lines) + "\n\n"
+
+# Step 3b: Define 'generate_apparatus()' function
+
+
+def generate_apparatus(scale=1, seed=0):
+    """
+    Generates a synthetic apparatus as a single string.
+
+    Args:
+        scale (float): The size of the apparatus relative to merged_sbl.txt.
+        seed (int): The seed of the random number generator.
+
+    Returns:
+        str: The text of the apparatus.
+    """
+    return "".join(iter_verse_blocks(scale, seed))
+
+# Step 3c: Define 'write_apparatus()' function
+
+
+def write_apparatus(output_file_path, scale=1, seed=0):
+    """
+    Generates a synthetic apparatus and writes it to a file, one verse block at a time.
+
+    Args:
+        output_file_path (str): The path where the apparatus should be written.
+        scale (float): The size of the apparatus relative to merged_sbl.txt.
+        seed (int): The seed of the random number generator.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    byte_count = 0
+    with open(output_file_path, "w", encoding="utf-8") as output_file:
+        for verse_block in iter_verse_blocks(scale, seed):
+            output_file.write(verse_block)
+            byte_count += len(verse_block.encode("utf-8"))
+    return byte_count
+
+
+if __name__ == '__main__':
+    scale = float(input("Enter the scale relative to merged_sbl.txt (e.g. 10): ") or 1)
+    output_file_path = input("Enter the output file path: ")
+    print(f"Wrote {write_apparatus(output_file_path, scale)} bytes to {output_file_path}")
@@ -0,0 +1,234 @@
+"""
+This script builds a verse index for a textual apparatus file such as merged_sbl.txt
+and uses it to parse only the verses that are asked for.
+
+The index maps the verse ID of each book/chapter/verse header
+(see 'parse_sbl.encode_verse_id()') to the byte range of its verse block.
+It is built with a single scan of the file and saved next to it
+(for example merged_sbl.txt.idx), and it is rebuilt whenever the file changes.
+A range of verses, chapters, or books is then parsed by memory-mapping the file
+and decoding only the bytes between the first and last requested verse:
+
+    parse_range("Matthew 5:1", "Matthew 7:29")
+    parse_range("Romans 5", "Romans 8")
+"""
+
+# -- coding: utf-8 --
+
+# =============================================================================
+# STEP 1:
+#    Initialize script
+# =============================================================================
+
+
+# Step 1a: Import necessary libraries
+
+import json
+import mmap
+import os
+from bisect import bisect_left, bisect_right
+
+import parse_sbl
+
+# Step 1b: Define global variables
+default_input_file = "merged_sbl.txt"
+index_suffix = ".idx"
+index_version = 2
+
+# =============================================================================
+# STEP 2:
+#    Build the verse index
+# =============================================================================
+
+# Step 2a: Define 'build_index()' function
+
+
+def build_index(input_file):
+    """
+    Scans the input file once for book/chapter/verse headers
+    and records the byte range of each verse block.
+    A verse block whose header has no verse ID (a book missing from 'parse_sbl.book_names')
+    ends the block before it but is not indexed.
+    The verse ranges are looked up by bisecting the entries,
+    so the verses must be in canonical order, and each must appear only once.
+
+    Args:
+        input_file (str): The path to the input file.
+
+    Returns:
+        list: A list of [verse_id, start, end] entries in file order,
+        where 'start' and 'end' are the byte offsets of the verse block.
+
+    Raises:
+        ValueError: If the verses are not in canonical order, or a verse appears twice.
+    """
+    entries = []
+    offset = 0
+    current_entry = None
+    with open(input_file, "rb") as file:
+        for line in file:
+            line_text = line.decode("utf-8")
+            if parse_sbl.line_header_pattern.match(line_text):
+                if current_entry is not None:
+                    current_entry[2] = offset
+                verse_id = parse_sbl.parse_header_line(line_text.strip()).verse_id
+                current_entry = [verse_id, offset, None]
+                if verse_id is not None:
+                    if entries and verse_id <= entries[-1][0]:
+                        raise ValueError(
+                            f"{input_file!r} is not in verse order at {line_text.strip()!r}")
+                    entries.append(current_entry)
+            offset += len(line)
+    if current_entry is not None:
+        current_entry[2] = offset
+    return entries
+
+# Step 2b: Define 'get_index_path()' function
+
+
+def get_index_path(input_file):
+    """
+    Returns the path of the index file saved next to the input file.
+
+    Args:
+        input_file (str): The path to the input file.
+
+    Returns:
+        str: The path of the index file.
+    """
+    return input_file + index_suffix
+
+# Step 2c: Define 'load_index()' function
+
+
+def load_index(input_file):
+    """
+    Loads the saved index of the input file,
+    building and saving it first if it is missing or out of date.
+
+    Args:
+        input_file (str): The path to the input file.
+
+    Returns:
+        list: The index entries, as returned by 'build_index()'.
+
+    Raises:
+        ValueError: If the verses of the input file are not in canonical order.
+    """
+    source_stat = os.stat(input_file)
+    index_path = get_index_path(input_file)
+
+    # Step 2c1: Use the saved index if it was built from the current version of the file.
+    try:
+        with open(index_path, "r", encoding="utf-8") as index_file:
+            saved_index = json.load(index_file)
+        if (saved_index.get("version") == index_version
+                and saved_index.get("source_size") == source_stat.st_size
+                and saved_index.get("source_mtime_ns") == source_stat.st_mtime_ns):
+            return saved_index["entries"]
+    except (OSError, ValueError):
+        pass
+
+    # Step 2c2: Otherwise rebuild the index and save it next to the input file.
+    # A read-only directory only costs rebuilding the index on the next run.
+    entries = build_index(input_file)
+    try:
+        with open(index_path, "w", encoding="utf-8") as index_file:
+            json.dump({
+                "version": index_version,
+                "source_size": source_stat.st_size,
+                "source_mtime_ns": source_stat.st_mtime_ns,
+                "entries": entries,
+            }, index_file)
+    except OSError:
+        pass
+    return entries
+
+# =============================================================================
+# STEP 3:
+#    Look up verse ranges
+# =============================================================================
+
+# Step 3a: Define 'find_byte_range()' function
+
+
+def find_byte_range(entries, start_reference, end_reference=None):
+    """
+    Finds the byte range of the verse blocks from 'start_reference' to 'end_reference'.
+    A reference can name a book, a chapter, or a verse, as in 'parse_sbl.get_verse_id_range()'.
+    Verses without an apparatus entry are skipped,
+    so the range covers every indexed verse between the two references.
+
+    Args:
+        entries (list): The index entries, as returned by 'load_index()',
+        which are in canonical order.
+        start_reference (str): The first book, chapter, or verse, for example "Matthew 5:1".
+        end_reference (str): The last book, chapter, or verse. Defaults to 'start_reference'.
+
+    Returns:
+        tuple: A tuple containing the start and end byte offsets,
+        or None if no indexed verse falls within the range.
+
+    Raises:
+        ValueError: If a reference is not a book, chapter, or verse of 'parse_sbl.book_names'.
+    """
+    first_verse_id, last_verse_id = parse_sbl.get_verse_id_range(start_reference, end_reference)
+
+    # Step 3a1: Binary search the verse IDs of the entries.
+    verse_ids = [verse_id for verse_id, _, _ in entries]
+    first = bisect_left(verse_ids, first_verse_id)
+    last = bisect_right(verse_ids, last_verse_id)
+    if first >= last:
+        return None
+    return entries[first][1], entries[last - 1][2]
+
+# Step 3b: Define 'read_byte_range()' function
+
+
+def read_byte_range(input_file, start, end):
+    """
+    Memory-maps the input file and decodes the bytes from 'start' to 'end'.
+
+    Args:
+        input_file (str): The path to the input file.
+        start (int): The first byte offset.
+        end (int): The byte offset after the last byte.
+
+    Returns:
+        str: The decoded text.
+    """
+    with open(input_file, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            return mapped_file[start:end].decode("utf-8")
+
+# =============================================================================
+# STEP 4:
+#    Parse a verse range
+# =============================================================================
+
+# Step 4a: Define 'parse_range()' function
+
+
+def parse_range(start_reference, end_reference=None, input_file=default_input_file):
+    """
+    Parses only the verse blocks from 'start_reference' to 'end_reference'.
+    Record numbers start from the beginning of the range, not of the whole file.
+
+    Args:
+        start_reference (str): The first book, chapter, or verse, for example "Matthew 5:1".
+        end_reference (str): The last book, chapter, or verse, for example "Matthew 7:29".
+        Defaults to 'start_reference'.
+        input_file (str): The path to the input file.
+
+    Returns:
+        pd.DataFrame: A pandas DataFrame with the 'parse_sbl.output_columns',
+        holding the records of the requested verses.
+
+    Raises:
+        ValueError: If a reference is invalid,
+        or the verses of the input file are not in canonical order.
+    """
+    byte_range = find_byte_range(load_index(input_file), start_reference, end_reference)
+    if byte_range is None:
+        return parse_sbl.records_to_dataframe([])
+    return parse_sbl.extract_data(read_byte_range(input_file, *byte_range))
@@ -1,6 +1,10 @@
 """
 This script copies the text from the folder /sbl_parser/SBLGNT-master/data/sblgntapp/text/
 and pastes it into a single file in /sbl_parser/merged_sbl.txt
+
+The same per-book text can also be read directly, without writing the merged file,
+with 'iter_book_texts()', which reads the books concurrently
+and yields them in canonical order.
 """
 
 # -- coding: utf-8 --
@@ -14,20 +18,11 @@ and pastes it into a single file in /sbl_parser/merged_sbl.txt
 # Step 1a: Import necessary libraries
 
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # =============================================================================
 # STEP 2:
-#    Establish file paths
-# =============================================================================
-
-# Step 2a: Prompt the user to enter the input directory and output file paths
-
-input_directory = input("Enter path for input directory: ").strip()
-output_file = input("Enter path for output file: ").strip()
-
-
-# =============================================================================
-# STEP 3:
 #    Name files
 # =============================================================================
 
@@ -65,46 +60,111 @@ file_names = [
 
 # =============================================================================
 # STEP 3:
-#    Merge files
+#    Read books
 # =============================================================================
 
-# Step 3a: Define 'merge_sbl_files()' function
+# Step 3a: Define 'read_book_text()' function
 
-def merge_sbl_files(input_directory, output_file):
 
-    # Step 3b: Create output file
+def read_book_text(input_directory, file_name):
+    """
+    Reads the text of one book as it is copied into the merged file:
+    the first line (Greek book title) is skipped, and leading/trailing whitespace
+    is removed from the line after it.
 
-    output_file = "merged_sbl.txt"
+    Args:
+        input_directory (str): The path to the directory containing the per-book files.
+        file_name (str): The name of the book's file, for example "Matt.txt".
 
-    # Step 3c: Copy & paste
+    Returns:
+        str: The text of the book.
+    """
+    file_path = os.path.join(input_directory, file_name)
+    with open(file_path, "r", encoding="utf-8") as input_file:
 
-    with open(output_file, "w", encoding="utf-8") as output:
-        for index, file_name in enumerate(file_names):
-            file_path = os.path.join(input_directory, file_name)
-            with open(file_path, "r", encoding="utf-8") as input_file:
+        # Skip the first line (Greek book title)
+        input_file.readline()
+
+        # Read the next line and remove leading/trailing whitespaces,
+        # then add the rest of the file without adding a newline character
+        next_line = input_file.readline().strip()
+        return next_line + input_file.read()
+
+# Step 3b: Define 'iter_read_ahead()' function
+
+
+def iter_read_ahead(executor, input_directory, max_pending):
+    """
+    Reads the books through a thread pool and yields their text in canonical order,
+    with at most 'max_pending' reads submitted but not yet yielded,
+    so that a slow book never leaves the rest of the corpus waiting in memory.
 
-                # Skip the first line (Greek book title)
-                input_file.readline()
+    Args:
+        executor (ThreadPoolExecutor): The thread pool.
+        input_directory (str): The path to the directory containing the per-book files.
+        max_pending (int): The number of reads to keep in flight, such as the number of threads.
 
-                # Read the next line and remove leading/trailing whitespaces
-                next_line = input_file.readline().strip()
+    Yields:
+        str: The text of each book, as returned by 'read_book_text()'.
+    """
+    pending = deque()
+    for file_name in file_names:
+        pending.append(executor.submit(read_book_text, input_directory, file_name))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
 
-                # Write the next line without adding a newline character
-                output.write(next_line)
-                content = input_file.read()
+# Step 3c: Define 'iter_book_texts()' function
 
-                # Check if it's the last file
-                if index == len(file_names) - 1:
 
-                    # Remove trailing spaces from the last line of the last file
-                    content = content.rstrip()
+def iter_book_texts(input_directory, workers=4):
+    """
+    Reads the books concurrently through a thread pool
+    and yields their text in canonical order, each as soon as it
+    and every book before it have been read.
+    Only a few books are read ahead of the book being yielded (see 'iter_read_ahead()').
+    The concatenation of the yielded texts is identical to the merged file.
 
-                output.write(content)
+    Args:
+        input_directory (str): The path to the directory containing the per-book files.
+        workers (int): The number of threads reading the books.
+
+    Yields:
+        str: The text of each book, ending with a single newline character.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        book_texts = iter_read_ahead(executor, input_directory, workers)
+        for index, book_text in enumerate(book_texts):
+
+            # Remove trailing spaces from the last line of the last file
+            if index == len(file_names) - 1:
+                book_text = book_text.rstrip()
+
+            # Add a single newline character at the end of each book
+            yield book_text + "\n"
+
+# =============================================================================
+# STEP 4:
+#    Merge files
+# =============================================================================
+
+# Step 4a: Define 'merge_sbl_files()' function
+
+
+def merge_sbl_files(input_directory, output_file="merged_sbl.txt"):
+
+    # Step 4b: Copy & paste each book into the output file
+
+    with open(output_file, "w", encoding="utf-8") as output:
+        for book_text in iter_book_texts(input_directory):
+            output.write(book_text)
 
-                # Add a single newline character at the end of each book
-                output.write("\n")
+# Step 4c: Prompt the user to enter the input directory and output file paths,
+# then call the 'merge_sbl_files() function
 
-# Step 3d: Call the 'merge_sbl_files() function
 
 if __name__ == "__main__":
+    input_directory = input("Enter path for input directory: ").strip()
+    output_file = input("Enter path for output file: ").strip()
     merge_sbl_files(input_directory, output_file)
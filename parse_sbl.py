@@ -6,7 +6,8 @@ The script parses the input text file, extracts the data,
 and assigns group, variant, and occurrence numbers to each entry in the data.
 The output Excel file contains one row for each textual variant,
 with columns for book name, chapter number, verse number,
-textual variant, witness abbreviation, group number, variant number, and occurrence number.
+textual variant, witness abbreviation, group number, variant number, and occurrence number,
+and an integer verse ID that sorts in canonical order (see 'encode_verse_id()').
 
 For more information on how to use this script,
 please refer to the README.md file in the project directory.
@@ -20,20 +21,92 @@ please refer to the README.md file in the project directory.
 # =============================================================================
 
 
-# Step 1a: Import necessary libraries
+# Step 1a: Import necessary libraries.
+# pandas and numpy are imported inside the functions that build DataFrames,
+# so that importing this module stays fast and free of side effects.
 
+import contextlib
+import io
+import os
 import re
-import pandas as pd
-from collections import defaultdict
-import numpy as np
-
-# Step 1b: Define global variables
+import sys
+from array import array
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+
+# Step 1b: Define global variables.
+# Records are yielded only for the witnesses in this list,
+# which can be changed by passing a different list to the parser.
+witness_abbreviations = ["WH", "NA28", "Treg", "RP"]
 header_pattern = re.compile(
-    r'^(?P<book_name>[\w\d\s]+)\s+(?P<chapter_num>\d+):(?P<verse_num>\d+)')
+    r'^(?P<book_name>(?:[1-3]\s)?[^\W\d_]+(?:\s[^\W\d_]+)*)'
+    r'\s+(?P<chapter_num>\d+):(?P<verse_num>\d+)\s*$')
 group_pattern = re.compile(
     r'^\s*•\s*')
-variant_pattern = re.compile(
-    r'(?P<text_var>[\w\-\[\]\s\+\–]+)(?P<witness_abbr>\b(?:WH|NA28|Treg|RP)+\b)')
+
+# Step 1c: Define the tokenizer.
+# A single pattern, compiled once, classifies every token of a line in one scan:
+# - header: a 'Book chapter:verse' line, such as "1 Corinthians 13:4"
+# - group: the '•' that starts each group after the first
+# - verse: the verse number (or chapter:verse, chapter.verse, or range) that starts the first group
+# - lemma_separator: the ']' between the lemma and the other readings
+# - reading_separator: the ';' after the witnesses of a reading
+# - addition, omission, ellipsis: the '+', '–', and '…' markers
+# - emendation: the 'em' marker before the witnesses of an emended reading, as in "τῆς em NA28",
+#   which is not part of the reading's text
+# - witness: a witness abbreviation, such as "NA28", "⟦WH⟧", or "NIV.",
+#   also when it is written straight after an omission or a Greek word,
+#   as in "–RP" or "τινεςWH"
+# - word: any other word of a reading, up to a witness written straight after it
+# Because words such as "Intermediate" look like witnesses, only the witnesses
+# at the end of a reading are treated as its witnesses (see 'iter_readings()').
+line_header_pattern = header_pattern
+witness_pattern = r'⟦?(?P<witness_name>[A-Z][A-Za-z0-9]*)⟧?\.?(?=;|\s|$)'
+glued_witness_pattern = r'⟦?[A-Z][A-Za-z0-9]*⟧?\.?(?=;|\s|$)'
+token_pattern = re.compile(
+    r'(?P<header>' + header_pattern.pattern + r')'
+    r'|(?P<group>^\s*•)'
+    r'|(?P<verse>^\d+(?:[:.]\d+)?(?:–\d+(?:[:.]\d+)?)?(?!\S))'
+    r'|(?P<lemma_separator>(?<!\S)\](?!\S))'
+    r'|(?P<reading_separator>(?<=[A-Za-z0-9⟧.]);)'
+    r'|(?P<addition>(?<!\S)\+(?!\S))'
+    r'|(?P<omission>(?<!\S)–(?=\s|[A-Z⟦]|$))'
+    r'|(?P<ellipsis>(?<!\S)…(?!\S))'
+    r'|(?P<emendation>(?<!\S)em(?=\s+⟦?[A-Z]))'
+    r'|(?P<witness>(?<![!-~])' + witness_pattern + r')'
+    r'|(?P<word>\S+?(?=\s|$|(?<=[^\x00-\x7f])' + glued_witness_pattern + r'))')
+reading_token_kinds = {"word", "addition", "omission", "ellipsis"}
+Token = namedtuple('Token', ['kind', 'text', 'value', 'offset'])
+Reading = namedtuple('Reading', ['text', 'witnesses', 'offset', 'length'])
+
+# Step 1d: Define the output columns and the record type yielded by the parser
+output_columns = [
+    "record_number", "book_name", "chapter_number", "verse_number",
+    "textual_variant", "witness_abbreviation",
+    "group_number", "variant_number", "occurrence_number", "verse_id"]
+VariantRecord = namedtuple('VariantRecord', output_columns)
+categorical_columns = ["book_name", "witness_abbreviation"]
+
+# Step 1e: Define the book names of the headers, in the canonical order
+# of their per-book files in merge_sbl_files.file_names.
+book_names = [
+    "Matthew", "Mark", "Luke", "John", "Acts", "Romans", "1 Corinthians", "2 Corinthians",
+    "Galatians", "Ephesians", "Philippians", "Colossians", "1 Thessalonians",
+    "2 Thessalonians", "1 Timothy", "2 Timothy", "Titus", "Philemon", "Hebrews", "James",
+    "1 Peter", "2 Peter", "1 John", "2 John", "3 John", "Jude", "Revelation"]
+
+# Step 1f: Define the verse ID codec.
+# A verse ID packs the book number (its position in 'book_names', from 1),
+# the chapter number, and the verse number into one integer, such as 6005001 for Romans 5:1,
+# so that verse IDs sort in canonical order and fit in 32 bits.
+book_numbers = {book_name: number for number, book_name in enumerate(book_names, start=1)}
+verse_id_book_factor = 1000000
+verse_id_chapter_factor = 1000
+Header = namedtuple(
+    'Header', ['text', 'book_name', 'chapter_number', 'verse_number', 'verse_id'])
+reference_range_pattern = re.compile(
+    r'^\s*(?P<book_name>(?:[1-3]\s)?[^\W\d_]+(?:\s[^\W\d_]+)*)'
+    r'(?:\s+(?P<chapter_num>\d+)(?::(?P<verse_num>\d+))?)?\s*$')
 
 # =============================================================================
 # STEP 2:
@@ -51,40 +124,28 @@ def extract_textual_variants(input_text):  # BREAKPOINT
         input_text (str): The input text containing textual variants and witness abbreviations.
 
     Returns:
-        list: A list of tuples, where each tuple contains a textual variant
-        and its associated witness abbreviation.
+        list: A list of tuples, where each tuple contains a textual variant,
+        its associated witness abbreviations, and the offset and length of the reading
+        in the input text, so that its source can be found without keeping a copy of the text.
     """
 
-    # Step 2b: Define a regular expression pattern to match textual variants (with ellipses)
-    # and their associated witness abbreviations.
-    # The pattern consists of three parts:
-    # 1. Textual variant: (?:\S+\s*)…(?:\s*\S+)
-    # 2. Witness abbreviation: (.*?)
-    # 3. Lookahead assertion to ensure the correct end of the match: (?=•|\d+:\d+|$)
-    pattern = r"((?:\S+\s*)…(?:\s*\S+))\s*(.*?)\s*(?=•|\d+:\d+|$)"
-
-    # Step 2c: Use 're.findall' to find all matches of the pattern in the input text.
-    # 're.MULTILINE' flag is used to handle multiline input text.
-    matches = re.findall(pattern, input_text)
+    # Step 2b: Tokenize the input text and assemble the tokens into readings.
+    # Each reading, with or without an ellipsis, is matched by the same tokenizer
+    # as the rest of the parser.
+    readings = [item for item in iter_readings(iter_tokens(input_text))
+                if isinstance(item, Reading) and item.witnesses]
 
-    # Step 2d: Initialize an empty list to store the extracted data.
+    # Step 2c: Initialize an empty list to store the extracted data.
     extracted_data = []
 
-    # Step 2e: Iterate through all matches found.
-    for match in matches:
-        # Each 'match' is a tuple containing the textual variant
-        # and its associated witness abbreviation.
-        textual_variant, witness_abbreviation = match
-
-        # Append the current match (tuple) to the 'extracted_data' list.
-        extracted_data.append((textual_variant, witness_abbreviation))
-
-    # Step 2f: Create 'input_text' column and assign input_text to every row
-    input_text_list = [input_text] * len(extracted_data)
-    for i, input_text in enumerate(input_text_list):
-        extracted_data[i] += (input_text,)
+    # Step 2d: Iterate through all readings found.
+    for reading in readings:
+        # Append the textual variant, its witness abbreviations, and its source span
+        # to the 'extracted_data' list.
+        extracted_data.append(
+            (reading.text, ' '.join(reading.witnesses), reading.offset, reading.length))
 
-    # Step 2g: Return the list of extracted textual variants and witness abbreviations.
+    # Step 2e: Return the list of extracted textual variants and witness abbreviations.
     return extracted_data
 
 # =============================================================================
@@ -100,7 +161,13 @@ def extract_textual_variants(input_text):  # BREAKPOINT
 def assign_identifier_numbers(data_frame):
     """
     Assigns group numbers, variant numbers, and occurrence numbers
-    to each column in each row of the DataFrame.
+    to each row of a copy of the DataFrame sorted by textual variant and group number.
+
+    The numbers are assigned in a single pass over the sorted keys:
+    the rows are sorted once, each textual variant is replaced by an integer code,
+    and the three columns are assigned in bulk rather than one cell at a time.
+    The running time is therefore O(n log n) in the number of rows,
+    dominated by the sort.
 
     Args:
         data_frame (pd.DataFrame): A pandas DataFrame with columns:
@@ -108,16 +175,19 @@ def assign_identifier_numbers(data_frame):
         'textual_variant', 'witness_abbreviation', 'group_number', and 'occurrence_number'
 
     Returns:
-        None: This function modifies the input DataFrame in-place, adding 'group_number'
-        and 'occurrence_number' columns to assign unique identifier numbers to each row of
-        the DataFrame based on its group and occurrence (NOT 'variant_number' column).
-
+        pd.DataFrame: The sorted copy of the DataFrame with 'group_number' set to 1,
+        'variant_number' numbering each distinct textual variant from 1 in sorted order,
+        and 'occurrence_number' counting the rows of each textual variant from 1.
+        Rows without a textual variant are numbered 0. The input DataFrame is not modified.
     """
 
-    # Step 3b NEW: Check to make sure the necessary columns are present in the DataFrame
+    import numpy as np
+    import pandas as pd
+
+    # Step 3b: Check to make sure the necessary columns are present in the DataFrame
     if not all(col in data_frame.columns for col in [
-        'record_number', 'book_name', 'chapter_number',
-        'verse_number', 'textual_variant', 'witness_abbreviation']):
+            'record_number', 'book_name', 'chapter_number',
+            'verse_number', 'textual_variant', 'witness_abbreviation']):
         raise ValueError('One or more required columns not found in DataFrame')
 
     # Step 3c: Sort data frame by textual variant,
@@ -130,110 +200,27 @@ def assign_identifier_numbers(data_frame):
     else:
         raise ValueError('group_number column not found in DataFrame')
 
-    # Step 3d: check to make sure the 'book_name' column is present in the DataFrame
-    if 'book_name' not in data_frame.columns:
-        raise ValueError('book_name column not found in DataFrame')
-
-    # Step 3e: Group data frame by textual variant and group number
-    grouped_data = data_frame.groupby(['textual_variant', 'group_number'])
-
-    # Step 3f: Iterate through each group in the grouped DataFrame.
-    last_variant = ""
-    last_input_text = ""
-    for group_name, group_data in grouped_data:
-
-        # Step 3f1: Assign a unique identifier number to each group of data
-        # based on its textual variant and group number
-        group_data['group_identifier'] = f"{group_name[0]}_{group_name[1]}"
-        group_data['group_identifier'] = group_data['group_identifier'].astype('category').cat.codes
-
-    # Step 3g: Create a new 'group_number' column
-    # based on the unique combination of 'textual_variant', 'group_number', and 'book_name'
-    data_frame['group_number'] = data_frame.apply(
-        lambda row: f"{row['textual_variant']}_{row['group_number']}_{row['book_name']}", axis=1)
-
-    # Step 3h: Assign unique identifier numbers to each group based on their 'group_number'
-    data_frame['input_text'] = data_frame.groupby('group_number').ngroup()
-
-    # Step 3i: Drop the 'group_number' column since we no longer need it
-    data_frame.drop(columns=['group_number'], inplace=True)
-
-    # Step 3j: Initialize new columns in the DataFrame
-    # for group numbers, variant numbers, and occurrence numbers
-    data_frame['group_number'] = pd.Series(np.zeros(len(data_frame), dtype=int))
-    data_frame['variant_number'] = pd.Series(np.zeros(len(data_frame), dtype=int))
-    data_frame['occurrence_number'] = pd.Series(np.zeros(len(data_frame), dtype=int))
-
-
-    # Step 3k: Initialize variables for tracking the following identifiers:
-    # group numbers, variant numbers, and occurrence numbers. These variables will be used
-    # to assign unique identifier numbers to each row of the DataFrame.
-    group_number = 1
-    variant_number = 1 # Added variant_number initialization
-    occurrence_number = 1
-    last_group = ""
-    last_record = ""
-
-    # Step 3l: Group the data frame by textual variant and record number
-    grouped_data = data_frame.groupby(['textual_variant', 'group_number'])
-
-    # Step 3m: Iterate through each group in the grouped DataFrame.
-    last_variant = ""
-    last_input_text = ""
-    for group_name, group_data in grouped_data:
-        # Check if the current textual variant and record number is different from the last one.
-        if last_variant != group_name[0] or last_record != group_name[1]:
-            # If the textual variant and record number is different,
-            # reset group_number and occurrence_number.
-            group_number = 1
-            variant_number = 1 # Added variant_number reset
-            # REMOVED:
-            # variant_number += 1
-            occurrence_number = 1
-
-        # Step 3m1: Iterate through each row in the current group.
-        # ***change the second iteration variable name
-        # ***to something other than group_data
-        # ***to avoid name conflicts with the grouped data in Step 3h.
-        for (textual_variant, input_text), row_data in grouped_data:  # BREAKPOINT
-
-            # Step 3m2: Check if the current textual variant
-            # and input_text is different from the last one.
-            if last_variant != textual_variant or last_input_text != input_text:
-                # If the textual variant and group number is different,
-                # reset variant_number and occurrence_number.
-                variant_number += 1
-                occurrence_number = 1
-                # Update last_group variable for the next iteration
-                last_group = group_number
-
-            # Step 3m3: Iterate through each row in the current group.
-            for occurrence_number, index in enumerate(row_data.index):
-
-                # Step 3m4: Update the last_variant and last_input_text variables for the next iteration.
-                last_variant = textual_variant
-                last_input_text = input_text
-
-                # Step 3m5: Update the current row with the following calculated identifiers:
-                # group_number, variant_number, and occurrence_number.
-                # These numbers are based on the group, variant, and occurrence of the current row within the DataFrame.
-                data_frame.at[index, "group_number"] = group_number
-                data_frame.at[index, "variant_number"] = variant_number
-                data_frame.at[index, "occurrence_number"] = occurrence_number
-                # BREAKPOINT
-
-                # Step 3m6: Increment the occurrence_number for the next iteration.
-                if occurrence_number != 0:
-                    # Increment the occurrence_number for the next iteration.
-                    occurrence_number += 1
-
-            # Step 3m7: Increment the variant_number for the next iteration.
-            if occurrence_number == 1:
-                variant_number += 1
-
-            # Step 3m8: Reset the occurrence_number for the next iteration.
-            if occurrence_number != 0:
-                occurrence_number = 1
+    # Step 3d: Replace each textual variant with an integer code.
+    # Because the DataFrame is sorted, the codes are non-decreasing,
+    # and rows without a textual variant are given the code -1.
+    variant_codes, _ = pd.factorize(data_frame['textual_variant'], sort=True)
+    has_variant = variant_codes >= 0
+
+    # Step 3e: Find the first row of each run of equal codes in a single pass,
+    # and number the rows of each run from 1.
+    row_positions = np.arange(len(data_frame))
+    is_run_start = np.ones(len(data_frame), dtype=bool)
+    is_run_start[1:] = variant_codes[1:] != variant_codes[:-1]
+    run_start_positions = np.maximum.accumulate(np.where(is_run_start, row_positions, 0))
+
+    # Step 3f: Assign the group numbers, variant numbers, and occurrence numbers in bulk.
+    data_frame['group_number'] = np.where(has_variant, 1, 0)
+    data_frame['variant_number'] = np.where(has_variant, variant_codes + 1, 0)
+    data_frame['occurrence_number'] = np.where(
+        has_variant, row_positions - run_start_positions + 1, 0)
+
+    # Step 3g: Return the numbered DataFrame
+    return data_frame
 
 # =============================================================================
 # STEP 4:
@@ -256,6 +243,8 @@ def create_dataframe(header, extracted_data):
         pd.DataFrame: A DataFrame containing the header and extracted data.
     """
 
+    import pandas as pd
+
     # Step 4b: Extract the book name, chapter number, and verse number from the header.
     book_name, chapter_number, verse_number = parse_header(header)
 
@@ -288,18 +277,10 @@ def create_dataframe(header, extracted_data):
         [data_frame, pd.DataFrame(rows)], ignore_index=True
         )
 
-    # REMOVE???
-    # Step 4e Append a new row to the data_frame with the following values:
-    # - book_name, chapter_number, and verse_number from the header
-    # - textual_variant, witness_abbreviation, and occurrence_number from the current row in the extracted_data
-    # - group_number and variant_number will be assigned later in the assign_identifier_numbers() function
-    # data_frame = pd.DataFrame(rows, columns=[
-    #    "record_number", "book_name", "chapter_number", "verse_number",
-    #    "textual_variant", "witness_abbreviation", "occurrence_number"
-    #])
-
-    # Step 4f: Assign group_number, variant_number, and occurrence_number to the DataFrame.
-    assign_identifier_numbers(data_frame)
+    # Step 4f: Assign group_number, variant_number, and occurrence_number to the DataFrame,
+    # then restore the input order of the rows, which 'assign_identifier_numbers()' sorts.
+    data_frame = assign_identifier_numbers(data_frame).sort_values(
+        by='record_number', ignore_index=True)
 
     # Step 4g: Reorder the columns in the DataFrame to match the desired order.
     data_frame = data_frame[["record_number", "book_name", "chapter_number", "verse_number",
@@ -318,7 +299,22 @@ def create_dataframe(header, extracted_data):
 #    Parse the header information.
 # =============================================================================
 
-# Step 5a: Define 'parse_header()' function to extract values from the input text
+# Step 5a: Define 'find_header_token()' function to find the first header in the input text
+
+
+def find_header_token(input_text):
+    """
+    Tokenizes the input text until the first header is found.
+
+    Args:
+        input_text (str): The input text containing the header information.
+
+    Returns:
+        Token: The first header token, or None if the input text has no header.
+    """
+    return next((token for token in iter_tokens(input_text) if token.kind == 'header'), None)
+
+# Step 5b: Define 'parse_header()' function to extract values from the input text
 # such as book_name, chapter_number, and verse_number.
 
 
@@ -333,46 +329,185 @@ def parse_header(input_text):
         tuple: A tuple containing the book name, chapter number, and verse number.
     """
 
-    # Define a regex pattern to match the book name, chapter number, and verse number.
-    pattern = r"(\w+)\s+(\d+):(\d+)"
-
-    # Search for the pattern in the input text.
-    match = re.search(pattern, input_text)
+    # Search for the first header in the input text.
+    header = read_header(input_text)
 # BREAKPOINT
 
-    # Step 5b: Extract the book name, chapter number, and verse number from the header text
+    # Step 5c: Return the book name, chapter number, and verse number from the header.
+    return header.book_name, header.chapter_number, header.verse_number
 
-    if match:
-        # If a match is found, extract the book name, chapter number, and verse number.
-        book_name = match.group(1)
-        chapter_number = int(match.group(2))
-        verse_number = int(match.group(3))
+# Step 5d: Define 'run_demo()' function to run the parser
+# on a sample input text containing the header information.
 
-        # Return the extracted information as a tuple.
-        return book_name, chapter_number, verse_number
-    else:
-        # If no match is found, raise a ValueError.
-        raise ValueError("Invalid header format")
 
-# Step 5c: Initialize the input_text variable
-# with a sample input text containing the header information.
-# Main processing code
-input_text = """
+demo_input_text = """
 Matthew 1:5
 1:5 Βόες … Βόες WH NA28 ] Βοὸς … Βοὸς Treg; Βοὸζ … Βοὸζ RP
 • Ἰωβὴδ … Ἰωβὴδ WH Treg NA28 ] Ὠβὴδ … Ὠβὴδ RP
 """
 
 
-# Step 5d: Extract the textual variants and witness abbreviations from the input text.
+def run_demo(input_text=demo_input_text):
+    """
+    Extracts the textual variants and witness abbreviations from a sample input text
+    and creates a DataFrame from them.
+
+    Args:
+        input_text (str): The sample input text. Defaults to 'demo_input_text'.
 
-extracted_data = extract_textual_variants(input_text)
-# BREAKPOINT
+    Returns:
+        pd.DataFrame: The DataFrame returned by 'create_dataframe()'.
+    """
 
-# Step 5e: Create a Pandas DataFrame with the required columns
+    # Step 5e: Extract the textual variants and witness abbreviations from the input text.
+    extracted_data = extract_textual_variants(input_text)
 
-data_frame = create_dataframe(input_text, extracted_data)
-# BREAKPOINT
+    # Step 5f: Create a Pandas DataFrame with the required columns
+    return create_dataframe(input_text, extracted_data)
+
+# Step 5e: Define 'read_header()' function, the memoized path shared by
+# 'parse_header()' and 'extract_header()'.
+
+
+def read_header(input_text):
+    """
+    Finds the first header line of the input text and parses it with 'parse_header_line()'.
+
+    Args:
+        input_text (str): The input text containing the header information.
+
+    Returns:
+        Header: The header, as returned by 'parse_header_line()'.
+
+    Raises:
+        ValueError: If the input text has no header.
+    """
+    for line in io.StringIO(input_text):
+        if line_header_pattern.match(line):
+            return parse_header_line(line.strip())
+    raise ValueError("Invalid header format")
+
+# Step 5f: Define 'parse_header_line()' function
+
+
+@lru_cache(maxsize=8192)
+def parse_header_line(header_text):
+    """
+    Parses a header line such as "Romans 5:1". The result is memoized,
+    since the same headers are parsed again and again.
+
+    Args:
+        header_text (str): The header line, without leading/trailing whitespace.
+
+    Returns:
+        Header: A named tuple with the fields 'text', 'book_name', 'chapter_number',
+        'verse_number', and 'verse_id'.
+
+    Raises:
+        ValueError: If the line is not a header.
+    """
+    match = header_pattern.match(header_text)
+    if not match:
+        raise ValueError("Invalid header format")
+    book_name = match.group('book_name')
+    chapter_number = int(match.group('chapter_num'))
+    verse_number = int(match.group('verse_num'))
+    return Header(header_text, book_name, chapter_number, verse_number,
+                  encode_verse_id(book_name, chapter_number, verse_number))
+
+# Step 5g: Define 'encode_verse_id()' function
+
+
+def encode_verse_id(book_name, chapter_number, verse_number):
+    """
+    Packs a verse reference into a verse ID that sorts in canonical order.
+
+    Args:
+        book_name (str): The book name, one of 'book_names'.
+        chapter_number (int): The chapter number, from 0 to 999.
+        verse_number (int): The verse number, from 0 to 999.
+
+    Returns:
+        int: The verse ID, or None if the book is not one of 'book_names'
+        or a number is out of range.
+    """
+    book_number = book_numbers.get(book_name)
+    if (book_number is None or not 0 <= chapter_number < verse_id_chapter_factor
+            or not 0 <= verse_number < verse_id_chapter_factor):
+        return None
+    return (book_number * verse_id_book_factor + chapter_number * verse_id_chapter_factor
+            + verse_number)
+
+# Step 5h: Define 'decode_verse_id()' function
+
+
+def decode_verse_id(verse_id):
+    """
+    Unpacks a verse ID into its verse reference.
+
+    Args:
+        verse_id (int): A verse ID returned by 'encode_verse_id()'.
+
+    Returns:
+        tuple: A tuple containing the book name, chapter number, and verse number.
+    """
+    book_number, chapter_verse = divmod(verse_id, verse_id_book_factor)
+    chapter_number, verse_number = divmod(chapter_verse, verse_id_chapter_factor)
+    return book_names[book_number - 1], chapter_number, verse_number
+
+# Step 5i: Define 'get_verse_id_range()' function
+
+
+def get_verse_id_range(start_reference, end_reference=None):
+    """
+    Returns the lowest and highest verse IDs of a range of verses.
+    A reference can name a book ("Romans"), a chapter ("Romans 5"), or a verse ("Romans 5:1"),
+    and the range covers the whole of each end, so "Romans 5" to "Romans 8"
+    is all of Romans 5–8.
+
+    Args:
+        start_reference (str): The first book, chapter, or verse of the range.
+        end_reference (str): The last book, chapter, or verse of the range.
+        Defaults to 'start_reference'.
+
+    Returns:
+        tuple: The lowest and highest verse IDs of the range, both inclusive.
+
+    Raises:
+        ValueError: If a reference is not a book, chapter, or verse of 'book_names'.
+    """
+    bounds = []
+    for reference, bound in ((start_reference, 0), (end_reference or start_reference, 999)):
+        match = reference_range_pattern.match(reference)
+        if not match or match.group('book_name') not in book_numbers:
+            raise ValueError(f"Invalid verse reference: {reference!r}")
+        chapter_number = match.group('chapter_num')
+        verse_number = match.group('verse_num')
+        bounds.append(encode_verse_id(
+            match.group('book_name'),
+            bound if chapter_number is None else int(chapter_number),
+            bound if verse_number is None else int(verse_number)))
+    return bounds[0], bounds[1]
+
+# Step 5j: Define 'select_verse_range()' function
+
+
+def select_verse_range(data_frame, start_reference, end_reference=None):
+    """
+    Selects the rows of a range of verses with one vectorized comparison of the verse IDs,
+    for example all of Romans 5–8 with 'select_verse_range(data_frame, "Romans 5", "Romans 8")'.
+
+    Args:
+        data_frame (pd.DataFrame): A DataFrame with a 'verse_id' column.
+        start_reference (str): The first book, chapter, or verse of the range.
+        end_reference (str): The last book, chapter, or verse of the range.
+
+    Returns:
+        pd.DataFrame: The rows of the range.
+    """
+    first_verse_id, last_verse_id = get_verse_id_range(start_reference, end_reference)
+    verse_ids = data_frame['verse_id']
+    return data_frame[(verse_ids >= first_verse_id) & (verse_ids <= last_verse_id)]
 
 # =============================================================================
 # STEP 6: Defines the parse_variants() function,
@@ -403,73 +538,22 @@ def parse_variants(input_line):
     # Step 6a1: Prepare a list to store the results
     results = []
 
-    # Step 6a2: Check if the ' ] ' separator exists in the input line
-    if ' ] ' in input_line:
-
-        # If the separator exists,
-        # split the input_line at ' ] '
-        # to separate the first textual variant and the second textual variant
-        # Example: 'Βόες … Βόες WH NA28 ] Βοὸς … Βοὸς Treg'
-        first_variant_section, subsequent_variant_section = input_line.split(' ] ')
-
-        # Remove any whitespace at the beginning and end of the sections
-        first_variant_section = first_variant_section.strip()
-        subsequent_variant_section = subsequent_variant_section.strip()
-# BREAKPOINT
-
-    else:
-        # If the separator does not exist,
-        # consider the entire input line as the first textual variant section
-        first_variant_section = input_line.strip()
-
-        # If the separator does not exist,
-        # set an empty string for subsequent textual variant
-        subsequent_variant_section = ""
-
-        # Remove any whitespace at the beginning of the first variant section
-        first_variant_section = first_variant_section.strip()
-# BREAKPOINT
-
-    # Step 6b: Use a regular expression pattern
-    # to find all witness-text pairs in the first_variant_section.
-    # The pattern matches a group of characters that starts with one or more word characters,
-    # followed by one or more spaces, followed by one or more non-semicolon characters.
-    # Each match should be in the format: witness abbreviation followed by textual variant.
-    # Example: 'WH Βόες … Βόες', 'NA28 Βόες … Βόες'
-    first_variant_matches = re.findall(r'(\w+\s+[^;]+)', first_variant_section)
-
-    # Step 6c: Iterate through the matches to process each witness-text pair
-    for match in first_variant_matches:
-        # Split the match by the first space to get the witness and the text
-        # Example: 'WH', 'Βόες … Βόες'
-        witness, text = match.split(' ', 1)
-        # Add the (text, witness) tuple to the results list
-        results.append((f"v{len(results)+1}", text.strip(), witness.strip()))
-# BREAKPOINT
-
-    # Step 6d: If subsequent_variant_section is not empty,
-    if subsequent_variant_section:
-        # split it by '; ' to separate each subsequent variant.
-        # Example: 'Βοὸς … Βοὸς Treg; Βοὸζ … Βοὸζ RP …'
-        subsequent_variants_list = subsequent_variant_section.split('; ')
-
-        # Remove any whitespace at the beginning of each subsequent variant
-        subsequent_variants_list = [
-            variant.strip()
-            for variant in subsequent_variants_list
-        ]
-
-    # Step 6e: Iterate through the subsequent_variants_list to process each variant
-    for variant in subsequent_variants_list:
-        # Split the variant by the first space to get the witness and the text.
-        # Each variant should be in the format: textual variant followed by witness abbreviation.
-        # Example: 'Βοὸς … Βοὸς Treg', 'Βοὸζ … Βοὸζ RP'
-        witness, text = variant.split(' ', 1)
-        # Add the (text, witness) tuple to the results list
-        results.append((f"v{len(results)+1}", text.strip(), witness.strip()))
+    # Step 6b: Tokenize the input line in a single scan and assemble the tokens into readings.
+    # The ']' and ';' separators, the witnesses at the end of each reading,
+    # and the addition, omission, and ellipsis markers are all classified by the tokenizer.
+    # Example: 'Βόες … Βόες WH NA28 ] Βοὸς … Βοὸς Treg; Βοὸζ … Βοὸζ RP'
+    readings = [item for item in iter_readings(iter_tokens(input_line))
+                if isinstance(item, Reading)]
+
+    # Step 6c: Iterate through the readings to process each witness-text pair
+    for reading in readings:
+        for witness in reading.witnesses:
+            # Add the (variant number, text, witness) tuple to the results list
+            # Example: ('v1', 'Βόες … Βόες', 'WH'), ('v2', 'Βόες … Βόες', 'NA28')
+            results.append((f"v{len(results)+1}", reading.text, witness))
 # BREAKPOINT
 
-    # Step 6g: ADD DESCRIPTION
+    # Step 6d: Return the list of (variant number, textual variant, witness) tuples
     return results
 
 # =============================================================================
@@ -534,144 +618,357 @@ def clean_file_contents(file_path):
 # STEP 9: Extract data from the input file
 # =============================================================================
 
-# Step 9a: Define 'extract_data()' function.
+# Step 9a: Define 'iter_tokens()' function.
 
 
-def extract_data(input_text):
+def iter_tokens(lines, counters=None):
     """
-    Processes the input text to separate clusters of textual variants
-    and their witnesses into individual lines, and extracts relevant data
-    from each line using regular expressions.
+    Classifies every token of the input in a single scan of each line
+    with 'token_pattern', and yields the tokens in input order.
 
     Args:
-        input_text (str): A string containing the input file text.
+        lines (iterable[str] or str): A file object or any other iterable of input lines,
+        or the input text as a single string.
+        counters (dict): An optional dictionary, such as a defaultdict(int),
+        in which the number of 'tokens' found is counted.
+
+    Yields:
+        Token: A named tuple with the fields 'kind', 'text', 'value', and 'offset'.
+        The value of a header is a (book_name, chapter_number, verse_number) tuple,
+        the value of a witness is its abbreviation without brackets or a final period,
+        and the value of any other token is its text.
+        The offset is the position of the token's first character in the input.
+    """
+    if isinstance(lines, str):
+        lines = io.StringIO(lines)
+    line_offset = 0
+    for line in lines:
+        line_tokens = []
+        for match in token_pattern.finditer(line):
+            kind = match.lastgroup
+            text = match.group(kind)
+            if kind == 'witness':
+                line_tokens.append(Token(
+                    kind, text, match.group('witness_name'), line_offset + match.start()))
+            elif kind == 'header':
+                value = (match.group('book_name'),
+                         int(match.group('chapter_num')), int(match.group('verse_num')))
+                line_tokens.append(Token(kind, text.strip(), value, line_offset + match.start()))
+            elif kind == 'group':
+                line_tokens.append(Token(kind, '•', '•', line_offset + match.end() - 1))
+            else:
+                line_tokens.append(Token(kind, text, text, line_offset + match.start()))
+        if counters is not None:
+            counters['tokens'] += len(line_tokens)
+        line_offset += len(line)
+        yield from line_tokens
+
+# Step 9b: Define 'iter_readings()' function.
+
+
+def iter_readings(tokens):
+    """
+    Assembles the tokens of the input into readings.
+    Header and group tokens are passed through, so that the caller can track its position,
+    and each reading is yielded as soon as a separator, group, or header closes it.
 
-    Returns:
-        pd.DataFrame: A pandas DataFrame
-        where each row represents a variation unit observed in the witnesses.
-        The relevant fields for each row are
+    The witnesses of a reading are the witness tokens at its end.
+    A witness token followed by more words, such as "Intermediate" in
+    "+ Intermediate ending and 9–20 NIV.", is part of the reading's text.
+
+    Args:
+        tokens (iterable[Token]): The tokens yielded by 'iter_tokens()'.
+
+    Yields:
+        Token or Reading: A header or group token, or a Reading named tuple with the fields
+        'text' (the words and markers of the reading, joined by single spaces),
+        'witnesses' (the list of witness abbreviations),
+        and 'offset' and 'length' (the span of the reading, witnesses included, in the input).
+    """
+    text_parts = []
+    witness_tokens = []
+    reading_start = reading_end = 0
+    for token in tokens:
+        kind = token.kind
+
+        # Step 9b1: Collect the witnesses and words of the current reading,
+        # and extend its span to the end of each one.
+        if kind == 'witness':
+            if not text_parts and not witness_tokens:
+                reading_start = token.offset
+            witness_tokens.append(token)
+            reading_end = token.offset + len(token.text)
+            continue
+        if kind in reading_token_kinds:
+            if not text_parts and not witness_tokens:
+                reading_start = token.offset
+            if witness_tokens:
+                text_parts.extend(witness_token.text for witness_token in witness_tokens)
+                witness_tokens = []
+            text_parts.append(token.text)
+            reading_end = token.offset + len(token.text)
+            continue
+
+        # Step 9b2: The 'em' marker is skipped. Its witnesses follow it.
+        if kind == 'emendation':
+            continue
+
+        # Step 9b3: Any other token closes the current reading.
+        if text_parts or witness_tokens:
+            yield Reading(' '.join(text_parts),
+                          [witness_token.value for witness_token in witness_tokens],
+                          reading_start, reading_end - reading_start)
+            text_parts = []
+            witness_tokens = []
+        if kind == 'header' or kind == 'group':
+            yield token
+
+    if text_parts or witness_tokens:
+        yield Reading(' '.join(text_parts),
+                      [witness_token.value for witness_token in witness_tokens],
+                      reading_start, reading_end - reading_start)
+
+# Step 9c: Define 'iter_records()' function.
+
+
+def iter_records(fileobj, counters=None, witnesses=None):
+    """
+    Parses the input one token at a time and yields a VariantRecord
+    for each witness of each reading as soon as the reading has been closed.
+    Only the current reading is held in memory,
+    so memory use does not grow with the size of the input.
+
+    Args:
+        fileobj (iterable[str] or str): A file object opened in text mode,
+        any other iterable of input lines, or the input text as a single string.
+        counters (dict): An optional dictionary, such as a defaultdict(int),
+        in which the number of 'tokens', 'headers', 'groups', and 'variants' found is counted,
+        along with the 'unmatched_lines': header or '•' lines with readings
+        but without any witness in 'witnesses'.
+        witnesses (list[str]): The witness abbreviations to yield records for.
+        Defaults to 'witness_abbreviations'.
+
+    Yields:
+        VariantRecord: A named tuple with the fields
         'record_number', 'book_name', 'chapter_number', 'verse_number',
         'textual_variant', 'witness_abbreviation',
-        'group_number', 'variant_number', and 'occurrence_number'.
+        'group_number', 'variant_number', 'occurrence_number', and 'verse_id'.
+        The variant number is the position of the reading within its group,
+        the occurrence number counts the records of the same text within the group,
+        and the verse ID is the value of 'encode_verse_id()' for the verse.
     """
 
-    # Step 9b: Split the input text into lines.
-    lines = input_text.split("\n")
+    # Step 9c1: Choose the witnesses to yield records for.
+    witness_set = set(witness_abbreviations if witnesses is None else witnesses)
 
-    # Step 9c: Loop through each line and concatenate it with the previous line
-    # if it does not start with a book/chapter/verse header or a group marker.
-    line_groups = []
-    current_line_group = []
-    for line in lines:
-        header_pattern = re.compile(r'^\w+\s+\d+:\d+')
-        group_pattern = re.compile(r'^\s*•\s*')
-        if header_pattern.match(line) or group_pattern.match(line):
-            if current_line_group:
-                line_groups.append(' '.join(current_line_group))
-                current_line_group = []
-        current_line_group.append(line.strip())
-    if current_line_group:
-        line_groups.append(' '.join(current_line_group))
-
-    # Step 9d: Define regular expression patterns
-    # for matching book/chapter/verse headers and textual variants.
-    #This should account for alphanumeric book names like "1 Corinthians"
-    header_pattern = re.compile(
-        r'^(?P<book_name>[\w\d\s]+)\s+(?P<chapter_num>\d+):(?P<verse_num>\d+)')
-    group_pattern = re.compile(r'^\s*•\s*')
-    variant_pattern = re.compile(
-        r'(?P<text_var>[\+–]?[\w\-\[\]\s]+)(?P<witness_abbr>\b(?:WH|NA28|Treg|RP)+\b)')
-
-    # Step 9e: Loop through each line group and extract relevant data
-    # using the defined regular expression patterns.
-    # Create an empty list to store extracted data.
-    data_list = []
-
-    # Step 9f: Initialize variables to keep track of the current book, chapter, and verse.
+    # Step 9c2: Initialize variables to keep track of the current book, chapter, and verse.
     record_number = 1
     current_book = None
     current_chapter = None
     current_verse = None
+    current_verse_id = None
     group_number = 1
     variant_number = 1
     occurrence_counts = defaultdict(int)
+    group_reading_count = 0
+    group_record_count = 0
+
+    # Step 9c3: Loop through the headers, groups, and readings of the input.
+    for item in iter_readings(iter_tokens(fileobj, counters)):
+
+        # Step 9c4: Yield a record for each witness of a reading.
+        if isinstance(item, Reading):
+            group_reading_count += 1
+            for witness in item.witnesses:
+                if witness not in witness_set:
+                    continue
+                occurrence_counts[item.text] += 1
+                group_record_count += 1
+                yield VariantRecord(
+                    record_number, current_book, current_chapter, current_verse,
+                    item.text, witness,
+                    group_number, variant_number, occurrence_counts[item.text],
+                    current_verse_id)
+            variant_number += 1
+            continue
 
-    # Step 9g: Loop through each line and extract relevant data
-    # using the defined regular expression patterns.
-    for line_group in line_groups:
-
-        # Step 9g1: Check for a book/chapter/verse header.
-        header_match = None  # Initialize header_match to None
-        for line in line_group.split('\n'):
-            header_match = header_pattern.match(line)
-            if header_match:
-                break  # Break the loop if a match is found
-
-        # Step 9g2: If a header is found, update the current book, chapter, and verse.
-        if header_match:
-            # Extract the book name.
-            current_book = header_match.group('book_name')
-            # Extract the chapter number.
-            current_chapter = int(header_match.group('chapter_num'))
-            # Extract the verse number.
-            current_verse = int(header_match.group('verse_num'))
+        # Step 9c5: A header or group closes the previous line group.
+        if counters is not None:
+            counters['variants'] += group_record_count
+            if group_reading_count and not group_record_count:
+                counters['unmatched_lines'] += 1
+        group_reading_count = 0
+        group_record_count = 0
+        record_number += 1
+        variant_number = 1
+        occurrence_counts = defaultdict(int)
+
+        # Step 9c6: If a header is found, update the current book, chapter, and verse.
+        if item.kind == 'header':
+            current_book, current_chapter, current_verse = item.value
+            current_verse_id = encode_verse_id(*item.value)
             group_number = 1
-            variant_number = 1
-            occurrence_counts = defaultdict(int)
-            record_number += 1
-            print(f"Header found: {current_book} {current_chapter}:{current_verse}")
+            if counters is not None:
+                counters['headers'] += 1
+
+        # Step 9c7: If a group marker is found, update the group number.
         else:
-            # Check for a group marker.
-            group_match = group_pattern.match(line)
-            # If a group marker is found,
-            # update the group number, variant number, and occurrence number.
-            if group_match:
-                record_number += 1
-                group_number += 1  # BREAKPOINT
-                variant_number = 1
-                occurrence_counts = defaultdict(int)
-                # Remove the group marker from the line.
-                line = line.lstrip("•").strip()
-
-        # 9h: Check for textual variants and witness abbreviations.
-        variant_matches = list(variant_pattern.finditer(line))
-
-        # 9i: If there are no textual variants, skip to the next line.
-        if not variant_matches:
-            continue
+            group_number += 1
+            if counters is not None:
+                counters['groups'] += 1
 
-        # Loop through the variant matches.
-        for i, match in enumerate(variant_matches):
-
-            # Extract the variant text.
-            variant_text = match.group('text_var').strip()
-            # Extract the witness abbreviation.
-            witness_abbr = match.group('witness_abbr')
-            # Add the extracted data to the data_list.
-            data_list.append({
-                    'record_number': record_number,
-                    'book_name': current_book,
-                    'chapter_number': current_chapter,
-                    'verse_number': current_verse,
-                    'textual_variant': variant_text,
-                    'witness_abbreviation': witness_abbr,
-                    'group_number': group_number,
-                    'variant_number': variant_number,
-                    'occurrence_number': occurrence_counts[variant_text] + 1
-            })
-# BREAKPOINT
+    if counters is not None:
+        counters['variants'] += group_record_count
+        if group_reading_count and not group_record_count:
+            counters['unmatched_lines'] += 1
 
-            # Increment the occurrence number for this variant.
-            occurrence_counts[variant_text] += 1  # BREAKPOINT
+# Step 9d: Define the 'RecordColumns' class.
 
-            # Increment the variant number
-            variant_number += 1  # BREAKPOINT
 
-    # Step 9j: Convert extracted data list into a pandas DataFrame.
-    extracted_data_df = pd.DataFrame(data_list)
+class RecordColumns:
+    """
+    Collects records column by column instead of as one Python object per record.
+    The number fields are appended to 'array('i')' columns,
+    the book names and witness abbreviations are stored as integer codes
+    into a table of their distinct values, and each distinct textual variant
+    is stored once in a string table and referenced by its code.
+
+    Chapter and verse numbers and verse IDs that are not known
+    (before the first header, or for a book missing from 'book_names')
+    are stored as -1 and become missing values in the DataFrame.
+    """
 
-    # Step 9k: Return the extracted data DataFrame.
-    return extracted_data_df
+    integer_columns = [
+        "record_number", "chapter_number", "verse_number",
+        "group_number", "variant_number", "occurrence_number", "verse_id"]
+    nullable_columns = ["chapter_number", "verse_number", "verse_id"]
+    string_columns = ["book_name", "textual_variant", "witness_abbreviation"]
+
+    def __init__(self):
+        self.integer_arrays = {column: array('i') for column in self.integer_columns}
+        self.string_codes = {column: array('i') for column in self.string_columns}
+        self.string_tables = {column: {} for column in self.string_columns}
+
+    def __len__(self):
+        return len(self.integer_arrays["record_number"])
+
+    def append(self, record):
+        """
+        Appends one record to the columns.
+
+        Args:
+            record (VariantRecord): The record to append.
+        """
+        integer_arrays = self.integer_arrays
+        string_codes = self.string_codes
+        string_tables = self.string_tables
+        integer_arrays["record_number"].append(record.record_number)
+        integer_arrays["chapter_number"].append(
+            -1 if record.chapter_number is None else record.chapter_number)
+        integer_arrays["verse_number"].append(
+            -1 if record.verse_number is None else record.verse_number)
+        integer_arrays["group_number"].append(record.group_number)
+        integer_arrays["variant_number"].append(record.variant_number)
+        integer_arrays["occurrence_number"].append(record.occurrence_number)
+        integer_arrays["verse_id"].append(-1 if record.verse_id is None else record.verse_id)
+        for column in self.string_columns:
+            string_table = string_tables[column]
+            string_codes[column].append(
+                string_table.setdefault(getattr(record, column), len(string_table)))
+
+    def extend(self, records):
+        """
+        Appends each record of an iterable to the columns.
+
+        Args:
+            records (iterable[VariantRecord]): The records to append.
+        """
+        for record in records:
+            self.append(record)
+
+    def to_dataframe(self):
+        """
+        Builds a DataFrame that shares the number columns' buffers instead of copying them.
+        'book_name' and 'witness_abbreviation' become categorical columns
+        whose categories are sorted, so they sort and group in the same order as strings.
+        No more records should be appended once the DataFrame has been built.
+
+        Returns:
+            pd.DataFrame: A pandas DataFrame with one row per record and the 'output_columns'.
+        """
+        import numpy as np
+        import pandas as pd
+
+        columns = {}
+
+        # Step 9d1: Wrap the number columns without copying them.
+        for column, values in self.integer_arrays.items():
+            values = np.frombuffer(values, dtype=np.intc) if values else np.array([], np.intc)
+            if column in self.nullable_columns and (values == -1).any():
+                values = pd.arrays.IntegerArray(values, values == -1)
+            columns[column] = values
+
+        # Step 9d2: Turn the string codes into categorical or string columns.
+        for column, string_table in self.string_tables.items():
+            codes = self.string_codes[column]
+            codes = np.frombuffer(codes, dtype=np.intc) if codes else np.array([], np.intc)
+            values = np.array(list(string_table), dtype=object)
+            if column in categorical_columns:
+                categories = sorted(value for value in string_table if value is not None)
+                category_codes = {category: code for code, category in enumerate(categories)}
+                code_map = np.array(
+                    [category_codes.get(value, -1) for value in string_table], dtype=np.intc)
+                columns[column] = pd.Categorical.from_codes(
+                    code_map[codes] if len(codes) else codes, categories=categories)
+            else:
+                columns[column] = values[codes] if len(codes) else values
+
+        return pd.DataFrame({column: columns[column] for column in output_columns}, copy=False)
+
+# Step 9e: Define 'records_to_dataframe()' function.
+
+
+def records_to_dataframe(records):
+    """
+    Builds a DataFrame from an iterable of VariantRecord tuples,
+    collecting them column by column with 'RecordColumns'.
+
+    Args:
+        records (iterable[VariantRecord]): The records yielded by 'iter_records()'.
+
+    Returns:
+        pd.DataFrame: A pandas DataFrame with one row per record and the 'output_columns'.
+    """
+    record_columns = RecordColumns()
+    record_columns.extend(records)
+    return record_columns.to_dataframe()
+
+# Step 9f: Define 'extract_data()' function.
+
+
+def extract_data(input_text, witnesses=None, counters=None):
+    """
+    Processes the input text to separate clusters of textual variants
+    and their witnesses into individual lines, and extracts relevant data
+    from each line using regular expressions.
+
+    Args:
+        input_text (str or iterable[str]): A string containing the input file text,
+        or a file object to be read line by line.
+        witnesses (list[str]): The witness abbreviations to match.
+        Defaults to 'witness_abbreviations'.
+        counters (dict): An optional dictionary in which the parser counts what it finds
+        (see 'iter_records()').
+
+    Returns:
+        pd.DataFrame: A pandas DataFrame
+        where each row represents a variation unit observed in the witnesses.
+        The relevant fields for each row are
+        'record_number', 'book_name', 'chapter_number', 'verse_number',
+        'textual_variant', 'witness_abbreviation',
+        'group_number', 'variant_number', 'occurrence_number', and 'verse_id'.
+    """
+    return records_to_dataframe(iter_records(input_text, counters, witnesses))
 
 # =============================================================================
 # STEP 10: Write output to file
@@ -682,24 +979,51 @@ def extract_data(input_text):
 
 def write_output_file(data_frame, output_file_path):  # BREAKPOINT
     """
-    Writes the extracted data to an output file in Excel format.
+    Writes the extracted data to an output file.
+    The format is chosen from the file extension (see write_sbl.py),
+    and a path without a supported extension is written as Excel, as it always was.
+    Excel files are written row by row in xlsxwriter's constant-memory mode.
 
     Args:
         data_frame (pd.DataFrame): A pandas DataFrame containing the extracted data.
         output_file_path (str): The path where the output file should be written.
     """
-# BREAKPOINT
-
-    # Step 10b: Create a context in which the pd.ExcelWriter object is used.
-    # When the context is exited, the object is automatically closed,
-    # and the output file is saved.
-    with pd.ExcelWriter(output_file_path, engine='xlsxwriter') as writer:
+    import write_sbl
 
-        # Write the data to the output file using a tab delimiter
-        data_frame.to_excel(writer, sheet_name='Sheet1', index=False)
+    # Step 10b: Write the data to the output file in chunks,
+    # using the writer for the format given by the file extension.
+    write_sbl.write_data_frame(
+        data_frame, output_file_path, get_output_file_format(output_file_path))
 
     print(f"Data has been successfully extracted and saved to {output_file_path}")
 
+# Step 10c: Define 'get_output_file_format()' function
+
+
+def get_output_file_format(output_file_path):
+    """
+    Checks that an output file can be created, before any time is spent parsing,
+    and returns the format it will be written in.
+
+    Args:
+        output_file_path (str): The path where the output file should be written.
+
+    Returns:
+        str: The format given by the file extension, or Excel ('xlsx')
+        if the path has no supported extension.
+
+    Raises:
+        ValueError: If the path is empty, is a directory, or is in a directory that does not exist.
+    """
+    import write_sbl
+
+    output_directory = os.path.dirname(output_file_path) or "."
+    if not output_file_path or os.path.isdir(output_file_path):
+        raise ValueError(f"The output path is not a file: {output_file_path!r}")
+    if not os.path.isdir(output_directory):
+        raise ValueError(f"The output directory does not exist: {output_directory!r}")
+    return write_sbl.get_output_format(output_file_path, write_sbl.default_output_format)
+
 # =============================================================================
 # STEP 11: Read input file and return its contents as a string
 # =============================================================================
@@ -729,6 +1053,33 @@ def read_input_file(file_path):
     return input_text
 # BREAKPOINT
 
+# Step 11e: Define 'iter_input_lines()' function.
+
+
+def iter_input_lines(input_path, read_workers=4):
+    """
+    Yields the lines of the input, which is either a single file such as merged_sbl.txt
+    or the directory of per-book files that merge_sbl_files.py merges into it.
+    A directory is read without writing the merged file:
+    the books are read concurrently and their lines are yielded in canonical order,
+    exactly as they would appear in the merged file.
+
+    Args:
+        input_path (str): The path to the input file or directory.
+        read_workers (int): The number of threads reading the books of a directory.
+
+    Yields:
+        str: Each line of the input, including its newline character.
+    """
+    if os.path.isdir(input_path):
+        import merge_sbl_files
+
+        for book_text in merge_sbl_files.iter_book_texts(input_path, read_workers):
+            yield from io.StringIO(book_text)
+    else:
+        with open(input_path, "r", encoding="utf-8") as file:
+            yield from file
+
 # =============================================================================
 # STEP 12: Extract data from input file and return pandas DataFrame.
 # =============================================================================
@@ -736,113 +1087,322 @@ def read_input_file(file_path):
 # Step 12a: Define the 'process_input_file()' function.
 
 
-def process_input_file(input_file):
+def process_input_file(input_file, workers=None, witnesses=None, use_snapshot=False,
+                       chunksize=None, profiler=None):
     """
     Reads in an input file, extracts relevant data,
     assigns group, variant, and occurrence numbers,
     and returns a pandas DataFrame with the resulting data.
+    With 'use_snapshot', the records are loaded from the binary snapshot next to the input file
+    (see snapshot_sbl.py) when it is fresh, and the snapshot is written after parsing.
+
+    With 'chunksize', an iterator of DataFrames is returned instead, as with
+    'pd.read_csv(chunksize=...)', and the input file is parsed serially as it is iterated
+    (see 'iter_data_frame_chunks()'), without the snapshot.
 
     Args:
-        input_file (str): The path to the input file.
+        input_file (str): The path to the input file,
+        or to a directory of per-book files to be read without merging them first.
+        workers (int): The number of worker processes to parse the input file with.
+        Defaults to None, which parses the input file serially in this process.
+        witnesses (list[str]): The witness abbreviations to match.
+        Defaults to 'witness_abbreviations'.
+        use_snapshot (bool): Whether to load and refresh the snapshot of the input file.
+        Defaults to False, which parses the input file and writes nothing next to it.
+        chunksize (int): The number of records in each DataFrame of the iterator.
+        Defaults to None, which returns a single DataFrame.
+        profiler (profile_sbl.Profiler): A profiler that measures the snapshot load,
+        the parse, and the snapshot save as separate stages, and collects the parser counters.
+        Defaults to None, which measures nothing.
 
     Returns:
         pd.DataFrame: A pandas DataFrame where each row represents a variation unit
-        observed in the witnesses.
+        observed in the witnesses, or an iterator of DataFrames if 'chunksize' is given.
+        An empty input file gives a DataFrame without rows, or an iterator without DataFrames.
         The relevant fields for each row are 'book_name', 'chapter_number', 'verse_number',
         'textual_variant', 'witness_abbreviation',
         'group_number', 'variant_number','occurrence_number'.
     """
 
-    # Step 12a1: Read in the input file.
-    file_contents = read_input_file(input_file)
+    # Step 12a1: Check if the input file is empty. The warning goes to standard error,
+    # so that it cannot end up in output written to standard output.
+    if not os.path.isdir(input_file) and os.path.getsize(input_file) == 0:
+        print(f"The input file is empty: {input_file}", file=sys.stderr)
+        return iter(()) if chunksize is not None else records_to_dataframe([])
+
+    # Step 12a2: If a chunk size is given, return an iterator of DataFrames.
+    if chunksize is not None:
+        return iter_data_frame_chunks(iter_input_lines(input_file), chunksize, witnesses)
+
+    # Step 12a3: Load the snapshot of the input file if it is fresh.
+    if use_snapshot:
+        import snapshot_sbl
+        with profile_stage(profiler, "load_snapshot") as metrics:
+            extracted_data_df = snapshot_sbl.load_fresh_snapshot(input_file, witnesses)
+            metrics["records"] = None if extracted_data_df is None else len(extracted_data_df)
+        if extracted_data_df is not None:
+            return extracted_data_df
+
+    # Step 12a4: If more than one worker is requested, parse the input file in parallel.
+    # Otherwise, stream the input file through the parser one line at a time.
+    if workers is not None and workers > 1:
+        with profile_stage(profiler, "process_input_file_parallel") as metrics:
+            extracted_data_df = process_input_file_parallel(
+                input_file, workers, witnesses,
+                profiler.counters if profiler is not None else None)
+            metrics["records"] = len(extracted_data_df)
+    else:
+        with profile_stage(profiler, "extract_data") as metrics:
+            extracted_data_df = extract_data(
+                iter_input_lines(input_file), witnesses,
+                profiler.counters if profiler is not None else None)
+            metrics["records"] = len(extracted_data_df)
+
+    # Step 12a5: Save the snapshot for the next run. A read-only directory only costs the reload.
+    if use_snapshot:
+        with profile_stage(profiler, "save_snapshot") as metrics:
+            try:
+                snapshot_sbl.save_snapshot(extracted_data_df, input_file, witnesses)
+            except OSError:
+                pass
+            metrics["records"] = len(extracted_data_df)
+
+    # Step 12a6: Return the resulting DataFrame.
+    return extracted_data_df
 
-    # Step 12a2: Check if the input file is empty or could not be read.
-    if not file_contents:
-        print("The input file is empty or could not be read.")
-        return None
+# Step 12b: Define the 'split_at_headers()' function.
 
-    # Steph 12a3: Extract data from the input file.
-    extracted_data_df = extract_data(file_contents)
 
-    # Step 12b: Return the resulting DataFrame.
-    return extracted_data_df
+def split_at_headers(lines, chunk_count):
+    """
+    Splits the lines of the input into about 'chunk_count' chunks of similar size.
+    Every chunk after the first starts at a book/chapter/verse header line,
+    so that each chunk can be parsed on its own.
 
-# =============================================================================
-# STEP 13: Identify and assign group, variant, and occurrence numbers
-#          to each row of the DataFrame
-# =============================================================================
+    Args:
+        lines (list[str]): The lines of the input file.
+        chunk_count (int): The number of chunks to aim for.
 
-# Step 13a: Define 'identify_and_assign()' function
+    Returns:
+        list[str]: The text of each chunk, in input order.
+    """
+    target_size = max(1, len(lines) // max(1, chunk_count))
+    chunks = []
+    chunk_start = 0
+    for line_index, line in enumerate(lines):
+        if line_index - chunk_start >= target_size and line_header_pattern.match(line):
+            chunks.append(''.join(lines[chunk_start:line_index]))
+            chunk_start = line_index
+    chunks.append(''.join(lines[chunk_start:]))
+    return chunks
 
+# Step 12c: Define the 'iter_verse_blocks()' function.
 
-def identify_and_assign(data_frame):
+
+def iter_verse_blocks(lines):
     """
-    Identifies and assigns group, variant, and occurrence numbers to each row of the DataFrame.
+    Splits the lines of the input into verse blocks,
+    each starting at a book/chapter/verse header line
+    and holding the groups that follow it.
+    Each block can be parsed on its own.
 
     Args:
-        data_frame (pd.DataFrame): A pandas DataFrame where each row represents a variation unit
-        observed in the witnesses.
+        lines (iterable[str]): A file object or any other iterable of input lines.
+
+    Yields:
+        str: The text of each verse block, in input order.
+    """
+    block_lines = []
+    for line in lines:
+        if block_lines and line_header_pattern.match(line):
+            yield ''.join(block_lines)
+            block_lines = []
+        block_lines.append(line)
+    if block_lines:
+        yield ''.join(block_lines)
+
+# Step 12d: Define the 'parse_chunk()' function.
+
+
+def parse_chunk(chunk_text, witnesses=None):
+    """
+    Parses one chunk of the input file in a worker process.
+
+    Args:
+        chunk_text (str): The text of the chunk, as returned by 'split_at_headers()'.
+        witnesses (list[str]): The witness abbreviations to match.
+
     Returns:
-        pd.DataFrame: A pandas DataFrame where each row represents a variation unit observed
-        in the witnesses. The 'group_number', 'variant_number', and 'occurrence_number'
-        fields for each row have been populated based on the corresponding variation units.
+        tuple: A tuple containing a DataFrame of the chunk's records,
+        numbered as if the chunk were the whole input,
+        and a dictionary of what the parser counted in the chunk (see 'iter_records()').
     """
+    counters = defaultdict(int)
+    data_frame = records_to_dataframe(iter_records(chunk_text, counters, witnesses))
+    return data_frame, dict(counters)
 
-    # Step 13b: Group the DataFrame by book_name, chapter_number, and verse_number.
-    grouped_data = data_frame.groupby(['group_number', 'textual_variant', 'witness_abbreviation'])
+# Step 12e: Define the 'process_input_file_parallel()' function.
 
-    # Step 13c: Create an empty DataFrame with the same columns as the input DataFrame.
-    output_data_frame = pd.DataFrame(columns=data_frame.columns)
 
-    # Step 13d: Define a function to assign group, variant, and occurrence numbers
-    # within each verse group
-    def assign_numbers(group_data_frame):
-        """
-        Assigns group, variant, and occurrence numbers to each row in the group DataFrame.
+def process_input_file_parallel(input_file, workers, witnesses=None, counters=None):
+    """
+    Splits the input file at header boundaries, parses the chunks in a process pool,
+    and stitches the results back together in input order.
+    The record numbers of each chunk are offset by the number of headers and groups
+    in the chunks before it, so the result is identical to a serial parse.
 
-        Args:
-            group_data_frame (pd.DataFrame): A pandas DataFrame representing a single group
-            of variation units.
+    Args:
+        input_file (str): The path to the input file, or to a directory of per-book files.
+        workers (int): The number of worker processes.
+        witnesses (list[str]): The witness abbreviations to match.
+        counters (dict): An optional dictionary, such as a defaultdict(int),
+        to which the parser counts of every chunk are added (see 'iter_records()').
 
-        Returns:
-            pd.DataFrame: A pandas DataFrame with assigned group, variant, and occurrence
-            numbers for each row in the input DataFrame.
-        """
+    Returns:
+        pd.DataFrame: The same DataFrame that 'process_input_file()' returns serially.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+
+    # Step 12e1: Read the input file and split it into a few chunks per worker.
+    chunks = split_at_headers(list(iter_input_lines(input_file)), workers * 4)
+
+    # Step 12e2: Parse the chunks in parallel, keeping their input order.
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(parse_chunk, chunks, [witnesses] * len(chunks)))
+
+    # Step 12e3: Offset the record numbers of each chunk by the headers and groups before it,
+    # add up the counters of the chunks, and concatenate the chunks.
+    data_frames = []
+    record_number_offset = 0
+    for data_frame, chunk_counters in results:
+        if not data_frame.empty:
+            data_frame['record_number'] += record_number_offset
+            data_frames.append(data_frame)
+        record_number_offset += chunk_counters.get('headers', 0) + chunk_counters.get('groups', 0)
+        if counters is not None:
+            for counter_name, count in chunk_counters.items():
+                counters[counter_name] += count
+    if not data_frames:
+        return results[0][0]
+    data_frame = pd.concat(data_frames, ignore_index=True)
+
+    # Step 12e4: Combine the categories of each chunk, sorted as in a serial parse.
+    for column in categorical_columns:
+        data_frame[column] = union_categoricals(
+            [chunk_data_frame[column] for chunk_data_frame in data_frames],
+            sort_categories=True)
+    return data_frame
 
-        # Make a copy of the input DataFrame to avoid modifying the original
-        group_data_frame = group_data_frame.copy()
+# Step 12f: Define the 'iter_data_frame_chunks()' function.
 
-        # Group by textual variant and witness abbreviation
-        grouped = group_data_frame.groupby(['textual_variant', 'witness_abbreviation'])
 
-        # Assign group_number as the group index + 1
-        group_data_frame['group_number'] = grouped.ngroup() + 1
+def iter_data_frame_chunks(lines, chunksize, witnesses=None):
+    """
+    Parses the input one record at a time and yields DataFrames of about 'chunksize' records.
+    A chunk is only closed between two verses, so that the groups, variants, and occurrences
+    of a verse are always numbered within the same chunk,
+    and a chunk can be longer than 'chunksize' by the records of one verse.
+    Only one chunk is held in memory at a time.
 
-        # Assign variant_number as the cumulative count of each group + 1
-        group_data_frame['variant_number'] = grouped.cumcount() + 1
+    The categories of the 'categorical_columns' are those found in each chunk,
+    so they differ from chunk to chunk.
 
-        # Assign occurrence_number as the cumulative sum of non-null witness abbreviations
-        # within each group
-        group_data_frame['occurrence_number'] = grouped['witness_abbreviation'].transform(
-            lambda x: x.notnull().cumsum())
+    Args:
+        lines (iterable[str] or str): A file object or any other iterable of input lines,
+        or the input text as a single string.
+        chunksize (int): The number of records in each chunk.
+        witnesses (list[str]): The witness abbreviations to match.
 
-        # Return the modified DataFrame
-        return group_data_frame
+    Yields:
+        pd.DataFrame: The records of one or more whole verses, in input order.
 
-    # Step 13e: Loop through each group of the grouped data.
-    for group_key, group_value in grouped_data:
-        # Call the 'assign_numbers' function for each group and concatenate the result
-        # with the output_data_frame.
-        output_data_frame = pd.concat([output_data_frame, assign_numbers(group_value)])
-    # BREAKPOINT
+    Raises:
+        ValueError: If 'chunksize' is not a positive integer.
+    """
+    if chunksize < 1:
+        raise ValueError(f"chunksize must be a positive integer, not {chunksize!r}")
+    record_columns = RecordColumns()
+    previous_verse = None
+    for record in iter_records(lines, witnesses=witnesses):
+        verse = (record.book_name, record.chapter_number, record.verse_number)
+        if len(record_columns) >= chunksize and verse != previous_verse:
+            yield record_columns.to_dataframe()
+            record_columns = RecordColumns()
+        record_columns.append(record)
+        previous_verse = verse
+    if len(record_columns):
+        yield record_columns.to_dataframe()
+
+# Step 12g: Define the 'profile_stage()' function.
+
+
+def profile_stage(profiler, name):
+    """
+    Measures the code run inside a 'with' block as one stage of a profiler
+    (see profile_sbl.py), or does nothing if there is no profiler.
+
+    Args:
+        profiler (profile_sbl.Profiler): The profiler, or None.
+        name (str): The name of the stage.
+
+    Returns:
+        contextlib.AbstractContextManager: A context manager yielding the stage's metrics,
+        in which the block may set 'metrics["records"]'.
+    """
+    if profiler is None:
+        return contextlib.nullcontext({})
+    return profiler.stage(name)
+
+# =============================================================================
+# STEP 13: Identify and assign group, variant, and occurrence numbers
+#          to each row of the DataFrame
+# =============================================================================
+
+# Step 13a: Define 'identify_and_assign()' function
 
-    # Step 13f: Reorder the columns in the DataFrame to match the desired order.
-    output_data_frame = output_data_frame[[
-        "record_number", "book_name", "chapter_number", "verse_number",
-        "textual_variant", "witness_abbreviation",
-        "group_number", "variant_number", "occurrence_number"]]
 
-    # Step 13g: Return the output_data_frame with assigned group, variant, and occurrence numbers.
+def identify_and_assign(data_frame):
+    """
+    Identifies and assigns group, variant, and occurrence numbers to each row of the DataFrame.
+
+    Args:
+        data_frame (pd.DataFrame): A pandas DataFrame where each row represents a variation unit
+        observed in the witnesses.
+    Returns:
+        pd.DataFrame: A pandas DataFrame where each row represents a variation unit observed
+        in the witnesses. The 'group_number', 'variant_number', and 'occurrence_number'
+        fields for each row have been populated based on the corresponding variation units.
+        The numbers are computed with a single sort and groupby over the whole DataFrame,
+        so the running time grows as O(n log n) in the number of rows.
+    """
+
+    # Step 13b: Sort the DataFrame by group number, textual variant, and witness abbreviation.
+    # Rows that share all three values keep their original order (stable sort),
+    # and rows with a missing key are dropped, as 'groupby' would.
+    group_keys = ['group_number', 'textual_variant', 'witness_abbreviation']
+    output_data_frame = data_frame.dropna(subset=group_keys).sort_values(
+        by=group_keys, kind='stable')
+
+    # Step 13c: Group the sorted DataFrame once, without re-sorting it.
+    grouped = output_data_frame.groupby(group_keys, sort=False, observed=True)
+
+    # Step 13d: Assign group, variant, and occurrence numbers to every row in one shot.
+    # Each group holds a single (textual_variant, witness_abbreviation) combination,
+    # so its group number is always 1, and since the witness abbreviation is never null
+    # the occurrence number is the running count of rows within the group.
+    running_count = grouped.cumcount() + 1
+    output_data_frame = output_data_frame.assign(
+        group_number=1,
+        variant_number=running_count,
+        occurrence_number=running_count)
+
+    # Step 13e: Reorder the columns in the DataFrame to match the desired order.
+    output_data_frame = output_data_frame[output_columns]
+
+    # Step 13f: Return the output_data_frame with assigned group, variant, and occurrence numbers.
     return output_data_frame
 
 # =============================================================================
@@ -865,24 +1425,9 @@ def extract_header(input_text):
         str: The header string containing the book name, chapter number, and verse number.
     """
 
-    # Step 14b: Define a regex pattern to match the header.
-    pattern = r"(\w+\s+\d+:\d+)"
-
-    # Step 14c: Search for the pattern in the input text.
-    match = re.search(pattern, input_text)
-
-    # Step 14d: Check if a match is found in the input text using the defined regex pattern.
-    if match:
-        # If a match is found,
-        # return the header string without leading/trailing whitespace and line breaks.
-        header = match.group(1).strip()
-# BREAKPOINT
-
-        # If a match is found, return the header string.
-        return header
-    else:
-        # If no match is found, raise a ValueError.
-        raise ValueError("Invalid header format")
+    # Step 14b: Search for the first header in the input text, and return the header string
+    # without leading/trailing whitespace and line breaks.
+    return read_header(input_text).text
 
 # =============================================================================
 # STEP 15: Read and process the input file and save the output to Excel
@@ -891,32 +1436,60 @@ def extract_header(input_text):
 # Step 15a: Define 'main()' function
 
 
-def main():
+def main(profile=False, use_cprofile=False):
     """
     Main function that reads the input file,
     processes it, and saves the output to an Excel file.
+
+    Args:
+        profile (bool): Whether to measure each stage and write a JSON report
+        next to the output file (see profile_sbl.py).
+        From the command line, use 'python cli_sbl.py parse --profile' instead.
+        use_cprofile (bool): Whether to also write a cProfile dump next to the output file.
     """
 
     # Step 15b: Prompt the user to enter the input and output file paths
     input_file = input("Enter path for input file: ").strip()
     output_file = input("Enter path for output file: ").strip()
 
-    # Step 15c: Read the input text file.
-    input_text = read_input_file(input_file)
+    # Step 15b1: Check the output path before parsing, so that a bad path fails at once.
+    try:
+        get_output_file_format(output_file)
+    except ValueError as exc:
+        print(exc, file=sys.stderr)
+        return
 
-    # Step 15d: Extract the textual variants and witness abbreviations.
-    extracted_data = process_input_file(input_file)
+    # Step 15c: When profiling, measure each stage of the same pipeline.
+    profiler = None
+    if profile or use_cprofile:
+        import profile_sbl
 
-    # Step 15e: Create a DataFrame using the header and extracted data.
-    data_frame = identify_and_assign(extracted_data)
+        profiler = profile_sbl.Profiler(use_cprofile=use_cprofile)
+
+        # pandas is imported lazily, so its import is measured as a stage of its own
+        # rather than being counted in the first stage that builds a DataFrame.
+        with profiler.stage("import_pandas"):
+            import pandas  # noqa: F401
 
-    # Step 15g: Write the output DataFrame to a CSV file.
-    write_output_file(data_frame, output_file)
+    # Step 15d: Extract the textual variants and witness abbreviations.
+    extracted_data = process_input_file(input_file, profiler=profiler)
 
-    # Step 15h:
+    # Step 15e: Create a DataFrame using the header and extracted data.
+    with profile_stage(profiler, "identify_and_assign") as metrics:
+        data_frame = identify_and_assign(extracted_data)
+        metrics["records"] = len(data_frame)
+
+    # Step 15f: Write the output DataFrame to the output file.
+    with profile_stage(profiler, "write_output_file") as metrics:
+        write_output_file(data_frame, output_file)
+        metrics["records"] = len(data_frame)
+    if profiler is not None:
+        print(f"Profile report saved to {profile_sbl.save_profile(profiler, output_file)}")
+
+    # Step 15g:
     print(f"Data has been successfully extracted and saved to {output_file}")
 
-# Step 15i:
+# Step 15h:
 
 
 if __name__ == '__main__':
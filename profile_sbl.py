@@ -0,0 +1,177 @@
+"""
+This script measures the stages of the parse_sbl.py pipeline,
+so that a slow run shows where its time goes:
+importing pandas, loading or saving the snapshot, parsing the input into a DataFrame,
+numbering it, or writing the output file.
+The stages are timed where they run, in 'parse_sbl.process_input_file()'
+and in the callers that number and write its output, by passing them a 'Profiler'.
+
+For each stage it records the wall time, CPU time, and records per second,
+together with parser counters (tokens, headers, groups, variants, and unmatched lines).
+The peak memory of each stage can also be traced with tracemalloc,
+but tracing slows every allocation down, so it is off unless it is asked for,
+and the times of a traced run should not be compared with those of an untraced one.
+The results are written as a JSON report, and the whole run can also be
+recorded with cProfile and dumped for 'python -m pstats' or snakeviz.
+
+Without a profiler the stages are not measured at all,
+so the instrumentation costs nothing unless it is asked for:
+    python cli_sbl.py parse merged_sbl.txt --profile
+    python cli_sbl.py parse merged_sbl.txt --profile --cprofile
+    python cli_sbl.py parse merged_sbl.txt --profile --trace-memory
+"""
+
+# -- coding: utf-8 --
+
+# =============================================================================
+# STEP 1:
+#    Initialize script
+# =============================================================================
+
+
+# Step 1a: Import necessary libraries
+
+import contextlib
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from collections import defaultdict
+
+# Step 1b: Define global variables
+report_suffix = ".profile.json"
+cprofile_suffix = ".prof"
+counter_names = ["tokens", "headers", "groups", "variants", "unmatched_lines"]
+
+# =============================================================================
+# STEP 2:
+#    Record the metrics of each stage
+# =============================================================================
+
+# Step 2a: Define the 'Profiler' class
+
+
+class Profiler:
+    """
+    Records the wall time, CPU time, record throughput, and peak memory of each stage
+    of a run, and the counters reported by the parser.
+
+    Args:
+        enabled (bool): Whether to record anything. A disabled profiler's stages do nothing.
+        trace_memory (bool): Whether to trace the peak memory of each stage with tracemalloc.
+        Tracing slows the stages down, so their times are inflated when it is on.
+        Defaults to False.
+        use_cprofile (bool): Whether to also record the stages with cProfile.
+    """
+
+    def __init__(self, enabled=True, trace_memory=False, use_cprofile=False):
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.cprofiler = cProfile.Profile() if enabled and use_cprofile else None
+        self.stages = []
+        self.counters = defaultdict(int, dict.fromkeys(counter_names, 0))
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Measures the code run inside a 'with' block as one stage.
+        The block may set 'metrics["records"]' to the number of records the stage processed.
+
+        Args:
+            name (str): The name of the stage.
+
+        Yields:
+            dict: The metrics of the stage, filled in when the block exits.
+        """
+        metrics = {"stage": name, "records": None}
+        if not self.enabled:
+            yield metrics
+            return
+
+        # Step 2a1: Start the memory trace, the profiler, and the clocks.
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif self.trace_memory:
+            tracemalloc.reset_peak()
+        if self.cprofiler is not None:
+            self.cprofiler.enable()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield metrics
+
+        # Step 2a2: Stop them and record the stage, even if it failed.
+        finally:
+            metrics["wall_seconds"] = time.perf_counter() - start_wall
+            metrics["cpu_seconds"] = time.process_time() - start_cpu
+            if self.cprofiler is not None:
+                self.cprofiler.disable()
+            if self.trace_memory:
+                metrics["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+            if metrics["records"] is not None and metrics["wall_seconds"] > 0:
+                metrics["records_per_second"] = metrics["records"] / metrics["wall_seconds"]
+            self.stages.append(metrics)
+
+    def get_report(self):
+        """
+        Returns the recorded metrics.
+
+        Returns:
+            dict: A dictionary with the list of 'stages', the parser 'counters',
+            and the total wall and CPU time of all stages.
+        """
+        return {
+            "stages": self.stages,
+            "counters": dict(self.counters),
+            "total_wall_seconds": sum(stage["wall_seconds"] for stage in self.stages),
+            "total_cpu_seconds": sum(stage["cpu_seconds"] for stage in self.stages),
+        }
+
+    def write_report(self, report_path):
+        """
+        Writes the recorded metrics to a JSON file.
+
+        Args:
+            report_path (str): The path where the report should be written.
+        """
+        with open(report_path, "w", encoding="utf-8") as report_file:
+            json.dump(self.get_report(), report_file, indent=2)
+
+    def dump_cprofile(self, cprofile_path):
+        """
+        Writes the cProfile statistics of the stages, if cProfile was used.
+
+        Args:
+            cprofile_path (str): The path where the statistics should be written.
+        """
+        if self.cprofiler is not None:
+            self.cprofiler.dump_stats(cprofile_path)
+
+# =============================================================================
+# STEP 3:
+#    Save the results of a profiled run
+# =============================================================================
+
+# Step 3a: Define 'save_profile()' function
+
+
+def save_profile(profiler, output_path):
+    """
+    Writes the JSON report of a profiled run next to its output,
+    and the cProfile statistics if cProfile was used.
+
+    Args:
+        profiler (Profiler): The profiler that measured the run.
+        output_path (str): The path of the run's output file or directory.
+
+    Returns:
+        str: The path of the JSON report.
+    """
+    report_path = os.path.normpath(output_path) + report_suffix
+    profiler.write_report(report_path)
+    profiler.dump_cprofile(os.path.normpath(output_path) + cprofile_suffix)
+    return report_path
@@ -0,0 +1,242 @@
+"""
+This script answers witness agreement questions over a parsed textual apparatus,
+such as "every unit where WH and RP disagree".
+
+Each witness in a 'WitnessRegistry' is given one bit, and each reading
+(a textual variant within a unit, i.e. a verse and group) is encoded
+as the bitmask of the witnesses that support it.
+Agreement and disagreement filters are then answered with vectorized
+bitwise operations over those masks instead of string scans.
+
+The witness set is configurable: pass the same list of witness abbreviations
+to 'parse_sbl.process_input_file()' and to the registry, for example
+to include NIV, which appears in the data but is not matched by default.
+"""
+
+# -- coding: utf-8 --
+
+# =============================================================================
+# STEP 1:
+#    Initialize script
+# =============================================================================
+
+
+# Step 1a: Import necessary libraries
+
+import numpy as np
+import pandas as pd
+
+import parse_sbl
+
+# Step 1b: Define global variables
+unit_columns = ["book_name", "chapter_number", "verse_number", "group_number"]
+
+# =============================================================================
+# STEP 2:
+#    Register witnesses
+# =============================================================================
+
+# Step 2a: Define the 'WitnessRegistry' class
+
+
+class WitnessRegistry:
+    """
+    Assigns each witness abbreviation one bit of an integer bitmask.
+
+    Args:
+        witnesses (list[str]): The witness abbreviations, in bit order.
+        Defaults to 'parse_sbl.witness_abbreviations'.
+    """
+
+    def __init__(self, witnesses=None):
+        if witnesses is None:
+            witnesses = parse_sbl.witness_abbreviations
+        if len(set(witnesses)) != len(witnesses):
+            raise ValueError("Witness abbreviations must be unique")
+        if len(witnesses) > 63:
+            raise ValueError("A registry can hold at most 63 witnesses")
+        self.witnesses = list(witnesses)
+        self.bits = {witness: 1 << index for index, witness in enumerate(self.witnesses)}
+
+    def __len__(self):
+        return len(self.witnesses)
+
+    def get_mask(self, witnesses):
+        """
+        Returns the bitmask of one or more witness abbreviations.
+
+        Args:
+            witnesses (str or iterable[str]): A witness abbreviation, or several.
+
+        Returns:
+            int: The bitmask with the bit of each witness set.
+
+        Raises:
+            KeyError: If a witness is not in the registry.
+        """
+        if isinstance(witnesses, str):
+            witnesses = [witnesses]
+        mask = 0
+        for witness in witnesses:
+            if witness not in self.bits:
+                raise KeyError(f"Unknown witness: {witness!r}")
+            mask |= self.bits[witness]
+        return mask
+
+    def get_witnesses(self, mask):
+        """
+        Returns the witness abbreviations whose bits are set in a bitmask.
+
+        Args:
+            mask (int): The bitmask.
+
+        Returns:
+            list[str]: The witness abbreviations, in registry order.
+        """
+        return [witness for witness, bit in self.bits.items() if mask & bit]
+
+    def encode(self, witness_abbreviations):
+        """
+        Encodes a column of witness abbreviations as bitmasks.
+        Witnesses that are not in the registry are encoded as 0.
+
+        Args:
+            witness_abbreviations (pd.Series): The witness abbreviation of each row.
+
+        Returns:
+            np.ndarray: The int64 bitmask of each row.
+        """
+        codes = pd.Index(self.witnesses).get_indexer(witness_abbreviations)
+        bit_table = np.array([bit for bit in self.bits.values()] + [0], dtype=np.int64)
+        return bit_table[codes]
+
+# =============================================================================
+# STEP 3:
+#    Query agreement between witnesses
+# =============================================================================
+
+# Step 3a: Define the 'ApparatusQuery' class
+
+
+class ApparatusQuery:
+    """
+    Encodes the readings of a parsed apparatus as witness bitmasks
+    and answers agreement and disagreement filters over them.
+
+    Args:
+        data_frame (pd.DataFrame): The DataFrame returned by 'parse_sbl.process_input_file()'.
+        registry (WitnessRegistry): The witness registry. Defaults to the parser's witnesses.
+    """
+
+    def __init__(self, data_frame, registry=None):
+        self.registry = registry if registry is not None else WitnessRegistry()
+
+        # Step 3a1: Number the units (verse and group) and the readings within them.
+        records = data_frame[unit_columns + ["textual_variant"]].copy()
+        records["witness_mask"] = self.registry.encode(data_frame["witness_abbreviation"])
+        records["unit_id"] = records.groupby(
+            unit_columns, sort=False, observed=True, dropna=False).ngroup()
+
+        # Step 3a2: Combine the witnesses of each reading into one bitmask.
+        # Repeated witnesses are dropped first, so that the sum of the bits is their union.
+        records = records.drop_duplicates(["unit_id", "textual_variant", "witness_mask"])
+        self.readings = records.groupby(
+            ["unit_id", "textual_variant"], sort=False, observed=True, as_index=False).agg(
+            **{column: (column, "first") for column in unit_columns},
+            witness_mask=("witness_mask", "sum"))
+
+        # Step 3a3: Combine the witnesses of each unit into one bitmask.
+        self.units = self.readings.groupby("unit_id", sort=True).agg(
+            **{column: (column, "first") for column in unit_columns})
+        self.units["witness_mask"] = self._reduce_or(
+            self.readings["witness_mask"].to_numpy())
+
+    def _reduce_or(self, reading_masks):
+        """
+        Combines the bitmasks of the readings of each unit with a bitwise OR.
+
+        Args:
+            reading_masks (np.ndarray): One bitmask per reading, in 'self.readings' order.
+
+        Returns:
+            np.ndarray: One bitmask per unit, in unit order.
+        """
+        unit_ids = self.readings["unit_id"].to_numpy()
+        unit_masks = np.zeros(len(self.units), dtype=np.int64)
+        np.bitwise_or.at(unit_masks, unit_ids, reading_masks)
+        return unit_masks
+
+    def _units_with_reading(self, mask):
+        """
+        Finds the units in which a single reading is supported by every witness in a bitmask.
+
+        Args:
+            mask (int): The bitmask of the witnesses.
+
+        Returns:
+            np.ndarray: A boolean array with one entry per unit.
+        """
+        reading_masks = self.readings["witness_mask"].to_numpy()
+        matches = np.zeros(len(self.units), dtype=bool)
+        matches[self.readings["unit_id"].to_numpy()[(reading_masks & mask) == mask]] = True
+        return matches
+
+    def attested(self, *witnesses):
+        """
+        Returns the units in which every given witness supports some reading.
+
+        Args:
+            *witnesses (str): The witness abbreviations.
+
+        Returns:
+            pd.DataFrame: The matching units, with their unit columns and witness bitmask.
+        """
+        mask = self.registry.get_mask(witnesses)
+        return self.units[(self.units["witness_mask"].to_numpy() & mask) == mask]
+
+    def agree(self, *witnesses):
+        """
+        Returns the units in which all the given witnesses support the same reading.
+
+        Args:
+            *witnesses (str): The witness abbreviations.
+
+        Returns:
+            pd.DataFrame: The matching units, with their unit columns and witness bitmask.
+        """
+        mask = self.registry.get_mask(witnesses)
+        return self.units[self._units_with_reading(mask)]
+
+    def disagree(self, *witnesses):
+        """
+        Returns the units in which all the given witnesses are attested
+        but do not all support the same reading.
+
+        Args:
+            *witnesses (str): The witness abbreviations.
+
+        Returns:
+            pd.DataFrame: The matching units, with their unit columns and witness bitmask.
+        """
+        mask = self.registry.get_mask(witnesses)
+        is_attested = (self.units["witness_mask"].to_numpy() & mask) == mask
+        return self.units[is_attested & ~self._units_with_reading(mask)]
+
+    def readings_supported_by(self, witnesses, excluding=()):
+        """
+        Returns the readings supported by all of 'witnesses' and by none of 'excluding'.
+
+        Args:
+            witnesses (str or list[str]): The witnesses that must support the reading.
+            excluding (str or list[str]): The witnesses that must not support the reading.
+
+        Returns:
+            pd.DataFrame: The matching readings, with their unit columns,
+            textual variant, and witness bitmask.
+        """
+        mask = self.registry.get_mask(witnesses)
+        excluded_mask = self.registry.get_mask(excluding)
+        reading_masks = self.readings["witness_mask"].to_numpy()
+        is_supported = (reading_masks & mask) == mask
+        is_excluded = (reading_masks & excluded_mask) != 0
+        return self.readings[is_supported & ~is_excluded]
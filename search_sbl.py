@@ -0,0 +1,405 @@
+"""
+This script builds an inverted index of the words of the textual variants
+parsed by parse_sbl.py, to find every record whose reading contains a word form,
+such as every "Μαριὰμ" or "Μαρία" variant, without scanning the 'textual_variant' column.
+
+Each word is indexed under its exact form and under its normalized form:
+decomposed (Unicode NFD), with the combining accents and breathings removed,
+lower-cased, and with final sigma written as σ, so "Μαριὰμ" is normalized to "μαριαμ".
+A search looks a word up in a dictionary (exact or accent-insensitive)
+or bisects the sorted normalized words (prefix), so its cost grows with the number
+of matches rather than with the size of the apparatus.
+
+The index is built in the same pass over the input as the DataFrame,
+and the records it returns are row positions in that DataFrame.
+It can be saved next to the input file (for example merged_sbl.txt.search)
+and is rebuilt when the input, the witnesses, the parser, or this script change:
+
+    data_frame, search_index = search_sbl.load_data_frame_and_search_index("merged_sbl.txt")
+    data_frame.iloc[search_index.search("Μαρια", mode="prefix")]
+"""
+
+# -- coding: utf-8 --
+
+# =============================================================================
+# STEP 1:
+#    Initialize script
+# =============================================================================
+
+
+# Step 1a: Import necessary libraries
+
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+import parse_sbl
+
+# Step 1b: Define global variables
+search_index_suffix = ".search"
+search_index_version = 1
+search_modes = ["exact", "accent_insensitive", "prefix"]
+word_pattern = re.compile(r'[^\W_]+')
+
+# =============================================================================
+# STEP 2:
+#    Normalize words
+# =============================================================================
+
+# Step 2a: Define 'normalize_word()' function
+
+
+def normalize_word(word):
+    """
+    Normalizes a word for accent-insensitive search:
+    decomposes it, removes the combining accents and breathings, and lower-cases it.
+    Final sigma is written as σ, so that a prefix such as "Ἰησου" matches "Ἰησοῦς".
+
+    Args:
+        word (str): The word, for example "Μαριὰμ".
+
+    Returns:
+        str: The normalized word, for example "μαριαμ".
+    """
+    decomposed_word = unicodedata.normalize("NFD", word)
+    return "".join(character for character in decomposed_word
+                   if not unicodedata.combining(character)).lower().replace("ς", "σ")
+
+# Step 2b: Define 'get_words()' function
+
+
+def get_words(text):
+    """
+    Splits a textual variant into its words, without the '+', '–', and '…' markers
+    and any punctuation.
+
+    Args:
+        text (str): The textual variant.
+
+    Returns:
+        list[str]: The words, in order.
+    """
+    return word_pattern.findall(unicodedata.normalize("NFC", text)) if text else []
+
+# =============================================================================
+# STEP 3:
+#    Index and search records
+# =============================================================================
+
+# Step 3a: Define the 'SearchIndex' class
+
+
+class SearchIndex:
+    """
+    An inverted index from the exact and normalized forms of each word
+    to the sorted IDs of the records whose textual variant contains it.
+    A record ID is the position of the record in the parsed DataFrame.
+    """
+
+    def __init__(self):
+        self.exact_postings = defaultdict(list)
+        self.normalized_postings = defaultdict(list)
+        self.record_count = 0
+        self.text_words = {}
+        self.sorted_words = None
+
+    def add(self, record_id, text):
+        """
+        Indexes the words of one record. Records must be added in increasing ID order.
+
+        Args:
+            record_id (int): The ID of the record.
+            text (str): The textual variant of the record.
+        """
+        # Each textual variant recurs once per witness, so its words are split only once.
+        words = self.text_words.get(text)
+        if words is None:
+            exact_words = dict.fromkeys(get_words(text))
+            words = self.text_words[text] = (
+                list(exact_words), list(dict.fromkeys(map(normalize_word, exact_words))))
+        for word in words[0]:
+            self.exact_postings[word].append(record_id)
+        for word in words[1]:
+            self.normalized_postings[word].append(record_id)
+        self.record_count = record_id + 1
+        self.sorted_words = None
+
+    def add_records(self, records, first_record_id=0):
+        """
+        Indexes records in order, such as those yielded by 'parse_sbl.iter_records()'.
+
+        Args:
+            records (iterable[VariantRecord]): The records.
+            first_record_id (int): The ID of the first record.
+        """
+        for record_id, record in enumerate(records, start=first_record_id):
+            self.add(record_id, record.textual_variant)
+
+    def get_postings(self, word, mode):
+        """
+        Returns the sorted record IDs of one word.
+
+        Args:
+            word (str): The word.
+            mode (str): One of 'search_modes'.
+
+        Returns:
+            list[int]: The sorted record IDs.
+        """
+        if mode == "exact":
+            return self.exact_postings.get(word, [])
+        normalized_word = normalize_word(word)
+        if mode == "accent_insensitive":
+            return self.normalized_postings.get(normalized_word, [])
+
+        # Step 3a1: Bisect the sorted normalized words for the words with the prefix.
+        if self.sorted_words is None:
+            self.sorted_words = sorted(self.normalized_postings)
+        record_ids = set()
+        for index in range(bisect_left(self.sorted_words, normalized_word),
+                           len(self.sorted_words)):
+            if not self.sorted_words[index].startswith(normalized_word):
+                break
+            record_ids.update(self.normalized_postings[self.sorted_words[index]])
+        return sorted(record_ids)
+
+    def search(self, query, mode="accent_insensitive"):
+        """
+        Finds the records whose textual variant contains every word of the query.
+
+        Args:
+            query (str): One or more words, for example "Μαριὰμ" or "τοῦ θεοῦ".
+            mode (str): 'exact' to match the words exactly, 'accent_insensitive' to match them
+            ignoring accents, breathings, and case, or 'prefix' to match the words
+            that start with them, ignoring accents, breathings, and case.
+
+        Returns:
+            list[int]: The sorted IDs of the matching records.
+
+        Raises:
+            ValueError: If the mode is not one of 'search_modes'.
+        """
+        if mode not in search_modes:
+            raise ValueError(f"Unknown search mode {mode!r}. Use one of: {', '.join(search_modes)}")
+        record_ids = None
+        for word in get_words(query):
+            postings = self.get_postings(word, mode)
+            record_ids = set(postings) if record_ids is None else record_ids.intersection(postings)
+            if not record_ids:
+                break
+        return sorted(record_ids) if record_ids else []
+
+    def to_dict(self):
+        """
+        Returns the index as a dictionary of JSON-serializable values.
+
+        Returns:
+            dict: The record count and the postings of the exact and normalized words.
+        """
+        return {
+            "record_count": self.record_count,
+            "exact": self.exact_postings,
+            "normalized": self.normalized_postings,
+        }
+
+    @classmethod
+    def from_dict(cls, index_dict):
+        """
+        Rebuilds an index from the dictionary returned by 'to_dict()'.
+
+        Args:
+            index_dict (dict): The dictionary.
+
+        Returns:
+            SearchIndex: The index.
+        """
+        search_index = cls()
+        search_index.record_count = index_dict["record_count"]
+        search_index.exact_postings.update(index_dict["exact"])
+        search_index.normalized_postings.update(index_dict["normalized"])
+        return search_index
+
+# =============================================================================
+# STEP 4:
+#    Build the index while parsing
+# =============================================================================
+
+# Step 4a: Define 'parse_with_search_index()' function
+
+
+def parse_with_search_index(input_file, witnesses=None):
+    """
+    Parses an input file into a DataFrame and indexes the words of its records
+    in the same pass.
+
+    Args:
+        input_file (str): The path to the input file or per-book directory.
+        witnesses (list[str]): The witness abbreviations to match.
+
+    Returns:
+        tuple: A tuple containing the DataFrame returned by 'parse_sbl.extract_data()'
+        and the SearchIndex of its rows.
+    """
+    record_columns = parse_sbl.RecordColumns()
+    search_index = SearchIndex()
+    records = parse_sbl.iter_records(parse_sbl.iter_input_lines(input_file), witnesses=witnesses)
+    for record_id, record in enumerate(records):
+        record_columns.append(record)
+        search_index.add(record_id, record.textual_variant)
+    return record_columns.to_dataframe(), search_index
+
+# Step 4b: Define 'get_search_index_path()' function
+
+
+def get_search_index_path(input_file):
+    """
+    Returns the path of the search index saved next to an input file or per-book directory.
+
+    Args:
+        input_file (str): The path to the input file or directory.
+
+    Returns:
+        str: The path of the search index file.
+    """
+    return os.path.normpath(input_file) + search_index_suffix
+
+# Step 4c: Define 'save_search_index()' function
+
+
+def save_search_index(search_index, index_path, source_hash):
+    """
+    Saves a search index as JSON, if the directory can be written.
+
+    Args:
+        search_index (SearchIndex): The index.
+        index_path (str): The path of the index file.
+        source_hash (str): The hex digest of the input the index was built from.
+    """
+    # The saved index is only a cache. A read-only directory only costs
+    # rebuilding the index on the next run, so the search itself goes on.
+    try:
+        with open(index_path, "w", encoding="utf-8") as index_file:
+            json.dump({"version": search_index_version, "source_hash": source_hash,
+                       **search_index.to_dict()}, index_file, ensure_ascii=False)
+    except OSError:
+        pass
+
+# Step 4d: Define 'hash_search_source()' function
+
+
+def hash_search_source(input_file, witnesses=None):
+    """
+    Hashes the input, the witnesses, and the parser source (see 'snapshot_sbl.hash_source()')
+    together with the source of this script, which determines how the words are indexed.
+
+    Args:
+        input_file (str): The path to the input file or per-book directory.
+        witnesses (list[str]): The witness abbreviations parsed.
+
+    Returns:
+        str: The hex digest.
+    """
+    import snapshot_sbl
+
+    source_hash = hashlib.blake2b(snapshot_sbl.hash_source(input_file, witnesses), digest_size=16)
+    with open(__file__, "rb") as search_file:
+        source_hash.update(search_file.read())
+    return source_hash.hexdigest()
+
+# Step 4e: Define 'read_search_index()' function
+
+
+def read_search_index(index_path, source_hash):
+    """
+    Reads a saved search index if it was built from the current input, parser, and script.
+
+    Args:
+        index_path (str): The path of the index file.
+        source_hash (str): The value returned by 'hash_search_source()'.
+
+    Returns:
+        SearchIndex: The index, or None if it is missing or out of date.
+    """
+    try:
+        with open(index_path, "r", encoding="utf-8") as index_file:
+            saved_index = json.load(index_file)
+    except (OSError, ValueError):
+        return None
+    if (saved_index.get("version") != search_index_version
+            or saved_index.get("source_hash") != source_hash):
+        return None
+    return SearchIndex.from_dict(saved_index)
+
+# Step 4f: Define 'load_search_index()' function
+
+
+def load_search_index(input_file, witnesses=None):
+    """
+    Loads the saved search index of an input file,
+    building and saving it first if it is missing or out of date.
+    Its record IDs are row positions in 'parse_sbl.process_input_file(input_file, witnesses)'.
+    To search the DataFrame as well, use 'load_data_frame_and_search_index()',
+    which does not parse the input twice when the index is rebuilt.
+
+    Args:
+        input_file (str): The path to the input file or per-book directory.
+        witnesses (list[str]): The witness abbreviations to match.
+
+    Returns:
+        SearchIndex: The index.
+    """
+    source_hash = hash_search_source(input_file, witnesses)
+    index_path = get_search_index_path(input_file)
+    search_index = read_search_index(index_path, source_hash)
+    if search_index is None:
+        _, search_index = parse_with_search_index(input_file, witnesses)
+        save_search_index(search_index, index_path, source_hash)
+    return search_index
+
+# Step 4g: Define 'load_data_frame_and_search_index()' function
+
+
+def load_data_frame_and_search_index(input_file, witnesses=None, use_snapshot=False):
+    """
+    Parses an input file into a DataFrame and loads its saved search index.
+    If the index is missing or out of date, the DataFrame and the index are built
+    in one pass over the input, and the index is saved next to the input file.
+
+    Args:
+        input_file (str): The path to the input file or per-book directory.
+        witnesses (list[str]): The witness abbreviations to match.
+        use_snapshot (bool): Whether to load the DataFrame from its snapshot
+        when the saved index is used (see 'parse_sbl.process_input_file()').
+
+    Returns:
+        tuple: A tuple containing the DataFrame returned by 'parse_sbl.process_input_file()'
+        and the SearchIndex of its rows.
+    """
+    source_hash = hash_search_source(input_file, witnesses)
+    index_path = get_search_index_path(input_file)
+
+    # Step 4g1: Use the saved index if it is fresh, and parse only the DataFrame.
+    search_index = read_search_index(index_path, source_hash)
+    if search_index is not None:
+        data_frame = parse_sbl.process_input_file(
+            input_file, witnesses=witnesses, use_snapshot=use_snapshot)
+        return data_frame, search_index
+
+    # Step 4g2: Otherwise build both in one pass and save the index.
+    data_frame, search_index = parse_with_search_index(input_file, witnesses)
+    save_search_index(search_index, index_path, source_hash)
+    return data_frame, search_index
+
+
+if __name__ == '__main__':
+    input_file = input("Enter the path of the apparatus file (e.g. merged_sbl.txt): ")
+    query = input("Enter the words to search for: ")
+    mode = input(f"Enter the search mode ({', '.join(search_modes)}): ") or "accent_insensitive"
+    data_frame, search_index = load_data_frame_and_search_index(input_file)
+    record_ids = search_index.search(query, mode)
+    print(data_frame.iloc[record_ids].to_string())
+    print(f"Found {len(record_ids)} records")
@@ -0,0 +1,348 @@
+"""
+This script saves the records parsed from a textual apparatus file
+in a compact binary snapshot next to it (for example merged_sbl.txt.snap),
+so that later runs can load them in milliseconds instead of parsing the file again.
+
+A snapshot holds the number columns as raw int32 arrays
+and each string column as int32 codes into a table of its distinct strings.
+It starts with a versioned header holding a hash of the source file,
+of the witnesses parsed, and of the parser source,
+so a snapshot is only used while all three are unchanged.
+The arrays can be memory-mapped and wrapped without copying,
+and records are loaded into a DataFrame or yielded as VariantRecord tuples
+without any regular expression work.
+
+'parse_sbl.process_input_file(use_snapshot=True)' uses and refreshes the snapshot,
+as does 'python cli_sbl.py parse --snapshot'.
+"""
+
+# -- coding: utf-8 --
+
+# =============================================================================
+# STEP 1:
+#    Initialize script
+# =============================================================================
+
+
+# Step 1a: Import necessary libraries
+
+import hashlib
+import mmap
+import os
+import struct
+
+import cache_sbl
+import parse_sbl
+
+# Step 1b: Define global variables
+snapshot_suffix = ".snap"
+snapshot_magic = b"SBLSNAP\x00"
+snapshot_version = 1
+
+# The header is followed by a directory of (offset, byte count) pairs, one per section:
+# the number columns, then the codes, string offsets, and UTF-8 bytes of each string column.
+header_struct = struct.Struct("<8sIIQ16s")
+section_struct = struct.Struct("<QQ")
+integer_columns = parse_sbl.RecordColumns.integer_columns
+string_columns = parse_sbl.RecordColumns.string_columns
+section_count = len(integer_columns) + 3 * len(string_columns)
+section_alignment = 8
+
+# =============================================================================
+# STEP 2:
+#    Hash the source of a snapshot
+# =============================================================================
+
+# Step 2a: Define 'get_snapshot_path()' function
+
+
+def get_snapshot_path(input_file):
+    """
+    Returns the path of the snapshot saved next to an input file or per-book directory.
+
+    Args:
+        input_file (str): The path to the input file or directory.
+
+    Returns:
+        str: The path of the snapshot file.
+    """
+    return os.path.normpath(input_file) + snapshot_suffix
+
+# Step 2b: Define 'hash_source()' function
+
+
+def hash_source(input_file, witnesses=None):
+    """
+    Hashes the input together with the witnesses parsed and the parser source,
+    which together determine the parsed records.
+
+    Args:
+        input_file (str): The path to the input file or per-book directory.
+        witnesses (list[str]): The witness abbreviations parsed.
+        Defaults to 'parse_sbl.witness_abbreviations'.
+
+    Returns:
+        bytes: The 16-byte digest.
+    """
+    if witnesses is None:
+        witnesses = parse_sbl.witness_abbreviations
+    source_hash = hashlib.blake2b(cache_sbl.get_parser_fingerprint(), digest_size=16)
+    source_hash.update("\x00".join(witnesses).encode("utf-8") + b"\x01")
+    if os.path.isdir(input_file):
+        for line in parse_sbl.iter_input_lines(input_file):
+            source_hash.update(line.encode("utf-8"))
+    else:
+        with open(input_file, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                source_hash.update(block)
+    return source_hash.digest()
+
+# =============================================================================
+# STEP 3:
+#    Write a snapshot
+# =============================================================================
+
+# Step 3a: Define 'get_column_sections()' function
+
+
+def get_column_sections(data_frame):
+    """
+    Converts the columns of a parsed DataFrame into the byte sections of a snapshot.
+
+    Args:
+        data_frame (pd.DataFrame): A DataFrame returned by 'parse_sbl.extract_data()'.
+
+    Returns:
+        list[bytes]: The sections, in the order of the snapshot directory.
+    """
+    import numpy as np
+    import pandas as pd
+
+    sections = []
+
+    # Step 3a1: Store the number columns as int32, with missing values as -1.
+    for column in integer_columns:
+        sections.append(
+            data_frame[column].to_numpy(dtype=np.int32, na_value=-1).tobytes())
+
+    # Step 3a2: Store each string column as codes into a table of its distinct strings.
+    # Categorical columns keep their (sorted) categories as the table.
+    for column in string_columns:
+        values = data_frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy()
+            strings = list(values.cat.categories)
+        else:
+            codes, strings = pd.factorize(values, use_na_sentinel=True)
+            strings = list(strings)
+        encoded_strings = [string.encode("utf-8") for string in strings]
+        offsets = np.zeros(len(encoded_strings) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded_strings], out=offsets[1:])
+        sections.append(codes.astype(np.int32).tobytes())
+        sections.append(offsets.tobytes())
+        sections.append(b"".join(encoded_strings))
+    return sections
+
+# Step 3b: Define 'write_snapshot()' function
+
+
+def write_snapshot(data_frame, snapshot_path, source_digest):
+    """
+    Writes a parsed DataFrame to a snapshot file.
+    The file is written under a temporary name and then renamed,
+    so a reader never sees a partly written snapshot.
+
+    Args:
+        data_frame (pd.DataFrame): A DataFrame returned by 'parse_sbl.extract_data()'.
+        snapshot_path (str): The path of the snapshot file.
+        source_digest (bytes): The value returned by 'hash_source()'.
+    """
+    sections = get_column_sections(data_frame)
+
+    # Step 3b1: Lay the sections out after the header and directory, each 8-byte aligned.
+    offset = header_struct.size + section_struct.size * len(sections)
+    directory = []
+    for section in sections:
+        offset += -offset % section_alignment
+        directory.append((offset, len(section)))
+        offset += len(section)
+
+    # Step 3b2: Write the header, the directory, and the sections.
+    temporary_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as snapshot_file:
+        snapshot_file.write(header_struct.pack(
+            snapshot_magic, snapshot_version, len(sections), len(data_frame), source_digest))
+        for section_offset, section_size in directory:
+            snapshot_file.write(section_struct.pack(section_offset, section_size))
+        for (section_offset, _), section in zip(directory, sections):
+            snapshot_file.write(b"\x00" * (section_offset - snapshot_file.tell()))
+            snapshot_file.write(section)
+    os.replace(temporary_path, snapshot_path)
+
+# Step 3c: Define 'save_snapshot()' function
+
+
+def save_snapshot(data_frame, input_file, witnesses=None):
+    """
+    Saves a parsed DataFrame as the snapshot of its input file.
+
+    Args:
+        data_frame (pd.DataFrame): The DataFrame parsed from the input file.
+        input_file (str): The path to the input file or per-book directory.
+        witnesses (list[str]): The witness abbreviations the DataFrame was parsed with.
+
+    Returns:
+        str: The path of the snapshot file.
+    """
+    snapshot_path = get_snapshot_path(input_file)
+    write_snapshot(data_frame, snapshot_path, hash_source(input_file, witnesses))
+    return snapshot_path
+
+# =============================================================================
+# STEP 4:
+#    Read a snapshot
+# =============================================================================
+
+# Step 4a: Define the 'Snapshot' class
+
+
+class Snapshot:
+    """
+    The header and the column arrays of a snapshot file.
+    The number arrays and string codes are wrapped around the file's bytes without copying.
+
+    Args:
+        snapshot_path (str): The path of the snapshot file.
+        memory_map (bool): Whether to memory-map the file, which makes the arrays read-only,
+        instead of reading it into writable memory.
+
+    Raises:
+        ValueError: If the file is not a snapshot or was written by another snapshot version.
+    """
+
+    def __init__(self, snapshot_path, memory_map=True):
+        import numpy as np
+
+        # Step 4a1: Map or read the file.
+        with open(snapshot_path, "rb") as snapshot_file:
+            if memory_map:
+                self.buffer = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.buffer = bytearray(snapshot_file.read())
+
+        # Step 4a2: Check the header and read the directory.
+        if len(self.buffer) < header_struct.size:
+            raise ValueError(f"Not a snapshot file: {snapshot_path!r}")
+        magic, version, sections, self.row_count, self.source_digest = (
+            header_struct.unpack_from(self.buffer, 0))
+        if magic != snapshot_magic:
+            raise ValueError(f"Not a snapshot file: {snapshot_path!r}")
+        if version != snapshot_version or sections != section_count:
+            raise ValueError(f"Unsupported snapshot version {version} in {snapshot_path!r}")
+        directory = [section_struct.unpack_from(
+            self.buffer, header_struct.size + section_struct.size * index)
+            for index in range(sections)]
+
+        def get_array(index, dtype):
+            offset, size = directory[index]
+            return np.frombuffer(
+                self.buffer, dtype=dtype, count=size // np.dtype(dtype).itemsize, offset=offset)
+
+        # Step 4a3: Wrap the number columns, then the codes and string tables.
+        self.integer_arrays = {column: get_array(index, np.int32)
+                               for index, column in enumerate(integer_columns)}
+        self.string_codes = {}
+        self.string_tables = {}
+        for index, column in enumerate(string_columns):
+            section_index = len(integer_columns) + 3 * index
+            self.string_codes[column] = get_array(section_index, np.int32)
+            offsets = get_array(section_index + 1, np.int64).tolist()
+            blob_offset, _ = directory[section_index + 2]
+            blob = bytes(self.buffer[blob_offset:blob_offset + offsets[-1]])
+            self.string_tables[column] = [
+                blob[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+
+    def to_dataframe(self):
+        """
+        Builds the DataFrame the snapshot was written from.
+
+        Returns:
+            pd.DataFrame: The same DataFrame that 'parse_sbl.extract_data()' returned.
+        """
+        import numpy as np
+        import pandas as pd
+
+        columns = {}
+        for column, values in self.integer_arrays.items():
+            if column in parse_sbl.RecordColumns.nullable_columns and (values == -1).any():
+                values = pd.arrays.IntegerArray(values.copy(), values == -1)
+            columns[column] = values
+        for column, codes in self.string_codes.items():
+            strings = self.string_tables[column]
+            if column in parse_sbl.categorical_columns:
+                columns[column] = pd.Categorical.from_codes(codes, categories=strings)
+            else:
+                values = np.array(strings + [None], dtype=object)
+                columns[column] = values[codes]
+        return pd.DataFrame(
+            {column: columns[column] for column in parse_sbl.output_columns}, copy=False)
+
+    def iter_records(self):
+        """
+        Yields the records of the snapshot as VariantRecord tuples.
+
+        Yields:
+            VariantRecord: The records, in the order they were parsed.
+        """
+        integer_lists = {column: values.tolist() for column, values in self.integer_arrays.items()}
+        string_lists = {}
+        for column, codes in self.string_codes.items():
+            strings = self.string_tables[column] + [None]
+            string_lists[column] = [strings[code] for code in codes.tolist()]
+        for column in parse_sbl.RecordColumns.nullable_columns:
+            integer_lists[column] = [None if value == -1 else value
+                                     for value in integer_lists[column]]
+        column_lists = {**integer_lists, **string_lists}
+        for values in zip(*(column_lists[column] for column in parse_sbl.output_columns)):
+            yield parse_sbl.VariantRecord(*values)
+
+# Step 4b: Define 'load_snapshot()' function
+
+
+def load_snapshot(snapshot_path, memory_map=True):
+    """
+    Loads a snapshot file into a DataFrame without checking whether it is fresh.
+
+    Args:
+        snapshot_path (str): The path of the snapshot file.
+        memory_map (bool): Whether to memory-map the file.
+        The number columns of the DataFrame are then read-only views of the file.
+
+    Returns:
+        pd.DataFrame: The parsed records.
+    """
+    return Snapshot(snapshot_path, memory_map).to_dataframe()
+
+# Step 4c: Define 'load_fresh_snapshot()' function
+
+
+def load_fresh_snapshot(input_file, witnesses=None, memory_map=False):
+    """
+    Loads the snapshot of an input file if it was written from the current input,
+    witnesses, and parser.
+
+    Args:
+        input_file (str): The path to the input file or per-book directory.
+        witnesses (list[str]): The witness abbreviations to parse.
+        memory_map (bool): Whether to memory-map the snapshot file.
+
+    Returns:
+        pd.DataFrame: The parsed records, or None if there is no fresh snapshot.
+    """
+    try:
+        snapshot = Snapshot(get_snapshot_path(input_file), memory_map)
+    except (OSError, ValueError):
+        return None
+    if snapshot.source_digest != hash_source(input_file, witnesses):
+        return None
+    return snapshot.to_dataframe()
@@ -0,0 +1,167 @@
+"""
+This script computes how often each pair of witnesses agrees
+in a parsed textual apparatus, per book or per chapter.
+
+Two witnesses are compared in every unit (a verse and group) in which both are attested,
+and they agree in that unit if a single reading is supported by both.
+The counts for all witness pairs are computed in one vectorized pass
+over the witness bitmasks built by query_sbl.py, without a Python loop over units,
+and can be exported as CSV in long form (one row per group and witness pair)
+or viewed as a witness x witness matrix.
+"""
+
+# -- coding: utf-8 --
+
+# =============================================================================
+# STEP 1:
+#    Initialize script
+# =============================================================================
+
+
+# Step 1a: Import necessary libraries
+
+import numpy as np
+import pandas as pd
+
+import parse_sbl
+import query_sbl
+
+# Step 1b: Define global variables
+grouping_columns = {
+    "corpus": [],
+    "book": ["book_name"],
+    "chapter": ["book_name", "chapter_number"],
+}
+
+# =============================================================================
+# STEP 2:
+#    Compute the agreement counts
+# =============================================================================
+
+# Step 2a: Define 'get_witness_bits()' function
+
+
+def get_witness_bits(masks, witness_count):
+    """
+    Expands an array of witness bitmasks into a boolean matrix.
+
+    Args:
+        masks (np.ndarray): The int64 bitmask of each row.
+        witness_count (int): The number of witnesses in the registry.
+
+    Returns:
+        np.ndarray: A boolean array of shape (rows, witness_count).
+    """
+    return ((masks[:, None] >> np.arange(witness_count)) & 1).astype(bool)
+
+# Step 2b: Define 'compute_agreement()' function
+
+
+def compute_agreement(apparatus_query, by="book"):
+    """
+    Counts, for each group of units and each pair of witnesses,
+    the units in which both witnesses are attested and the units in which they agree.
+
+    Args:
+        apparatus_query (query_sbl.ApparatusQuery): The encoded readings and units.
+        by (str): 'corpus', 'book', or 'chapter'.
+
+    Returns:
+        pd.DataFrame: A pandas DataFrame with the grouping columns and
+        'witness_a', 'witness_b', 'comparisons', 'agreements', and 'agreement_rate',
+        with one row per group and ordered witness pair.
+    """
+    witnesses = apparatus_query.registry.witnesses
+    witness_count = len(witnesses)
+    readings = apparatus_query.readings
+    units = apparatus_query.units
+
+    # Step 2b1: For each reading, mark the witness pairs that support it together,
+    # then combine the readings of each unit with a logical OR.
+    order = np.argsort(readings["unit_id"].to_numpy(), kind="stable")
+    reading_bits = get_witness_bits(readings["witness_mask"].to_numpy()[order], witness_count)
+    reading_pairs = (reading_bits[:, :, None] & reading_bits[:, None, :]).reshape(
+        len(readings), witness_count * witness_count)
+    unit_starts = np.flatnonzero(np.r_[True, np.diff(readings["unit_id"].to_numpy()[order]) != 0])
+    if len(reading_pairs):
+        agreements = np.logical_or.reduceat(reading_pairs, unit_starts, axis=0)
+    else:
+        agreements = np.zeros((0, witness_count * witness_count), dtype=bool)
+
+    # Step 2b2: For each unit, mark the witness pairs that are both attested.
+    unit_bits = get_witness_bits(units["witness_mask"].to_numpy(), witness_count)
+    comparisons = (unit_bits[:, :, None] & unit_bits[:, None, :]).reshape(
+        len(units), witness_count * witness_count)
+
+    # Step 2b3: Sum the marks over the units of each group.
+    pair_labels = pd.MultiIndex.from_product(
+        [witnesses, witnesses], names=["witness_a", "witness_b"])
+    group_keys = grouping_columns[by]
+    counts = []
+    for name, marks in (("comparisons", comparisons), ("agreements", agreements)):
+        marks = pd.DataFrame(marks.astype(np.int64), columns=pair_labels, index=units.index)
+        if group_keys:
+            marks = marks.groupby(
+                [units[column] for column in group_keys], sort=False, observed=True).sum()
+        else:
+            marks = marks.sum().to_frame().T
+        counts.append(marks.stack(["witness_a", "witness_b"], future_stack=True).rename(name))
+
+    # Step 2b4: Combine the counts into one long-form DataFrame.
+    agreement = pd.concat(counts, axis=1).reset_index()
+    if not group_keys:
+        agreement = agreement.drop(columns=agreement.columns[0])
+    agreement["agreement_rate"] = (
+        agreement["agreements"] / agreement["comparisons"].where(agreement["comparisons"] > 0))
+    return agreement
+
+# Step 2c: Define 'get_agreement_matrix()' function
+
+
+def get_agreement_matrix(agreement, value="agreement_rate", **group):
+    """
+    Pivots the agreement counts of one group into a witness x witness matrix.
+
+    Args:
+        agreement (pd.DataFrame): The DataFrame returned by 'compute_agreement()'.
+        value (str): 'agreement_rate', 'agreements', or 'comparisons'.
+        **group: The value of each grouping column, for example book_name="Romans".
+
+    Returns:
+        pd.DataFrame: The matrix, indexed by 'witness_a' with one column per 'witness_b'.
+    """
+    selected = agreement
+    for column, column_value in group.items():
+        selected = selected[selected[column] == column_value]
+    witnesses = list(dict.fromkeys(agreement["witness_a"]))
+    return selected.pivot(index="witness_a", columns="witness_b", values=value).reindex(
+        index=witnesses, columns=witnesses)
+
+# =============================================================================
+# STEP 3:
+#    Export the agreement counts
+# =============================================================================
+
+# Step 3a: Define 'export_agreement_csv()' function
+
+
+def export_agreement_csv(input_file, output_file_path, by="book", witnesses=None):
+    """
+    Parses an input file, computes the pairwise witness agreement,
+    and writes it to a CSV file in long form.
+
+    Args:
+        input_file (str): The path to the input file or per-book directory.
+        output_file_path (str): The path where the CSV file should be written.
+        by (str): 'corpus', 'book', or 'chapter'.
+        witnesses (list[str]): The witness abbreviations to match and compare.
+        Defaults to 'parse_sbl.witness_abbreviations'.
+
+    Returns:
+        pd.DataFrame: The DataFrame returned by 'compute_agreement()'.
+    """
+    data_frame = parse_sbl.process_input_file(input_file, witnesses=witnesses)
+    apparatus_query = query_sbl.ApparatusQuery(data_frame, query_sbl.WitnessRegistry(witnesses))
+    agreement = compute_agreement(apparatus_query, by)
+    agreement.to_csv(output_file_path, index=False)
+    return agreement
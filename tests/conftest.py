@@ -0,0 +1,102 @@
+"""
+Shared fixtures of the test suite: the one-verse sample test_sbl.txt,
+a short apparatus that crosses a chapter and a book boundary,
+and the full merged_sbl.txt, each copied to a temporary directory
+so that the snapshots, caches, and indexes written next to them are thrown away.
+"""
+
+# -- coding: utf-8 --
+
+import os
+import shutil
+
+import pytest
+
+import parse_sbl
+
+repository_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Matthew 1:5 is test_sbl.txt. The verses after it end a chapter and a book.
+boundary_verses_text = """Matthew 1:6
+6 δὲ WH Treg NA28 ] + ὁ βασιλεὺς RP
+Matthew 2:1
+2:1 Ἰησοῦ WH Treg NA28 ] τοῦ Ἰησοῦ RP
+Matthew 28:20
+20 αἰῶνος WH Treg NA28 ] + Ἀμήν RP
+Mark 1:1
+1:1 χριστοῦ WH ] + υἱοῦ θεοῦ Treg NA28; υἱοῦ τοῦ θεοῦ RP
+Mark 1:2
+2 Καθὼς WH Treg NA28 ] Ὡς RP
+• τῷ Ἠσαΐᾳ τῷ προφήτῃ WH Treg NA28 ] τοῖς προφήταις RP
+"""
+
+
+def copy_input_file(file_name, directory):
+    """
+    Copies an input file of the repository into a directory.
+
+    Args:
+        file_name (str): The name of the file, such as "test_sbl.txt".
+        directory (pathlib.Path): The directory to copy it into.
+
+    Returns:
+        str: The path of the copy.
+    """
+    copy_path = directory / file_name
+    shutil.copyfile(os.path.join(repository_directory, file_name), copy_path)
+    return str(copy_path)
+
+
+@pytest.fixture
+def test_file(tmp_path):
+    """The path of a copy of test_sbl.txt."""
+    return copy_input_file("test_sbl.txt", tmp_path)
+
+
+@pytest.fixture
+def apparatus_file(tmp_path):
+    """The path of test_sbl.txt followed by verses across a chapter and a book boundary."""
+    apparatus_path = tmp_path / "apparatus_sbl.txt"
+    with open(os.path.join(repository_directory, "test_sbl.txt"), encoding="utf-8") as file:
+        sample_text = file.read()
+    apparatus_path.write_text(sample_text.rstrip() + "\n" + boundary_verses_text, encoding="utf-8")
+    return str(apparatus_path)
+
+
+@pytest.fixture
+def merged_file(tmp_path):
+    """The path of a copy of merged_sbl.txt."""
+    return copy_input_file("merged_sbl.txt", tmp_path)
+
+
+@pytest.fixture(scope="session")
+def merged_data_frame():
+    """The DataFrame of merged_sbl.txt, parsed serially and without a snapshot."""
+    return parse_sbl.process_input_file(os.path.join(repository_directory, "merged_sbl.txt"))
+
+
+@pytest.fixture(scope="session")
+def book_directory(tmp_path_factory):
+    """
+    The path of a directory of per-book files split from merged_sbl.txt,
+    laid out as in SBLGNT-master/data/sblgntapp/text/, with a title and a blank line
+    before each book.
+    """
+    import merge_sbl_files
+
+    book_texts = {}
+    book_name = None
+    with open(os.path.join(repository_directory, "merged_sbl.txt"), encoding="utf-8") as file:
+        for line in file:
+            header_match = parse_sbl.line_header_pattern.match(line)
+            if header_match:
+                book_name = header_match.group("book_name")
+            book_texts.setdefault(book_name, []).append(line)
+    directory = tmp_path_factory.mktemp("books")
+    for book_name, file_name in zip(parse_sbl.book_names, merge_sbl_files.file_names):
+        # The blank line between two books is added back by the merge.
+        book_text = "".join(book_texts[book_name])
+        if book_text.endswith("\n\n"):
+            book_text = book_text[:-1]
+        (directory / file_name).write_text("Title\n\n" + book_text, encoding="utf-8")
+    return str(directory)
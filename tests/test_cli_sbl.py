@@ -0,0 +1,136 @@
+"""
+Tests the batch command line: several inputs in one run, standard input and output,
+failed inputs, profiling, and merging.
+"""
+
+# -- coding: utf-8 --
+
+import io
+import json
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import cli_sbl
+import parse_sbl
+import profile_sbl
+from tests.conftest import repository_directory
+
+
+def read_rows(csv_path):
+    """Returns the rows of a CSV output as a DataFrame."""
+    return pd.read_csv(csv_path, keep_default_na=False)
+
+
+def expected_rows(input_file):
+    """Returns the numbered DataFrame of an input file, as the CLI writes it."""
+    data_frame = parse_sbl.identify_and_assign(parse_sbl.process_input_file(input_file))
+    return data_frame.astype(object).reset_index(drop=True)
+
+
+def test_parse_many_inputs(tmp_path, test_file, apparatus_file, capsys):
+    output_directory = tmp_path / "output"
+    glob_pattern = str(tmp_path / "*_sbl.txt")
+    assert cli_sbl.main(["parse", glob_pattern, "-f", "csv", "-o", str(output_directory)]) == 0
+    for input_file in (test_file, apparatus_file):
+        output_name = os.path.basename(input_file).replace(".txt", ".csv")
+        assert read_rows(output_directory / output_name).values.tolist() == (
+            expected_rows(input_file).values.tolist())
+    assert capsys.readouterr().err.count(" rows") == 2
+
+
+def test_parse_jobs_give_the_same_output(tmp_path, test_file, apparatus_file):
+    for jobs in ("1", "2"):
+        assert cli_sbl.main([
+            "parse", test_file, apparatus_file, "-f", "jsonl", "-j", jobs,
+            "-o", str(tmp_path / jobs)]) == 0
+    for output_name in ("test_sbl.jsonl", "apparatus_sbl.jsonl"):
+        assert (tmp_path / "1" / output_name).read_bytes() == (
+            tmp_path / "2" / output_name).read_bytes()
+
+
+def test_parse_standard_input_to_standard_output(test_file, monkeypatch, capsys):
+    with open(test_file, encoding="utf-8") as input_file:
+        monkeypatch.setattr("sys.stdin", io.StringIO(input_file.read()))
+    assert cli_sbl.main(["parse", "-", "-f", "csv", "-o", "-"]) == 0
+    output = capsys.readouterr().out
+    assert read_rows(io.StringIO(output)).values.tolist() == (
+        expected_rows(test_file).values.tolist())
+
+
+def test_failed_input_does_not_stop_the_others(tmp_path, test_file, capsys):
+    broken_directory = tmp_path / "broken"
+    broken_directory.mkdir()
+    exit_code = cli_sbl.main(
+        ["parse", str(broken_directory), test_file, "-f", "csv", "-o", str(tmp_path / "out")])
+    assert exit_code == 1
+    assert (tmp_path / "out" / "test_sbl.csv").exists()
+    assert "error" in capsys.readouterr().err
+
+
+def test_empty_input_writes_no_rows(tmp_path, capsys):
+    empty_file = tmp_path / "empty_sbl.txt"
+    empty_file.write_text("", encoding="utf-8")
+    assert cli_sbl.main(["parse", str(empty_file), "-f", "csv", "-o", "-"]) == 0
+    output, errors = capsys.readouterr()
+    assert output.splitlines() == [",".join(parse_sbl.output_columns)]
+    assert "empty" in errors
+
+
+def get_exit_code(arguments):
+    """Runs the command line and returns its exit code, also when the arguments are rejected."""
+    try:
+        return cli_sbl.main(arguments)
+    except SystemExit as exc:
+        return exc.code
+
+
+@pytest.mark.parametrize("arguments", [
+    ["parse", "missing_sbl.txt", "-o", "{output}"],
+    ["parse", "{test_file}", "-f", "xlsx", "-o", "-"],
+    ["parse", "{test_file}", "--by-book", "sheets", "-f", "csv", "-o", "{output}"],
+    ["parse", "{test_file}", "--book-workers", "2", "-o", "{output}"],
+    ["parse", "{test_file}", "-f", "csv", "-o", "-", "--profile"],
+    ["parse", "{test_file}", "{test_file_copy}", "-o", "{output}"],
+])
+def test_invalid_arguments(tmp_path, test_file, arguments, capsys):
+    copy_directory = tmp_path / "copy"
+    copy_directory.mkdir()
+    test_file_copy = copy_directory / "test_sbl.txt"
+    shutil.copyfile(test_file, test_file_copy)
+    arguments = [argument.format(test_file=test_file, test_file_copy=test_file_copy,
+                                 output=tmp_path / "output") for argument in arguments]
+    assert get_exit_code(arguments) == 2
+    assert capsys.readouterr().out == ""
+    assert not (tmp_path / "output").exists()
+
+
+def test_profile_writes_a_report(tmp_path, apparatus_file):
+    output_directory = tmp_path / "output"
+    assert cli_sbl.main(
+        ["parse", apparatus_file, "-f", "csv", "--profile", "-o", str(output_directory)]) == 0
+    report_path = output_directory / ("apparatus_sbl.csv" + profile_sbl.report_suffix)
+    with open(report_path, encoding="utf-8") as report_file:
+        report = json.load(report_file)
+    assert [stage["stage"] for stage in report["stages"]] == [
+        "extract_data", "identify_and_assign", "write_output_file"]
+    assert report["counters"]["headers"] == 6
+
+
+def test_by_book_workbooks(tmp_path, apparatus_file):
+    pytest.importorskip("xlsxwriter")
+    output_directory = tmp_path / "output"
+    assert cli_sbl.main(["parse", apparatus_file, "--by-book", "workbooks", "--book-workers",
+                         "2", "-o", str(output_directory)]) == 0
+    assert sorted(path.name for path in (output_directory / "apparatus_sbl").iterdir()) == [
+        "Mark.xlsx", "Matt.xlsx"]
+
+
+def test_merge(tmp_path, book_directory):
+    output_directory = tmp_path / "output"
+    assert cli_sbl.main(["merge", book_directory, "-o", str(output_directory)]) == 0
+    merged_file, = output_directory.iterdir()
+    with open(os.path.join(repository_directory, "merged_sbl.txt"), encoding="utf-8") as file:
+        assert merged_file.read_text(encoding="utf-8") == file.read()
@@ -0,0 +1,68 @@
+"""
+Tests that diff_sbl.py reports the readings added, removed, and changed between revisions.
+"""
+
+# -- coding: utf-8 --
+
+import pytest
+
+import diff_sbl
+
+# test_sbl.txt with a witness moved between readings, a reading added, and a verse added.
+revised_text = """Matthew 1:5
+1:5 Βόες … Βόες WH Treg NA28 ] Βοὸζ … Βοὸζ RP
+• Ἰωβὴδ … Ἰωβὴδ WH Treg ] Ὠβὴδ … Ὠβὴδ RP; Ὠβὴδ NA28
+Matthew 1:6
+6 δὲ WH Treg NA28 ] + ὁ βασιλεὺς RP
+"""
+
+revision_changes = [
+    (5, 1, "changed", "Βόες … Βόες", "WH NA28", "WH NA28 Treg"),
+    (5, 1, "removed", "Βοὸς … Βοὸς", "Treg", ""),
+    (5, 2, "changed", "Ἰωβὴδ … Ἰωβὴδ", "WH NA28 Treg", "WH Treg"),
+    (5, 2, "added", "Ὠβὴδ", "", "NA28"),
+    (6, 1, "added", "δὲ", "", "WH NA28 Treg"),
+    (6, 1, "added", "+ ὁ βασιλεὺς", "", "RP"),
+]
+
+
+@pytest.fixture
+def revised_file(tmp_path):
+    """The path of the revision of test_sbl.txt."""
+    revised_path = tmp_path / "revised_sbl.txt"
+    revised_path.write_text(revised_text, encoding="utf-8")
+    return str(revised_path)
+
+
+def get_changes(diff_entries):
+    """Returns the verse number, group, change, reading, and witnesses of each entry."""
+    return [(entry.verse_number, entry.group_number, entry.change, entry.textual_variant,
+             entry.old_witnesses, entry.new_witnesses) for entry in diff_entries]
+
+
+def test_diff_reports_added_removed_and_changed_readings(test_file, revised_file):
+    diff_entries = list(diff_sbl.diff_apparatus(test_file, revised_file))
+    assert {(entry.book_name, entry.chapter_number) for entry in diff_entries} == {("Matthew", 1)}
+    assert get_changes(diff_entries) == revision_changes
+
+
+def test_reversed_diff_swaps_added_and_removed(test_file, revised_file):
+    swapped_changes = {"added": "removed", "removed": "added", "changed": "changed"}
+    assert get_changes(diff_sbl.diff_apparatus(revised_file, test_file)) == [
+        (verse_number, group_number, swapped_changes[change], textual_variant,
+         new_witnesses, old_witnesses)
+        for verse_number, group_number, change, textual_variant, old_witnesses, new_witnesses
+        in revision_changes]
+
+
+def test_identical_revisions_have_no_diff(apparatus_file):
+    assert list(diff_sbl.diff_apparatus(apparatus_file, apparatus_file)) == []
+
+
+def test_diff_rejects_verses_out_of_order(tmp_path, test_file):
+    unordered_path = tmp_path / "unordered_sbl.txt"
+    unordered_path.write_text(
+        "Matthew 1:6\n6 δὲ WH Treg NA28 ] + ὁ βασιλεὺς RP\n"
+        "Matthew 1:5\n1:5 Βόες … Βόες WH Treg NA28 ] Βοὸζ … Βοὸζ RP\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(diff_sbl.diff_apparatus(test_file, str(unordered_path)))
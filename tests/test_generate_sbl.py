@@ -0,0 +1,59 @@
+"""
+Tests that the synthetic apparatus parses like merged_sbl.txt,
+is deterministic, and numbers its chapters and verses below the verse ID limits.
+"""
+
+# -- coding: utf-8 --
+
+from collections import defaultdict
+
+import pytest
+
+import generate_sbl
+import index_sbl
+import parse_sbl
+
+
+def get_headers(apparatus_text):
+    """Returns the parsed header of every verse block of an apparatus."""
+    return [parse_sbl.parse_header_line(block_text.split("\n", 1)[0])
+            for block_text in parse_sbl.iter_verse_blocks(apparatus_text.splitlines(True))]
+
+
+def test_generated_apparatus_is_deterministic():
+    assert generate_sbl.generate_apparatus(0.05, seed=1) == generate_sbl.generate_apparatus(
+        0.05, seed=1)
+    assert generate_sbl.generate_apparatus(0.05, seed=1) != generate_sbl.generate_apparatus(
+        0.05, seed=2)
+
+
+def test_generated_apparatus_parses_like_merged_sbl(merged_data_frame):
+    counters = defaultdict(int)
+    data_frame = parse_sbl.extract_data(generate_sbl.generate_apparatus(1), counters=counters)
+    assert counters["headers"] == merged_data_frame["verse_id"].nunique()
+    assert counters["unmatched_lines"] == 0
+    assert len(data_frame) == pytest.approx(len(merged_data_frame), rel=0.1)
+    assert set(data_frame["witness_abbreviation"]) == set(parse_sbl.witness_abbreviations)
+    assert list(data_frame["book_name"].unique()) == parse_sbl.book_names
+
+
+def test_generated_verses_are_in_canonical_order(tmp_path):
+    output_file = tmp_path / "generated_sbl.txt"
+    byte_count = generate_sbl.write_apparatus(str(output_file), 0.1)
+    assert output_file.stat().st_size == byte_count
+    verse_ids = [entry[0] for entry in index_sbl.build_index(str(output_file))]
+    assert verse_ids == sorted(set(verse_ids))
+
+
+def test_long_books_get_longer_chapters(monkeypatch):
+    monkeypatch.setattr(generate_sbl, "max_reference_number", 40)
+    headers = get_headers(generate_sbl.generate_apparatus(1))
+    assert all(header.verse_id is not None for header in headers)
+    assert max(max(header.chapter_number, header.verse_number) for header in headers) <= 40
+    assert len({header.verse_id for header in headers}) == len(headers)
+
+
+def test_too_large_scale_is_rejected(monkeypatch):
+    monkeypatch.setattr(generate_sbl, "max_reference_number", 40)
+    with pytest.raises(ValueError):
+        generate_sbl.generate_apparatus(100)
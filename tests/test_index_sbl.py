@@ -0,0 +1,59 @@
+"""
+Tests that parsing a verse range through the index gives the rows
+that 'parse_sbl.select_verse_range()' selects from the whole file.
+"""
+
+# -- coding: utf-8 --
+
+import pytest
+
+import index_sbl
+import parse_sbl
+
+verse_ranges = [
+    ("Matthew 1:5", None),
+    ("Matthew 1", "Matthew 2"),
+    ("Matthew 28", "Mark 1"),
+    ("Matthew 28:20", "Mark 1:1"),
+    ("Jude", "Revelation 1"),
+    ("Romans 5", "Romans 8"),
+    ("Revelation 22", None),
+]
+
+
+@pytest.mark.parametrize("start_reference, end_reference", verse_ranges)
+def test_parse_range_matches_select_verse_range(
+        merged_file, merged_data_frame, start_reference, end_reference):
+    selected = parse_sbl.select_verse_range(merged_data_frame, start_reference, end_reference)
+    parsed = index_sbl.parse_range(start_reference, end_reference, merged_file)
+    columns = [column for column in parse_sbl.output_columns if column != "record_number"]
+    assert len(selected) > 0
+    assert list(parsed[columns].astype(object).itertuples(index=False, name=None)) == list(
+        selected[columns].astype(object).itertuples(index=False, name=None))
+
+
+def test_parse_range_crosses_book_boundary(merged_file):
+    parsed = index_sbl.parse_range("Matthew 28:20", "Mark 1:1", merged_file)
+    verses = parsed[["book_name", "chapter_number", "verse_number"]].astype(object)
+    assert list(dict.fromkeys(verses.itertuples(index=False, name=None))) == [
+        ("Matthew", 28, 20), ("Mark", 1, 1)]
+
+
+def test_parse_range_without_verses_is_empty(apparatus_file):
+    assert len(index_sbl.parse_range("Mark 2", None, apparatus_file)) == 0
+    assert list(index_sbl.parse_range("Luke", None, apparatus_file).columns) == (
+        parse_sbl.output_columns)
+
+
+@pytest.mark.parametrize("headers", [
+    ["Mark 1:1", "Matthew 1:5"],
+    ["Matthew 2:1", "Matthew 1:6"],
+    ["Matthew 1:5", "Matthew 1:5"],
+])
+def test_index_rejects_verses_out_of_order(tmp_path, headers):
+    input_file = tmp_path / "unordered_sbl.txt"
+    input_file.write_text("".join(
+        f"{header}\n1 λόγος WH Treg NA28 ] λόγου RP\n" for header in headers), encoding="utf-8")
+    with pytest.raises(ValueError, match="not in verse order"):
+        index_sbl.parse_range("Matthew", None, str(input_file))
+    assert not (tmp_path / ("unordered_sbl.txt" + index_sbl.index_suffix)).exists()
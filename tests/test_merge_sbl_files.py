@@ -0,0 +1,47 @@
+"""
+Tests that merging the per-book files gives merged_sbl.txt back.
+"""
+
+# -- coding: utf-8 --
+
+import os
+
+import pytest
+
+import merge_sbl_files
+from tests.conftest import repository_directory
+
+
+@pytest.fixture(scope="module")
+def merged_text():
+    """The text of merged_sbl.txt."""
+    with open(os.path.join(repository_directory, "merged_sbl.txt"), encoding="utf-8") as file:
+        return file.read()
+
+
+def test_merge_sbl_files_rebuilds_the_merged_file(book_directory, merged_text, tmp_path):
+    output_file = tmp_path / "merged_sbl.txt"
+    merge_sbl_files.merge_sbl_files(book_directory, str(output_file))
+    assert output_file.read_text(encoding="utf-8") == merged_text
+
+
+@pytest.mark.parametrize("workers", [1, 2, 30])
+def test_iter_book_texts_yields_every_book_in_order(book_directory, merged_text, workers):
+    book_texts = list(merge_sbl_files.iter_book_texts(book_directory, workers))
+    assert len(book_texts) == len(merge_sbl_files.file_names)
+    assert "".join(book_texts) == merged_text
+
+
+def test_iter_book_texts_reads_only_a_few_books_ahead(book_directory, monkeypatch):
+    read_file_names = []
+    read_book_text = merge_sbl_files.read_book_text
+
+    def record_read(input_directory, file_name):
+        read_file_names.append(file_name)
+        return read_book_text(input_directory, file_name)
+
+    monkeypatch.setattr(merge_sbl_files, "read_book_text", record_read)
+    book_texts = merge_sbl_files.iter_book_texts(book_directory, workers=2)
+    next(book_texts)
+    assert len(read_file_names) <= 2
+    book_texts.close()
@@ -0,0 +1,165 @@
+"""
+Tests that every way of parsing an input file gives the same records,
+that verse ID ranges cover whole chapters and books,
+and that the interactive pipeline writes the format of the output file's extension.
+"""
+
+# -- coding: utf-8 --
+
+import zipfile
+
+import pandas as pd
+import pytest
+
+import cache_sbl
+import parse_sbl
+import snapshot_sbl
+
+# The rows of test_sbl.txt, as in the sample output of README.md.
+test_sbl_rows = [
+    ("Βόες … Βόες", "WH", 1, 1, 1),
+    ("Βόες … Βόες", "NA28", 1, 1, 2),
+    ("Βοὸς … Βοὸς", "Treg", 1, 2, 1),
+    ("Βοὸζ … Βοὸζ", "RP", 1, 3, 1),
+    ("Ἰωβὴδ … Ἰωβὴδ", "WH", 2, 1, 1),
+    ("Ἰωβὴδ … Ἰωβὴδ", "Treg", 2, 1, 2),
+    ("Ἰωβὴδ … Ἰωβὴδ", "NA28", 2, 1, 3),
+    ("Ὠβὴδ … Ὠβὴδ", "RP", 2, 2, 1),
+]
+
+
+def test_parses_test_sbl(test_file):
+    data_frame = parse_sbl.process_input_file(test_file)
+    assert list(data_frame.columns) == parse_sbl.output_columns
+    assert list(data_frame[["textual_variant", "witness_abbreviation", "group_number",
+                            "variant_number", "occurrence_number"]].itertuples(
+        index=False, name=None)) == test_sbl_rows
+    assert (data_frame["book_name"] == "Matthew").all()
+    assert (data_frame["verse_id"] == parse_sbl.encode_verse_id("Matthew", 1, 5)).all()
+
+
+@pytest.mark.parametrize("input_name", ["test_file", "apparatus_file", "merged_file"])
+def test_parallel_parse_equals_serial_parse(input_name, request):
+    input_file = request.getfixturevalue(input_name)
+    serial = parse_sbl.process_input_file(input_file)
+    parallel = parse_sbl.process_input_file(input_file, workers=2)
+    pd.testing.assert_frame_equal(parallel, serial)
+
+
+@pytest.mark.parametrize("input_name", ["apparatus_file", "merged_file"])
+def test_cached_parse_equals_serial_parse(input_name, request, tmp_path):
+    input_file = request.getfixturevalue(input_name)
+    serial = parse_sbl.process_input_file(input_file)
+    cache_path = str(tmp_path / "records.cache")
+    first, first_stats = cache_sbl.process_input_file_cached(input_file, cache_path)
+    second, second_stats = cache_sbl.process_input_file_cached(input_file, cache_path)
+    pd.testing.assert_frame_equal(first, serial)
+    pd.testing.assert_frame_equal(second, serial)
+    assert second_stats.misses == 0
+
+
+def test_snapshot_parse_equals_serial_parse(apparatus_file):
+    serial = parse_sbl.process_input_file(apparatus_file)
+    written = parse_sbl.process_input_file(apparatus_file, use_snapshot=True)
+    loaded = snapshot_sbl.load_fresh_snapshot(apparatus_file)
+    pd.testing.assert_frame_equal(written, serial)
+    pd.testing.assert_frame_equal(loaded, serial)
+    pd.testing.assert_frame_equal(
+        parse_sbl.process_input_file(apparatus_file, use_snapshot=True), serial)
+
+
+def test_parse_writes_no_snapshot_by_default(apparatus_file):
+    parse_sbl.process_input_file(apparatus_file)
+    assert snapshot_sbl.load_fresh_snapshot(apparatus_file) is None
+
+
+@pytest.mark.parametrize("chunksize", [1, 5, 1000])
+def test_chunked_parse_equals_serial_parse(apparatus_file, chunksize):
+    serial = parse_sbl.process_input_file(apparatus_file)
+    chunks = list(parse_sbl.process_input_file(apparatus_file, chunksize=chunksize))
+    # A chunk is only closed between verses, so no verse is split across two chunks.
+    chunk_verse_ids = [set(chunk["verse_id"]) for chunk in chunks]
+    assert sum(map(len, chunk_verse_ids)) == len(set().union(*chunk_verse_ids))
+    assert len(chunks) > 1 or chunksize >= len(serial)
+    chunked = pd.concat(chunks, ignore_index=True)
+    assert list(chunked.astype(object).itertuples(index=False, name=None)) == list(
+        serial.astype(object).itertuples(index=False, name=None))
+
+
+@pytest.mark.parametrize("start_reference, end_reference, expected_verses", [
+    ("Matthew 1", None, [("Matthew", 1, 5), ("Matthew", 1, 6)]),
+    ("Matthew 1:6", "Matthew 2:1", [("Matthew", 1, 6), ("Matthew", 2, 1)]),
+    ("Matthew 2", "Mark 1", [("Matthew", 2, 1), ("Matthew", 28, 20),
+                             ("Mark", 1, 1), ("Mark", 1, 2)]),
+    ("Matthew 28:20", "Mark 1:1", [("Matthew", 28, 20), ("Mark", 1, 1)]),
+    ("Mark", None, [("Mark", 1, 1), ("Mark", 1, 2)]),
+    ("Mark 2", None, []),
+])
+def test_select_verse_range(apparatus_file, start_reference, end_reference, expected_verses):
+    data_frame = parse_sbl.process_input_file(apparatus_file)
+    selected = parse_sbl.select_verse_range(data_frame, start_reference, end_reference)
+    verses = selected[["book_name", "chapter_number", "verse_number"]].astype(object)
+    assert list(dict.fromkeys(verses.itertuples(index=False, name=None))) == expected_verses
+
+
+def test_verse_id_range_bounds():
+    assert parse_sbl.get_verse_id_range("Matthew 28") == (
+        parse_sbl.encode_verse_id("Matthew", 28, 0), parse_sbl.encode_verse_id("Matthew", 28, 999))
+    first_verse_id, last_verse_id = parse_sbl.get_verse_id_range("Matthew", "Mark")
+    assert first_verse_id < parse_sbl.encode_verse_id("Matthew", 1, 1)
+    assert parse_sbl.encode_verse_id("Mark", 16, 20) < last_verse_id
+    assert last_verse_id < parse_sbl.encode_verse_id("Luke", 1, 1)
+    with pytest.raises(ValueError):
+        parse_sbl.get_verse_id_range("Matthias 1")
+
+
+@pytest.mark.parametrize("line, expected_readings", [
+    ("καί τινεςWH Treg NA28 ] τινὲς γὰρ RP",
+     [("καί τινες", ["WH", "Treg", "NA28"]), ("τινὲς γὰρ", ["RP"])]),
+    ("πρώτης μερίδος τῆς em NA28 ] πρώτη τῆς μερίδος WH Treg RP",
+     [("πρώτης μερίδος τῆς", ["NA28"]), ("πρώτη τῆς μερίδος", ["WH", "Treg", "RP"])]),
+    ("– WH; –RP ] αὐτοῦ ⟦NA28⟧",
+     [("–", ["WH"]), ("–", ["RP"]), ("αὐτοῦ", ["NA28"])]),
+])
+def test_readings_exclude_markers_and_sigla(line, expected_readings):
+    readings = [(reading.text, reading.witnesses)
+                for reading in parse_sbl.iter_readings(parse_sbl.iter_tokens(line))
+                if isinstance(reading, parse_sbl.Reading)]
+    assert readings == expected_readings
+
+
+def run_main(monkeypatch, input_file, output_file):
+    """Runs 'parse_sbl.main()' with the input and output paths as the answers to its prompts."""
+    answers = iter([input_file, output_file])
+    monkeypatch.setattr("builtins.input", lambda prompt: next(answers))
+    parse_sbl.main()
+
+
+@pytest.mark.parametrize("output_name", ["output", "output.out"])
+def test_main_writes_excel_without_a_supported_extension(
+        monkeypatch, tmp_path, test_file, output_name):
+    output_file = tmp_path / output_name
+    run_main(monkeypatch, test_file, str(output_file))
+    assert "xl/workbook.xml" in zipfile.ZipFile(output_file).namelist()
+
+
+def test_main_writes_the_format_of_the_extension(monkeypatch, tmp_path, test_file):
+    output_file = tmp_path / "output.csv"
+    run_main(monkeypatch, test_file, str(output_file))
+    assert output_file.read_text(encoding="utf-8").splitlines()[0].split(",") == (
+        parse_sbl.output_columns)
+
+
+def test_main_checks_the_output_path_before_parsing(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(parse_sbl, "process_input_file", pytest.fail)
+    run_main(monkeypatch, "missing_sbl.txt", str(tmp_path / "missing" / "output.xlsx"))
+    assert "does not exist" in capsys.readouterr().err
+
+
+def test_chapter_dot_verse_label_is_not_part_of_the_reading():
+    data_frame = parse_sbl.extract_data(
+        "Galatians 2:4\n2.4 καταδουλώσουσιν WH Treg NA28 ] καταδουλώσωνται RP\n")
+    assert list(data_frame[["textual_variant", "witness_abbreviation"]].itertuples(
+        index=False, name=None)) == [
+        ("καταδουλώσουσιν", "WH"), ("καταδουλώσουσιν", "Treg"),
+        ("καταδουλώσουσιν", "NA28"), ("καταδουλώσωνται", "RP")]
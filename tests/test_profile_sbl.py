@@ -0,0 +1,69 @@
+"""
+Tests that the profiler measures each stage it is given,
+and that serial and parallel parses report the same parser counters.
+"""
+
+# -- coding: utf-8 --
+
+import json
+
+import pytest
+
+import parse_sbl
+import profile_sbl
+
+
+def test_stage_records_times_and_throughput():
+    profiler = profile_sbl.Profiler()
+    with profiler.stage("count") as metrics:
+        metrics["records"] = sum(1 for _ in range(1000))
+    stage, = profiler.get_report()["stages"]
+    assert stage["stage"] == "count"
+    assert stage["records"] == 1000
+    assert stage["wall_seconds"] >= 0 and stage["cpu_seconds"] >= 0
+    assert "peak_memory_bytes" not in stage
+
+
+def test_stage_traces_memory_only_when_asked():
+    profiler = profile_sbl.Profiler(trace_memory=True)
+    with profiler.stage("allocate"):
+        blocks = [bytes(1 << 16) for _ in range(16)]
+    assert len(blocks) == 16
+    assert profiler.get_report()["stages"][0]["peak_memory_bytes"] >= 16 << 16
+
+
+def test_stage_is_recorded_when_it_fails():
+    profiler = profile_sbl.Profiler()
+    with pytest.raises(ZeroDivisionError):
+        with profiler.stage("fail"):
+            1 / 0
+    assert [stage["stage"] for stage in profiler.stages] == ["fail"]
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = profile_sbl.Profiler(enabled=False)
+    with profiler.stage("ignored") as metrics:
+        metrics["records"] = 1
+    assert profiler.get_report()["stages"] == []
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_parse_reports_counters(apparatus_file, workers):
+    profiler = profile_sbl.Profiler()
+    data_frame = parse_sbl.process_input_file(apparatus_file, workers=workers, profiler=profiler)
+    report = profiler.get_report()
+    assert [stage["records"] for stage in report["stages"]] == [len(data_frame)]
+    assert report["counters"]["headers"] == 6
+    assert report["counters"]["groups"] == 2
+    assert report["counters"]["variants"] == len(data_frame)
+    assert report["counters"]["tokens"] > len(data_frame)
+
+
+def test_save_profile_writes_the_report(apparatus_file, tmp_path):
+    profiler = profile_sbl.Profiler(use_cprofile=True)
+    parse_sbl.process_input_file(apparatus_file, profiler=profiler)
+    output_path = str(tmp_path / "output.xlsx")
+    report_path = profile_sbl.save_profile(profiler, output_path)
+    with open(report_path, encoding="utf-8") as report_file:
+        assert json.load(report_file)["counters"] == dict(profiler.counters)
+    assert (tmp_path / ("output.xlsx" + profile_sbl.cprofile_suffix)).exists()
@@ -0,0 +1,84 @@
+"""
+Tests that the witness bitmask queries give the units and readings
+found by checking the witnesses of every reading directly.
+"""
+
+# -- coding: utf-8 --
+
+from collections import defaultdict
+
+import pytest
+
+import parse_sbl
+import query_sbl
+
+witness_sets = [("WH", "RP"), ("WH", "Treg", "NA28"), ("NA28",), ("WH", "Treg", "NA28", "RP")]
+
+
+@pytest.fixture(scope="module")
+def unit_readings(merged_data_frame):
+    """A dictionary mapping each unit to a dictionary of its readings and their witnesses."""
+    unit_readings = defaultdict(lambda: defaultdict(set))
+    for record in merged_data_frame.astype(object).itertuples(index=False):
+        unit = (record.book_name, record.chapter_number, record.verse_number, record.group_number)
+        unit_readings[unit][record.textual_variant].add(record.witness_abbreviation)
+    return unit_readings
+
+
+@pytest.fixture(scope="module")
+def apparatus_query(merged_data_frame):
+    """The ApparatusQuery of merged_sbl.txt."""
+    return query_sbl.ApparatusQuery(merged_data_frame)
+
+
+def get_units(data_frame):
+    """Returns the units of a query result as a set of tuples."""
+    return set(data_frame[query_sbl.unit_columns].astype(object).itertuples(
+        index=False, name=None))
+
+
+@pytest.mark.parametrize("witnesses", witness_sets)
+def test_agree_and_disagree_match_the_readings(apparatus_query, unit_readings, witnesses):
+    witness_set = set(witnesses)
+    attested_units = {unit for unit, readings in unit_readings.items()
+                      if witness_set <= set().union(*readings.values())}
+    agreeing_units = {unit for unit, readings in unit_readings.items()
+                      if any(witness_set <= reading_witnesses
+                             for reading_witnesses in readings.values())}
+    assert get_units(apparatus_query.attested(*witnesses)) == attested_units
+    assert get_units(apparatus_query.agree(*witnesses)) == agreeing_units
+    assert get_units(apparatus_query.disagree(*witnesses)) == attested_units - agreeing_units
+
+
+def test_readings_supported_by(apparatus_query, unit_readings):
+    readings = apparatus_query.readings_supported_by(["WH", "NA28"], excluding=["RP"])
+    expected_readings = {(*unit, textual_variant)
+                         for unit, unit_reading in unit_readings.items()
+                         for textual_variant, witnesses in unit_reading.items()
+                         if {"WH", "NA28"} <= witnesses and "RP" not in witnesses}
+    assert set(readings[query_sbl.unit_columns + ["textual_variant"]].astype(object).itertuples(
+        index=False, name=None)) == expected_readings
+    registry = apparatus_query.registry
+    assert all(registry.get_witnesses(mask)[:1] == ["WH"] for mask in readings["witness_mask"])
+
+
+def test_registry_masks():
+    registry = query_sbl.WitnessRegistry(["WH", "RP", "NIV"])
+    assert registry.get_mask("RP") == 2
+    assert registry.get_mask(["WH", "NIV"]) == 5
+    assert registry.get_witnesses(6) == ["RP", "NIV"]
+    assert list(registry.encode(["NIV", "NA28", "WH"])) == [4, 0, 1]
+    with pytest.raises(KeyError):
+        registry.get_mask("NA28")
+    with pytest.raises(ValueError):
+        query_sbl.WitnessRegistry(["WH", "WH"])
+
+
+def test_query_with_more_witnesses(apparatus_file):
+    witnesses = parse_sbl.witness_abbreviations + ["NIV"]
+    data_frame = parse_sbl.process_input_file(apparatus_file, witnesses=witnesses)
+    apparatus_query = query_sbl.ApparatusQuery(data_frame, query_sbl.WitnessRegistry(witnesses))
+    assert get_units(apparatus_query.disagree("WH", "RP")) == {
+        ("Matthew", 1, 5, 1), ("Matthew", 1, 5, 2), ("Matthew", 1, 6, 1), ("Matthew", 2, 1, 1),
+        ("Matthew", 28, 20, 1), ("Mark", 1, 1, 1), ("Mark", 1, 2, 1), ("Mark", 1, 2, 2)}
+    assert get_units(apparatus_query.attested("NIV")) == set()
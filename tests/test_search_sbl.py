@@ -0,0 +1,94 @@
+"""
+Tests that the search index finds the same records as a scan of every textual variant.
+"""
+
+# -- coding: utf-8 --
+
+import os
+
+import pandas as pd
+import pytest
+
+import parse_sbl
+import search_sbl
+
+queries = ["Μαριὰμ", "Μαρια", "μαρια", "τοῦ θεοῦ", "του θεου", "Ἰησου", "καί", "+", "ζζζ"]
+
+
+def scan_records(data_frame, query, mode):
+    """
+    Finds the records whose textual variant contains every word of the query
+    by checking each row, as 'SearchIndex.search()' should.
+
+    Args:
+        data_frame (pd.DataFrame): The parsed records.
+        query (str): The words to search for.
+        mode (str): One of 'search_sbl.search_modes'.
+
+    Returns:
+        list[int]: The row positions of the matching records.
+    """
+    query_words = search_sbl.get_words(query)
+    if mode != "exact":
+        query_words = [search_sbl.normalize_word(word) for word in query_words]
+    record_ids = []
+    for record_id, text in enumerate(data_frame["textual_variant"]):
+        words = search_sbl.get_words(text)
+        if mode != "exact":
+            words = [search_sbl.normalize_word(word) for word in words]
+        if mode == "prefix":
+            is_match = all(any(word.startswith(query_word) for word in words)
+                           for query_word in query_words)
+        else:
+            is_match = all(query_word in words for query_word in query_words)
+        if query_words and is_match:
+            record_ids.append(record_id)
+    return record_ids
+
+
+@pytest.fixture(scope="module")
+def merged_search_index(merged_data_frame):
+    """The search index of merged_sbl.txt, built from its parsed records."""
+    search_index = search_sbl.SearchIndex()
+    search_index.add_records(merged_data_frame.itertuples(index=False))
+    return search_index
+
+
+@pytest.mark.parametrize("mode", search_sbl.search_modes)
+@pytest.mark.parametrize("query", queries)
+def test_search_matches_scan(merged_data_frame, merged_search_index, query, mode):
+    assert merged_search_index.search(query, mode) == scan_records(merged_data_frame, query, mode)
+
+
+def test_search_finds_accented_forms(merged_search_index):
+    assert merged_search_index.search("Μαριαμ")
+    assert merged_search_index.search("Μαριαμ", "exact") == []
+
+
+def test_search_rejects_unknown_mode(merged_search_index):
+    with pytest.raises(ValueError):
+        merged_search_index.search("Μαρια", "fuzzy")
+
+
+def test_loaded_index_matches_scan(apparatus_file):
+    data_frame, search_index = search_sbl.load_data_frame_and_search_index(apparatus_file)
+    pd.testing.assert_frame_equal(data_frame, parse_sbl.process_input_file(apparatus_file))
+    assert os.path.exists(search_sbl.get_search_index_path(apparatus_file))
+    saved_data_frame, saved_index = search_sbl.load_data_frame_and_search_index(apparatus_file)
+    pd.testing.assert_frame_equal(saved_data_frame, data_frame)
+    for query in ["Ἰησοῦ", "θεου", "προφ"]:
+        for mode in search_sbl.search_modes:
+            expected_record_ids = scan_records(data_frame, query, mode)
+            assert search_index.search(query, mode) == expected_record_ids
+            assert saved_index.search(query, mode) == expected_record_ids
+            assert search_sbl.load_search_index(apparatus_file).search(
+                query, mode) == expected_record_ids
+
+
+def test_search_works_when_the_index_cannot_be_saved(apparatus_file, monkeypatch, tmp_path):
+    monkeypatch.setattr(search_sbl, "get_search_index_path",
+                        lambda input_file: str(tmp_path / "missing" / "index.search"))
+    data_frame, search_index = search_sbl.load_data_frame_and_search_index(apparatus_file)
+    assert search_index.search("Ἰησοῦ") == scan_records(data_frame, "Ἰησοῦ", "accent_insensitive")
+    assert search_sbl.load_search_index(apparatus_file).search("Ἰησοῦ") == (
+        search_index.search("Ἰησοῦ"))
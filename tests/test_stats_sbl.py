@@ -0,0 +1,85 @@
+"""
+Tests that the vectorized witness agreement counts match
+a count over the readings of every unit.
+"""
+
+# -- coding: utf-8 --
+
+from collections import Counter, defaultdict
+
+import pandas as pd
+import pytest
+
+import parse_sbl
+import query_sbl
+import stats_sbl
+
+
+def count_agreement(data_frame, by):
+    """
+    Counts the comparisons and agreements of each witness pair unit by unit.
+
+    Args:
+        data_frame (pd.DataFrame): The parsed records.
+        by (str): 'corpus', 'book', or 'chapter'.
+
+    Returns:
+        dict: A dictionary mapping each (group, witness_a, witness_b) key
+        to its number of comparisons and agreements.
+    """
+    unit_readings = defaultdict(lambda: defaultdict(set))
+    for record in data_frame.astype(object).itertuples(index=False):
+        unit = (record.book_name, record.chapter_number, record.verse_number, record.group_number)
+        unit_readings[unit][record.textual_variant].add(record.witness_abbreviation)
+    comparisons = Counter()
+    agreements = Counter()
+    for unit, readings in unit_readings.items():
+        group = tuple(unit[:len(stats_sbl.grouping_columns[by])])
+        attested_witnesses = set().union(*readings.values())
+        for witness_a in attested_witnesses:
+            for witness_b in attested_witnesses:
+                comparisons[group, witness_a, witness_b] += 1
+                agreements[group, witness_a, witness_b] += any(
+                    {witness_a, witness_b} <= witnesses for witnesses in readings.values())
+    return {key: (comparisons[key], agreements[key]) for key in comparisons}
+
+
+@pytest.fixture(scope="module")
+def apparatus_query(merged_data_frame):
+    """The ApparatusQuery of merged_sbl.txt."""
+    return query_sbl.ApparatusQuery(merged_data_frame)
+
+
+@pytest.mark.parametrize("by", sorted(stats_sbl.grouping_columns))
+def test_agreement_matches_unit_counts(merged_data_frame, apparatus_query, by):
+    agreement = stats_sbl.compute_agreement(apparatus_query, by)
+    group_columns = stats_sbl.grouping_columns[by]
+    counted = {}
+    for row in agreement[agreement["comparisons"] > 0].astype(object).itertuples(index=False):
+        group = tuple(getattr(row, column) for column in group_columns)
+        counted[group, row.witness_a, row.witness_b] = (row.comparisons, row.agreements)
+    assert counted == count_agreement(merged_data_frame, by)
+    rates = agreement["agreements"] / agreement["comparisons"]
+    pd.testing.assert_series_equal(
+        agreement["agreement_rate"], rates.where(agreement["comparisons"] > 0),
+        check_names=False)
+
+
+def test_agreement_matrix(apparatus_query):
+    agreement = stats_sbl.compute_agreement(apparatus_query, "book")
+    matrix = stats_sbl.get_agreement_matrix(agreement, book_name="Romans")
+    assert list(matrix.index) == list(matrix.columns) == parse_sbl.witness_abbreviations
+    assert (matrix.to_numpy().diagonal() == 1).all()
+    assert (matrix == matrix.T).all().all()
+
+
+def test_export_agreement_csv(apparatus_file, tmp_path):
+    output_file = tmp_path / "agreement.csv"
+    agreement = stats_sbl.export_agreement_csv(apparatus_file, str(output_file), by="corpus")
+    exported = pd.read_csv(output_file)
+    assert list(exported.columns) == [
+        "witness_a", "witness_b", "comparisons", "agreements", "agreement_rate"]
+    assert exported[["comparisons", "agreements"]].to_numpy().tolist() == (
+        agreement[["comparisons", "agreements"]].to_numpy().tolist())
+    wh_rp = exported[(exported["witness_a"] == "WH") & (exported["witness_b"] == "RP")]
+    assert wh_rp[["comparisons", "agreements"]].to_numpy().tolist() == [[8, 0]]
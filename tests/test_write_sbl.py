@@ -0,0 +1,145 @@
+"""
+Tests that every output format reads back the rows that were written to it.
+"""
+
+# -- coding: utf-8 --
+
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import parse_sbl
+import write_sbl
+
+# The modules each output format is read back with, besides pandas.
+format_requirements = {
+    "parquet": ["pyarrow"],
+    "arrow": ["pyarrow"],
+    "feather": ["pyarrow"],
+    "xlsx": ["xlsxwriter", "openpyxl"],
+}
+
+
+def read_output_file(output_file_path, output_format):
+    """
+    Reads an output file back into a DataFrame.
+
+    Args:
+        output_file_path (str): The path of the output file.
+        output_format (str): One of the formats in 'write_sbl.output_formats'.
+
+    Returns:
+        pd.DataFrame: The rows of the file.
+    """
+    if output_format == "csv":
+        return pd.read_csv(output_file_path, keep_default_na=False)
+    if output_format == "jsonl":
+        return pd.read_json(output_file_path, lines=True)
+    if output_format == "parquet":
+        return pd.read_parquet(output_file_path)
+    if output_format == "xlsx":
+        return pd.read_excel(output_file_path, keep_default_na=False)
+    if output_format == "sqlite":
+        with sqlite3.connect(output_file_path) as connection:
+            return pd.read_sql_query(
+                f'SELECT * FROM "{write_sbl.sqlite_table}" ORDER BY rowid', connection)
+    import arrow_sbl
+
+    return arrow_sbl.read_table(output_file_path).to_pandas()
+
+
+def get_rows(data_frame):
+    """Returns the rows of a DataFrame as tuples of plain Python values."""
+    return list(write_sbl.iter_data_frame_rows(data_frame))
+
+
+@pytest.fixture
+def output_data_frame(apparatus_file):
+    """The numbered DataFrame of the apparatus fixture."""
+    return parse_sbl.identify_and_assign(parse_sbl.process_input_file(apparatus_file))
+
+
+@pytest.mark.parametrize("extension, output_format", sorted(write_sbl.output_formats.items()))
+def test_write_data_frame_round_trips(output_data_frame, tmp_path, extension, output_format):
+    for module_name in format_requirements.get(output_format, []):
+        pytest.importorskip(module_name)
+    output_file_path = str(tmp_path / ("output" + extension))
+    row_count = write_sbl.write_data_frame(output_data_frame, output_file_path, chunk_size=5)
+    read_back = read_output_file(output_file_path, output_format)
+    assert row_count == len(output_data_frame)
+    assert list(read_back.columns) == list(output_data_frame.columns)
+    assert get_rows(read_back) == get_rows(output_data_frame)
+
+
+@pytest.mark.parametrize("extension, output_format", sorted(write_sbl.output_formats.items()))
+def test_convert_file_round_trips(apparatus_file, tmp_path, extension, output_format):
+    for module_name in format_requirements.get(output_format, []):
+        pytest.importorskip(module_name)
+    output_file_path = str(tmp_path / ("output" + extension))
+    row_count = write_sbl.convert_file(apparatus_file, output_file_path, chunk_size=5)
+    read_back = read_output_file(output_file_path, output_format)
+    records = list(parse_sbl.iter_records(parse_sbl.iter_input_lines(apparatus_file)))
+    assert row_count == len(records)
+    assert list(read_back.columns) == parse_sbl.output_columns
+    assert get_rows(read_back) == [tuple(record) for record in records]
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+@pytest.mark.parametrize("separate_workbooks", [False, True])
+def test_write_excel_by_book_round_trips(output_data_frame, tmp_path, separate_workbooks, workers):
+    pytest.importorskip("xlsxwriter")
+    pytest.importorskip("openpyxl")
+    output_path = tmp_path / ("books" if separate_workbooks else "books.xlsx")
+    row_count = write_sbl.write_excel_by_book(
+        output_data_frame, str(output_path), workers=workers,
+        separate_workbooks=separate_workbooks)
+    if separate_workbooks:
+        book_frames = {path.stem: pd.read_excel(path, keep_default_na=False)
+                       for path in output_path.iterdir()}
+    else:
+        book_frames = pd.read_excel(output_path, sheet_name=None, keep_default_na=False)
+    assert row_count == len(output_data_frame)
+    assert sorted(book_frames) == ["Mark", "Matt"]
+    for book_name, book_frame in write_sbl.iter_book_data_frames(output_data_frame):
+        assert get_rows(book_frames[book_name]) == get_rows(book_frame)
+
+
+def test_get_sheet_name():
+    assert write_sbl.get_sheet_name("Matt") == "Matt"
+    assert write_sbl.get_sheet_name("a[b]:c*d?e/f\\g") == "abcdefg"
+    assert write_sbl.get_sheet_name("x" * 40) == "x" * write_sbl.excel_sheet_name_length
+    assert write_sbl.get_sheet_name("[]") == write_sbl.unknown_book_sheet_name
+
+
+def test_upsert_records_replaces_only_the_verses_given(apparatus_file, tmp_path):
+    output_file_path = str(tmp_path / "output.sqlite")
+    records = [tuple(record) for record in
+               parse_sbl.iter_records(parse_sbl.iter_input_lines(apparatus_file))]
+    write_sbl.write_records(records, output_file_path)
+    verse_positions = [parse_sbl.output_columns.index(column)
+                       for column in write_sbl.verse_columns]
+    first_verse = tuple(records[0][position] for position in verse_positions)
+    verse_records = [record for record in records
+                     if tuple(record[position] for position in verse_positions) == first_verse]
+    other_records = [record for record in records if record not in verse_records]
+
+    # Reparsing a verse twice keeps one copy of its rows, after the rest of the table.
+    for _ in range(2):
+        row_count = write_sbl.upsert_records(verse_records, output_file_path, chunk_size=1)
+        assert row_count == len(verse_records)
+    read_back = read_output_file(output_file_path, "sqlite")
+    assert get_rows(read_back) == other_records + verse_records
+
+
+def test_upsert_records_creates_a_missing_database(apparatus_file, tmp_path):
+    output_file_path = str(tmp_path / "output.sqlite")
+    records = [tuple(record) for record in
+               parse_sbl.iter_records(parse_sbl.iter_input_lines(apparatus_file))]
+    assert write_sbl.upsert_records(records, output_file_path) == len(records)
+    assert get_rows(read_output_file(output_file_path, "sqlite")) == records
+
+
+def test_upsert_records_requires_verse_columns(tmp_path):
+    with pytest.raises(ValueError):
+        write_sbl.upsert_records([("x",)], str(tmp_path / "output.sqlite"), columns=["word"])
@@ -0,0 +1,773 @@
+"""
+This script writes the records parsed by parse_sbl.py to an output file.
+The output format is chosen from the file extension:
+CSV (.csv), JSON Lines (.jsonl), Parquet (.parquet, requires pyarrow),
+Excel (.xlsx, written with xlsxwriter's constant-memory mode),
+SQLite (.sqlite, a 'variants' table indexed for ad-hoc queries),
+or Arrow IPC and Feather (.arrow and .feather, requires pyarrow, see arrow_sbl.py).
+Excel output can also be split by book, into one sheet per book
+or one workbook per book (see 'write_excel_by_book()').
+
+Records are written in chunks of a bounded size as they arrive,
+so the parser output can be streamed straight into the file
+without building a DataFrame first.
+CSV and JSON Lines can also be written to standard output by passing '-' as the path.
+"""
+
+# -- coding: utf-8 --
+
+# =============================================================================
+# STEP 1:
+#    Initialize script
+# =============================================================================
+
+
+# Step 1a: Import necessary libraries
+
+import contextlib
+import csv
+import json
+import os
+import sqlite3
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import parse_sbl
+
+# Step 1b: Define global variables
+default_chunk_size = 10000
+stdout_path = "-"
+default_output_format = "xlsx"
+output_formats = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".parquet": "parquet",
+    ".xlsx": "xlsx",
+    ".sqlite": "sqlite",
+    ".arrow": "arrow",
+    ".feather": "feather",
+}
+sqlite_table = "variants"
+sqlite_column_types = {
+    "record_number": "INTEGER",
+    "book_name": "TEXT",
+    "chapter_number": "INTEGER",
+    "verse_number": "INTEGER",
+    "textual_variant": "TEXT",
+    "witness_abbreviation": "TEXT",
+    "group_number": "INTEGER",
+    "variant_number": "INTEGER",
+    "occurrence_number": "INTEGER",
+    "verse_id": "INTEGER",
+}
+parquet_column_types = {"INTEGER": "int64", "TEXT": "string"}
+verse_columns = ["book_name", "chapter_number", "verse_number"]
+excel_sheet_name_length = 31
+excel_sheet_name_forbidden_characters = str.maketrans("", "", "[]:*?/\\")
+unknown_book_sheet_name = "Unknown"
+sqlite_indexes = {
+    "verse": verse_columns,
+    "verse_id": ["verse_id"],
+    "witness": ["witness_abbreviation"],
+    "textual_variant": ["textual_variant"],
+}
+
+# =============================================================================
+# STEP 2:
+#    Split records into chunks
+# =============================================================================
+
+# Step 2a: Define 'iter_chunks()' function
+
+
+def iter_chunks(rows, chunk_size=default_chunk_size):
+    """
+    Splits an iterable of rows into lists of at most 'chunk_size' rows.
+
+    Args:
+        rows (iterable[tuple]): The rows to split.
+        chunk_size (int): The maximum number of rows in each chunk.
+
+    Yields:
+        list[tuple]: The next chunk of rows.
+    """
+    rows = iter(rows)
+    chunk = list(islice(rows, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(rows, chunk_size))
+
+# Step 2b: Define 'iter_data_frame_rows()' function
+
+
+def iter_data_frame_rows(data_frame, chunk_size=default_chunk_size):
+    """
+    Yields the rows of a DataFrame as tuples of plain Python values,
+    converting one chunk at a time. Missing values are yielded as None.
+
+    Args:
+        data_frame (pd.DataFrame): The DataFrame to convert.
+        chunk_size (int): The number of rows to convert at a time.
+
+    Yields:
+        tuple: One row of the DataFrame.
+    """
+    for start in range(0, len(data_frame), chunk_size):
+        chunk = data_frame.iloc[start:start + chunk_size].astype(object)
+        chunk = chunk.where(chunk.notna(), None)
+        yield from chunk.itertuples(index=False, name=None)
+
+# Step 2c: Define 'open_text_output()' function
+
+
+@contextlib.contextmanager
+def open_text_output(output_file_path, newline=None):
+    """
+    Opens a text output file for writing, or standard output if the path is '-'.
+    Standard output is flushed but not closed when the block exits.
+
+    Args:
+        output_file_path (str): The path where the output file should be written, or '-'.
+        newline (str): The 'newline' argument of 'open()'.
+
+    Yields:
+        file: The open text file.
+    """
+    if output_file_path == stdout_path:
+        yield sys.stdout
+        sys.stdout.flush()
+    else:
+        with open(output_file_path, "w", encoding="utf-8", newline=newline) as output_file:
+            yield output_file
+
+# =============================================================================
+# STEP 3:
+#    Define the writers for each output format
+# =============================================================================
+
+# Step 3a: Define 'write_csv()' function
+
+
+def write_csv(rows, output_file_path, columns, chunk_size=default_chunk_size):
+    """
+    Writes rows to a CSV file with a header line.
+
+    Args:
+        rows (iterable[tuple]): The rows to write.
+        output_file_path (str): The path where the output file should be written,
+        or '-' for standard output.
+        columns (list[str]): The column names, in the order of the values in each row.
+        chunk_size (int): The number of rows to write at a time.
+
+    Returns:
+        int: The number of rows written.
+    """
+    row_count = 0
+    with open_text_output(output_file_path, newline="") as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(columns)
+        for chunk in iter_chunks(rows, chunk_size):
+            writer.writerows(chunk)
+            row_count += len(chunk)
+    return row_count
+
+# Step 3b: Define 'write_json_lines()' function
+
+
+def write_json_lines(rows, output_file_path, columns, chunk_size=default_chunk_size):
+    """
+    Writes rows to a JSON Lines file, one JSON object per row.
+
+    Args:
+        rows (iterable[tuple]): The rows to write.
+        output_file_path (str): The path where the output file should be written,
+        or '-' for standard output.
+        columns (list[str]): The column names, used as the keys of each JSON object.
+        chunk_size (int): The number of rows to write at a time.
+
+    Returns:
+        int: The number of rows written.
+    """
+    row_count = 0
+    with open_text_output(output_file_path) as output_file:
+        for chunk in iter_chunks(rows, chunk_size):
+            output_file.writelines(
+                json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n"
+                for row in chunk)
+            row_count += len(chunk)
+    return row_count
+
+# Step 3c: Define 'write_parquet()' function
+
+
+def write_parquet(rows, output_file_path, columns, chunk_size=default_chunk_size):
+    """
+    Writes rows to a Parquet file, one row group per chunk.
+
+    Args:
+        rows (iterable[tuple]): The rows to write.
+        output_file_path (str): The path where the output file should be written.
+        columns (list[str]): The column names, in the order of the values in each row.
+        chunk_size (int): The number of rows in each row group.
+
+    Returns:
+        int: The number of rows written.
+
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ImportError("Writing Parquet output requires pyarrow.") from exc
+
+    # Step 3c1: Declare the type of each column up front, so that a later chunk whose values
+    # are all missing is written with the same schema as the first chunk.
+    # Columns without a declared type take the type of their values in the first chunk.
+    def get_schema(first_chunk):
+        fields = []
+        for column, values in zip(columns, zip(*first_chunk) if first_chunk
+                                  else [()] * len(columns)):
+            if column in sqlite_column_types:
+                column_type = pa.type_for_alias(
+                    parquet_column_types[sqlite_column_types[column]])
+            else:
+                column_type = pa.array(values).type
+                if pa.types.is_null(column_type):
+                    column_type = pa.string()
+            fields.append(pa.field(column, column_type))
+        return pa.schema(fields)
+
+    # Step 3c2: Write one row group per chunk, or an empty file if there are no rows.
+    row_count = 0
+    schema = None
+    with contextlib.ExitStack() as exit_stack:
+        for chunk in iter_chunks(rows, chunk_size):
+            if schema is None:
+                schema = get_schema(chunk)
+                writer = exit_stack.enter_context(pq.ParquetWriter(output_file_path, schema))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type)
+                 for values, field in zip(zip(*chunk), schema)], schema=schema))
+            row_count += len(chunk)
+    if schema is None:
+        pq.write_table(get_schema([]).empty_table(), output_file_path)
+    return row_count
+
+# Step 3d: Define 'write_excel()' function
+
+
+def write_excel(rows, output_file_path, columns, chunk_size=default_chunk_size):
+    """
+    Writes rows to the first sheet of an Excel file
+    using xlsxwriter's constant-memory mode, which flushes each row to disk
+    as soon as the next one is started.
+
+    Args:
+        rows (iterable[tuple]): The rows to write.
+        output_file_path (str): The path where the output file should be written.
+        columns (list[str]): The column names, written as the header row.
+        chunk_size (int): Unused. Rows are written one at a time.
+
+    Returns:
+        int: The number of rows written.
+    """
+    import xlsxwriter
+
+    row_count = 0
+    with xlsxwriter.Workbook(output_file_path, {"constant_memory": True}) as workbook:
+        worksheet = workbook.add_worksheet("Sheet1")
+        worksheet.write_row(0, 0, columns)
+        for row_count, row in enumerate(rows, start=1):
+            worksheet.write_row(row_count, 0, row)
+    return row_count
+
+# Step 3e: Define 'create_sqlite_indexes()' function
+
+
+def create_sqlite_indexes(connection, columns):
+    """
+    Creates the indexes of the 'variants' table on the verse, witness, and textual variant,
+    for each index whose columns are in the table.
+
+    Args:
+        connection (sqlite3.Connection): The open database.
+        columns (list[str]): The column names of the table.
+    """
+    for index_name, index_columns in sqlite_indexes.items():
+        if set(index_columns) <= set(columns):
+            connection.execute(
+                f'CREATE INDEX IF NOT EXISTS "{sqlite_table}_{index_name}" '
+                f'ON "{sqlite_table}" ({", ".join(index_columns)})')
+
+# Step 3f: Define 'write_sqlite()' function
+
+
+def write_sqlite(rows, output_file_path, columns, chunk_size=default_chunk_size, upsert=False):
+    """
+    Writes rows to the 'variants' table of a SQLite database,
+    with one 'executemany()' per chunk inside a single transaction.
+
+    By default the table is replaced, and its indexes are built after the load,
+    which is faster than updating them row by row.
+    With 'upsert', the table is kept and updated one verse at a time:
+    the existing rows of each verse in the new rows are deleted before they are inserted,
+    so reparsing a few verses of a book replaces just those verses.
+
+    Args:
+        rows (iterable[tuple]): The rows to write.
+        output_file_path (str): The path of the database file.
+        columns (list[str]): The column names, in the order of the values in each row.
+        chunk_size (int): The number of rows to insert at a time.
+        upsert (bool): Whether to replace the rows of each verse instead of the whole table.
+
+    Returns:
+        int: The number of rows written.
+
+    Raises:
+        ValueError: If 'upsert' is given and the rows have no book, chapter, and verse columns.
+    """
+    if upsert and not set(verse_columns) <= set(columns):
+        raise ValueError(f"Upserting rows requires the columns {', '.join(verse_columns)}")
+    column_definitions = ", ".join(
+        f'"{column}" {sqlite_column_types.get(column, "")}'.rstrip() for column in columns)
+    insert_statement = (f'INSERT INTO "{sqlite_table}" VALUES '
+                        f'({", ".join("?" * len(columns))})')
+    delete_statement = (f'DELETE FROM "{sqlite_table}" WHERE book_name IS ? '
+                        f'AND chapter_number IS ? AND verse_number IS ?')
+    verse_positions = [columns.index(column) for column in verse_columns] if upsert else []
+
+    row_count = 0
+    connection = sqlite3.connect(output_file_path)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with connection:
+
+            # Step 3f1: Replace the table, or create it with its indexes if it is missing,
+            # since the deletes of an upsert look up the verse index.
+            if upsert:
+                connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{sqlite_table}" ({column_definitions})')
+                create_sqlite_indexes(connection, columns)
+            else:
+                connection.execute(f'DROP TABLE IF EXISTS "{sqlite_table}"')
+                connection.execute(f'CREATE TABLE "{sqlite_table}" ({column_definitions})')
+
+            # Step 3f2: Insert the rows one chunk at a time.
+            # A verse is only deleted the first time it is seen, as it may span two chunks.
+            replaced_verses = set()
+            for chunk in iter_chunks(rows, chunk_size):
+                if upsert:
+                    new_verses = {tuple(row[position] for position in verse_positions)
+                                  for row in chunk} - replaced_verses
+                    connection.executemany(delete_statement, new_verses)
+                    replaced_verses |= new_verses
+                connection.executemany(insert_statement, chunk)
+                row_count += len(chunk)
+
+            # Step 3f3: Build the indexes once the table is loaded.
+            if not upsert:
+                create_sqlite_indexes(connection, columns)
+    finally:
+        connection.close()
+    return row_count
+
+# Step 3g: Define 'write_arrow()' function
+
+
+def write_arrow(rows, output_file_path, columns, chunk_size=default_chunk_size,
+                file_format="arrow"):
+    """
+    Writes rows to an uncompressed Arrow IPC file, one record batch per chunk,
+    with the book name, textual variant, and witness abbreviation columns dictionary-encoded.
+    The batches are collected before writing, since the IPC file format
+    needs one dictionary per column for the whole file.
+
+    Args:
+        rows (iterable[tuple]): The rows to write.
+        output_file_path (str): The path where the output file should be written.
+        columns (list[str]): The column names, in the order of the values in each row.
+        chunk_size (int): The number of rows in each record batch.
+        file_format (str): 'arrow' or 'feather'.
+
+    Returns:
+        int: The number of rows written.
+
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+    try:
+        import arrow_sbl
+    except ImportError as exc:
+        raise ImportError("Writing Arrow and Feather output requires pyarrow.") from exc
+
+    batches = [arrow_sbl.rows_to_batch(chunk, columns)
+               for chunk in iter_chunks(rows, chunk_size)]
+    if not batches:
+        batches = [arrow_sbl.rows_to_batch([], columns)]
+    table = arrow_sbl.batches_to_table(batches)
+    arrow_sbl.write_table(table, output_file_path, file_format)
+    return table.num_rows
+
+# Step 3h: Define 'write_feather()' function
+
+
+def write_feather(rows, output_file_path, columns, chunk_size=default_chunk_size):
+    """
+    Writes rows to an uncompressed Feather file (see 'write_arrow()').
+
+    Args:
+        rows (iterable[tuple]): The rows to write.
+        output_file_path (str): The path where the output file should be written.
+        columns (list[str]): The column names, in the order of the values in each row.
+        chunk_size (int): The number of rows in each record batch.
+
+    Returns:
+        int: The number of rows written.
+    """
+    return write_arrow(rows, output_file_path, columns, chunk_size, file_format="feather")
+
+
+writers = {
+    "csv": write_csv,
+    "jsonl": write_json_lines,
+    "parquet": write_parquet,
+    "xlsx": write_excel,
+    "sqlite": write_sqlite,
+    "arrow": write_arrow,
+    "feather": write_feather,
+}
+
+# =============================================================================
+# STEP 4:
+#    Write records and DataFrames in the format given by the file extension
+# =============================================================================
+
+# Step 4a: Define 'get_output_format()' function
+
+
+def get_output_format(output_file_path, fallback_format=None):
+    """
+    Returns the output format for a file path based on its extension.
+
+    Args:
+        output_file_path (str): The path where the output file should be written.
+        fallback_format (str): The format of a path without a supported extension,
+        such as 'default_output_format'. Defaults to None, which raises instead.
+
+    Returns:
+        str: One of 'arrow', 'csv', 'feather', 'jsonl', 'parquet', 'sqlite', or 'xlsx'.
+
+    Raises:
+        ValueError: If the extension is not a supported output format
+        and no fallback format is given.
+    """
+    if output_file_path == stdout_path:
+        raise ValueError("The output format must be given when writing to standard output")
+    extension = os.path.splitext(output_file_path)[1].lower()
+    if extension not in output_formats:
+        if fallback_format is not None:
+            return fallback_format
+        raise ValueError(
+            f"Unsupported output file extension '{extension}'. "
+            f"Use one of: {', '.join(output_formats)}")
+    return output_formats[extension]
+
+# Step 4b: Define 'write_records()' function
+
+
+def write_records(records, output_file_path, output_format=None,
+                  columns=None, chunk_size=default_chunk_size):
+    """
+    Writes records, such as those yielded by 'parse_sbl.iter_records()', to an output file.
+
+    Args:
+        records (iterable[tuple]): The records to write.
+        output_file_path (str): The path where the output file should be written.
+        output_format (str): One of 'arrow', 'csv', 'feather', 'jsonl', 'parquet',
+        'sqlite', or 'xlsx'.
+        Defaults to the format given by the file extension.
+        columns (list[str]): The column names. Defaults to 'parse_sbl.output_columns'.
+        chunk_size (int): The number of records to write at a time.
+
+    Returns:
+        int: The number of records written.
+    """
+    if output_format is None:
+        output_format = get_output_format(output_file_path)
+    if columns is None:
+        columns = parse_sbl.output_columns
+    return writers[output_format](records, output_file_path, columns, chunk_size)
+
+# Step 4c: Define 'write_data_frame()' function
+
+
+def write_data_frame(data_frame, output_file_path, output_format=None,
+                     chunk_size=default_chunk_size):
+    """
+    Writes a DataFrame to an output file, converting it to rows one chunk at a time.
+
+    Args:
+        data_frame (pd.DataFrame): A pandas DataFrame containing the extracted data.
+        output_file_path (str): The path where the output file should be written.
+        output_format (str): One of 'arrow', 'csv', 'feather', 'jsonl', 'parquet',
+        'sqlite', or 'xlsx'.
+        Defaults to the format given by the file extension.
+        chunk_size (int): The number of rows to write at a time.
+
+    Returns:
+        int: The number of rows written.
+    """
+    return write_records(
+        iter_data_frame_rows(data_frame, chunk_size), output_file_path,
+        output_format, list(data_frame.columns), chunk_size)
+
+# Step 4d: Define 'upsert_records()' function
+
+
+def upsert_records(records, output_file_path, columns=None, chunk_size=default_chunk_size):
+    """
+    Updates a SQLite database with records, replacing the existing rows
+    of each verse in the records and keeping the rest of the table.
+
+    Args:
+        records (iterable[tuple]): The records to write, such as those of a reparsed book.
+        output_file_path (str): The path of the database file.
+        columns (list[str]): The column names. Defaults to 'parse_sbl.output_columns'.
+        chunk_size (int): The number of records to write at a time.
+
+    Returns:
+        int: The number of records written.
+    """
+    if columns is None:
+        columns = parse_sbl.output_columns
+    return write_sqlite(records, output_file_path, columns, chunk_size, upsert=True)
+
+# Step 4e: Define 'convert_file()' function
+
+
+def convert_file(input_file, output_file_path, output_format=None,
+                 chunk_size=default_chunk_size):
+    """
+    Streams the records parsed from an input file straight into an output file,
+    without building a DataFrame.
+
+    Args:
+        input_file (str): The path to the input file.
+        output_file_path (str): The path where the output file should be written.
+        output_format (str): One of 'arrow', 'csv', 'feather', 'jsonl', 'parquet',
+        'sqlite', or 'xlsx'.
+        Defaults to the format given by the file extension.
+        chunk_size (int): The number of records to write at a time.
+
+    Returns:
+        int: The number of records written.
+    """
+    with open(input_file, "r", encoding="utf-8") as file:
+        return write_records(
+            parse_sbl.iter_records(file), output_file_path, output_format,
+            chunk_size=chunk_size)
+
+# =============================================================================
+# STEP 5:
+#    Write Excel output split by book
+# =============================================================================
+
+# Step 5a: Define 'get_book_output_names()' function
+
+
+def get_book_output_names():
+    """
+    Maps the book names of the headers to the names of their per-book files
+    in merge_sbl_files.file_names without the extension, such as "Matt" and "1Cor",
+    which are used as sheet and workbook names.
+
+    Returns:
+        dict: A dictionary mapping each book name to its output name.
+    """
+    import merge_sbl_files
+
+    return {book_name: os.path.splitext(file_name)[0]
+            for book_name, file_name in zip(parse_sbl.book_names, merge_sbl_files.file_names)}
+
+# Step 5b: Define 'get_sheet_name()' function
+
+
+def get_sheet_name(output_name):
+    """
+    Makes a book's output name valid as an Excel sheet name,
+    which may not contain any of '[]:*?/\\', start or end with an apostrophe,
+    or be longer than 31 characters.
+    The same name is used for the book's workbook, so it is also a safe file name.
+
+    Args:
+        output_name (str): The output name of the book.
+
+    Returns:
+        str: The sheet name, or 'unknown_book_sheet_name' if nothing valid is left.
+    """
+    sheet_name = output_name.translate(excel_sheet_name_forbidden_characters).strip("'")
+    return sheet_name[:excel_sheet_name_length].strip("'") or unknown_book_sheet_name
+
+# Step 5c: Define 'iter_book_data_frames()' function
+
+
+def iter_book_data_frames(data_frame):
+    """
+    Splits a DataFrame by book, in canonical book order.
+    Books missing from 'parse_sbl.book_names' follow in order of appearance,
+    and rows without a book (before the first header) come last.
+    The rows of each book keep their order, and each book's DataFrame is only
+    taken from the grouped rows when it is reached, so one book is held at a time.
+
+    Args:
+        data_frame (pd.DataFrame): A DataFrame with a 'book_name' column.
+
+    Yields:
+        tuple: The sheet name of the book (see 'get_sheet_name()') and the DataFrame of its rows.
+    """
+    import pandas as pd
+
+    book_output_names = get_book_output_names()
+    book_ranks = {book_name: rank for rank, book_name in enumerate(parse_sbl.book_names)}
+    book_names = data_frame["book_name"].astype(object)
+    row_indices = data_frame.groupby(book_names, sort=False, dropna=False).indices
+    for book_name in sorted(row_indices, key=lambda book_name: (
+            pd.isna(book_name), book_ranks.get(book_name, len(book_ranks)))):
+        if pd.isna(book_name):
+            output_name = unknown_book_sheet_name
+        else:
+            output_name = book_output_names.get(book_name, book_name)
+        yield get_sheet_name(output_name), data_frame.iloc[row_indices[book_name]]
+
+# Step 5d: Define 'get_book_rows()' function
+
+
+def get_book_rows(book_name, book_data_frame):
+    """
+    Converts the rows of one book to tuples of plain Python values in a worker process.
+
+    Args:
+        book_name (str): The sheet name of the book.
+        book_data_frame (pd.DataFrame): The rows of the book.
+
+    Returns:
+        tuple: The sheet name and the rows, as yielded by 'iter_data_frame_rows()'.
+    """
+    return book_name, list(iter_data_frame_rows(book_data_frame))
+
+# Step 5e: Define 'write_book_workbook()' function
+
+
+def write_book_workbook(book_name, book_data_frame, output_directory):
+    """
+    Writes the rows of one book to their own workbook, named after the book.
+
+    Args:
+        book_name (str): The sheet name of the book.
+        book_data_frame (pd.DataFrame): The rows of the book.
+        output_directory (str): The directory of the workbooks.
+
+    Returns:
+        int: The number of rows written.
+    """
+    return write_excel(iter_data_frame_rows(book_data_frame),
+                       os.path.join(output_directory, book_name + ".xlsx"),
+                       list(book_data_frame.columns))
+
+# Step 5f: Define 'iter_in_order()' function
+
+
+def iter_in_order(executor, max_pending, function, argument_tuples):
+    """
+    Maps a function over the arguments in a process pool and yields the results in order,
+    with at most 'max_pending' calls submitted but not yet yielded,
+    so that only a few arguments and results are held in memory at a time.
+    The arguments are only taken from 'argument_tuples' as calls are submitted.
+
+    Args:
+        executor (ProcessPoolExecutor): The process pool.
+        max_pending (int): The number of calls to keep in flight, such as the number of workers.
+        function (callable): The function to call.
+        argument_tuples (iterable[tuple]): The arguments of each call.
+
+    Yields:
+        object: The result of each call, in order.
+    """
+    pending = deque()
+    for arguments in argument_tuples:
+        pending.append(executor.submit(function, *arguments))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+# Step 5g: Define 'write_excel_by_book()' function
+
+
+def write_excel_by_book(data_frame, output_path, workers=None, separate_workbooks=False):
+    """
+    Writes a DataFrame to Excel split by book, in xlsxwriter's constant-memory mode:
+    either to one workbook with a sheet per book, or to a workbook per book.
+    Sheets and workbooks are named after the per-book files of merge_sbl_files.py.
+
+    The books are written one at a time as they are split off the DataFrame.
+    With 'workers', the rows of each book are converted to plain Python values
+    in a process pool, a few books at a time, while the sheets are written in book order.
+    Separate workbooks are written entirely by the workers, a few books at a time.
+
+    Args:
+        data_frame (pd.DataFrame): A pandas DataFrame containing the extracted data.
+        output_path (str): The path of the workbook,
+        or with 'separate_workbooks' the directory of the workbooks.
+        workers (int): The number of worker processes.
+        Defaults to None, which writes every book in this process.
+        separate_workbooks (bool): Whether to write a workbook per book.
+
+    Returns:
+        int: The number of rows written.
+    """
+    import xlsxwriter
+
+    columns = list(data_frame.columns)
+    books = iter_book_data_frames(data_frame)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else None
+    try:
+
+        # Step 5g1: Write a workbook per book.
+        if separate_workbooks:
+            os.makedirs(output_path, exist_ok=True)
+            book_arguments = ((book_name, book_data_frame, output_path)
+                              for book_name, book_data_frame in books)
+            if executor is None:
+                row_counts = (write_book_workbook(*arguments) for arguments in book_arguments)
+            else:
+                row_counts = iter_in_order(executor, workers, write_book_workbook, book_arguments)
+            return sum(row_counts)
+
+        # Step 5g2: Write a sheet per book, converting the rows of the next books in parallel.
+        if executor is None:
+            book_rows = ((book_name, iter_data_frame_rows(book_data_frame))
+                         for book_name, book_data_frame in books)
+        else:
+            book_rows = iter_in_order(executor, workers, get_book_rows, books)
+        row_count = 0
+        sheet_count = 0
+        with xlsxwriter.Workbook(output_path, {"constant_memory": True}) as workbook:
+            for book_name, rows in book_rows:
+                sheet_count += 1
+                worksheet = workbook.add_worksheet(book_name)
+                worksheet.write_row(0, 0, columns)
+                for row_number, row in enumerate(rows, start=1):
+                    worksheet.write_row(row_number, 0, row)
+                    row_count += 1
+            if not sheet_count:
+                workbook.add_worksheet("Sheet1").write_row(0, 0, columns)
+        return row_count
+    finally:
+        if executor is not None:
+            executor.shutdown()